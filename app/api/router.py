@@ -2,8 +2,10 @@ from fastapi import APIRouter
 
 from app.api.routes.auth import router as auth_router
 from app.api.routes.guilds import router as guilds_router
+from app.api.routes.metrics import router as metrics_router
 
 api_router = APIRouter()
 api_router.include_router(auth_router)
 api_router.include_router(guilds_router)
+api_router.include_router(metrics_router)
 
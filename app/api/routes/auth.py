@@ -11,11 +11,10 @@ from werkzeug.security import check_password_hash as werkzeug_check
 from app.api.deps import CurrentUser, get_current_user
 from app.api.schemas import DefaultGuildUpdate, LoginRequest, TokenResponse, UserMeOut
 from app.core.config import Config
-from app.core.guild_cache import get_guilds
-from app.db.database import Database
+from app.core.guild_cache import get_guild_ids
+from app.db.provider import db
 
 pwd_ctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
-db = Database()
 
 router = APIRouter(prefix="/api", tags=["auth"])
 
@@ -39,7 +38,7 @@ async def login(payload: LoginRequest):
     username_for_token: str | None = None
 
     # 1) Пробуем по БД (admin_users)
-    admin = db.get_admin_by_username(payload.username)
+    admin = await db.get_admin_by_username(payload.username)
     if admin and _verify_password(payload.password, admin.password_hash):
         username_for_token = admin.username
 
@@ -67,14 +66,14 @@ async def login(payload: LoginRequest):
     return TokenResponse(access_token=token)
 
 
-def _build_user_me_out(user: CurrentUser) -> UserMeOut:
+async def _build_user_me_out(user: CurrentUser) -> UserMeOut:
     username = user.get("username") or ""
     auth_type = user.get("auth_type") or "admin"
     is_discord = auth_type == "discord"
     default_guild_id = None
     avatar_url = None
     if is_discord and user.get("discord_id") is not None:
-        gid = db.get_discord_default_guild(int(user["discord_id"]))
+        gid = await db.get_discord_default_guild(int(user["discord_id"]))
         default_guild_id = str(gid) if gid is not None else None
         avatar_hash = user.get("avatar")
         if avatar_hash:
@@ -92,7 +91,7 @@ def _build_user_me_out(user: CurrentUser) -> UserMeOut:
 
 @router.get("/auth/me", response_model=UserMeOut)
 async def me(user: CurrentUser = Depends(get_current_user)):
-    return _build_user_me_out(user)
+    return await _build_user_me_out(user)
 
 
 @router.put("/auth/me/default-guild", response_model=UserMeOut)
@@ -114,8 +113,8 @@ async def set_default_guild(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Guild not in your allowed list",
             )
-    db.set_discord_default_guild(discord_id, guild_id)
-    return _build_user_me_out(user)
+    await db.set_discord_default_guild(discord_id, guild_id)
+    return await _build_user_me_out(user)
 
 
 # --- Discord OAuth ---
@@ -203,13 +202,13 @@ async def discord_callback(code: str | None = None, error: str | None = None):
     username = user_data.get("global_name") or user_data.get("username") or str(discord_id)
     avatar_hash = user_data.get("avatar")
     # Сервера, на которых есть бот
-    bot_guild_ids = {str(g["id"]) for g in get_guilds()}
+    bot_guild_ids = get_guild_ids()
     # Сервера, где пользователь участник и есть бот
     allowed_guild_ids: list[str] = []
     admin_guild_ids: list[str] = []
     for g in user_guilds:
         gid = str(g["id"])
-        if gid not in bot_guild_ids:
+        if int(gid) not in bot_guild_ids:
             continue
         allowed_guild_ids.append(gid)
         perms = int(g.get("permissions", 0))
@@ -1,6 +1,7 @@
+import zlib
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 
 from app.api.deps import get_current_user_optional, require_auth_or_api_key
 from app.api.schemas import (
@@ -12,13 +13,26 @@ from app.api.schemas import (
     UserLevelOut,
     UserLevelUpdate,
 )
-from app.core.guild_cache import get_guild_channels, get_guild_roles, get_guilds, get_guild_users, get_user_info, is_deleted_user
-from app.db.database import Database
+from app.core import member_view
+from app.core.config import Config
+from app.core.guild_cache import (
+    get_guild,
+    get_guild_channels,
+    get_guild_roles,
+    get_guild_users,
+    get_guild_version,
+    get_guilds,
+    get_guilds_version,
+    get_member_count,
+    get_user_info,
+    get_users_version,
+    is_deleted_user,
+)
+from app.db.provider import db
 from app.db.models import GuildConfig, UserLevel
 
 
 router = APIRouter(prefix="/api", tags=["guilds"], dependencies=[Depends(require_auth_or_api_key)])
-db = Database()
 
 
 def _parse_selectable_roles(raw: str | None) -> list[int]:
@@ -31,27 +45,47 @@ def _guild_out(g: dict) -> GuildOut:
     return GuildOut(id=str(g["id"]), name=g["name"], icon=g.get("icon"))
 
 
+def _not_modified(request: Request, response: Response, etag: str) -> bool:
+    """Выставить ETag; True — у клиента актуальная версия (ответить 304 без тела)."""
+    response.headers["ETag"] = etag
+    client = request.headers.get("if-none-match")
+    return client is not None and etag in {t.strip() for t in client.split(",")}
+
+
 @router.get("/guilds", response_model=List[GuildOut])
-async def list_guilds(user=Depends(get_current_user_optional)):
+async def list_guilds(request: Request, response: Response, user=Depends(get_current_user_optional)):
     """Список серверов: для админа/API — все с ботом; для Discord — только где пользователь участник."""
-    all_guilds = get_guilds()
+    etag = f'W/"g{get_guilds_version()}"'
     if user and user.get("auth_type") == "discord":
-        allowed = set(user.get("allowed_guild_ids") or [])
-        all_guilds = [g for g in all_guilds if str(g["id"]) in allowed]
-    return [_guild_out(g) for g in all_guilds]
+        allowed = user.get("allowed_guild_ids") or []
+        # у разных пользователей разный список — их набор серверов входит в ETag
+        etag = f'W/"g{get_guilds_version()}-{zlib.crc32(",".join(sorted(allowed)).encode()):x}"'
+        if _not_modified(request, response, etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        guilds = (get_guild(int(gid)) for gid in allowed)
+        return [_guild_out(g) for g in guilds if g is not None]
+    if _not_modified(request, response, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return [_guild_out(g) for g in get_guilds()]
 
 
 @router.get("/guilds/{guild_id}/channels", response_model=List[ChannelOut])
-async def list_guild_channels(guild_id: str):
+async def list_guild_channels(guild_id: str, request: Request, response: Response):
     """Каналы сервера для выбора в настройках."""
     gid = int(guild_id)
+    etag = f'W/"c{get_guild_version(gid)}"'
+    if _not_modified(request, response, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
     return [ChannelOut(id=str(c["id"]), name=c["name"], type=c.get("type", 0)) for c in get_guild_channels(gid)]
 
 
 @router.get("/guilds/{guild_id}/roles", response_model=List[RoleOut])
-async def list_guild_roles(guild_id: str):
+async def list_guild_roles(guild_id: str, request: Request, response: Response):
     """Роли сервера для выбора в настройках."""
     gid = int(guild_id)
+    etag = f'W/"r{get_guild_version(gid)}"'
+    if _not_modified(request, response, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
     return [RoleOut(id=str(r["id"]), name=r["name"]) for r in get_guild_roles(gid)]
 
 
@@ -78,11 +112,7 @@ def _config_to_out(config: GuildConfig | None, guild_id: int) -> GuildConfigOut:
 @router.get("/guilds/{guild_id}/config", response_model=GuildConfigOut)
 async def get_guild_config(guild_id: str):
     gid = int(guild_id)
-    session = db.Session()
-    try:
-        config = session.query(GuildConfig).filter_by(guild_id=gid).first()
-    finally:
-        session.close()
+    config = await db.get_guild_config_row(gid)
     return _config_to_out(config, gid)
 
 
@@ -111,7 +141,7 @@ async def update_guild_config(
     level_channel_id = int(payload.level_channel_id) if payload.level_channel_id is not None else None
     role_select_channel_id = int(payload.role_select_channel_id) if payload.role_select_channel_id is not None else None
     selectable_roles = [int(x) for x in payload.selectable_roles] if payload.selectable_roles else None
-    db.update_guild_config(
+    await db.update_guild_config(
         guild_id=gid,
         channel_id=channel_id,
         role_id=role_id,
@@ -120,12 +150,7 @@ async def update_guild_config(
         selectable_roles=selectable_roles,
     )
 
-    session = db.Session()
-    try:
-        config = session.query(GuildConfig).filter_by(guild_id=gid).first()
-    finally:
-        session.close()
-
+    config = await db.get_guild_config_row(gid)
     if not config:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Config not found")
 
@@ -145,74 +170,88 @@ def _user_level_out(gid: int, u: UserLevel, info: dict | None) -> UserLevelOut:
     )
 
 
+def _member_row_out(gid: int, row: member_view.MemberRow, info: dict | None) -> UserLevelOut:
+    return UserLevelOut(
+        guild_id=str(gid),
+        user_id=str(row.user_id),
+        message_count=row.message_count,
+        level=row.level,
+        xp=row.xp,
+        days_on_server=row.days_on_server,
+        display_name=info.get("name") if info else None,
+        avatar_url=info.get("avatar") if info else None,
+    )
+
+
 @router.get("/guilds/{guild_id}/users/count")
-async def get_users_count(guild_id: str):
-    """Число участников сервера (из кэша бота, без удалённых аккаунтов)."""
+async def get_users_count(guild_id: str, request: Request, response: Response):
+    """Число участников сервера: готовый счётчик кэша бота (без удалённых аккаунтов), пока кэш пуст — из БД."""
     gid = int(guild_id)
-    cached = get_guild_users(gid)
-    if cached:
-        count = sum(1 for _, info in cached.items() if not is_deleted_user(info.get("name")))
-    else:
-        count = db.get_users_in_guild_count(gid)
+    count = get_member_count(gid)
+    if count is None:
+        count = await db.get_users_in_guild_count(gid)
+    etag = f'W/"n{count}"'
+    if _not_modified(request, response, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
     return {"count": count}
 
 
+async def _member_view(gid: int) -> member_view.GuildMemberView | None:
+    """Сводный список участников гильдии (кэш бота + уровни из БД); None — кэш гильдии пуст."""
+    version = get_users_version(gid)
+    view = member_view.get_view(gid, version, Config.MEMBER_VIEW_TTL)
+    if view is not None:
+        return view
+    cached = get_guild_users(gid)
+    if not cached:
+        return None
+    build = member_view.begin_build(gid)
+    try:
+        db_rows = await db.get_users_in_guild(gid)
+    except BaseException:
+        member_view.abort_build(gid, build)
+        raise
+    user_ids = [uid for uid, info in cached.items() if not is_deleted_user(info.get("name"))]
+    view = member_view.GuildMemberView(user_ids, db_rows, users_version=version)
+    member_view.finish_build(gid, view, build)
+    return view
+
+
 @router.get("/guilds/{guild_id}/users", response_model=List[UserLevelOut])
 async def list_users(
     guild_id: str,
+    response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=10000),
     order_by: str = Query("level", description="level | xp | message_count | days_on_server"),
     order: str = Query("desc", description="desc | asc"),
+    cursor: str | None = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
 ):
     """Список всех участников сервера: из кэша + уровни из БД (нет в БД — уровень 0, можно выставить и сохранить)."""
     gid = int(guild_id)
-    cached = get_guild_users(gid)
-    if not cached:
+    view = await _member_view(gid)
+    if view is None:
         # Кэш пуст — отдаём только тех, кто есть в БД (как раньше), без deleted_user
-        users = db.get_users_in_guild_paginated(
+        users = await db.get_users_in_guild_paginated(
             gid, offset=offset, limit=limit, order_by=order_by, order=order
         )
         out_list = [_user_level_out(gid, u, get_user_info(gid, u.user_id)) for u in users]
         return [o for o in out_list if not is_deleted_user(o.display_name)]
 
-    db_users = {u.user_id: u for u in db.get_users_in_guild(gid)}
-    col = order_by if order_by in ("level", "xp", "message_count", "days_on_server") else "level"
-    desc = order == "desc"
-
-    result = []
-    for user_id, info in cached.items():
-        if is_deleted_user(info.get("name")):
-            continue
-        u = db_users.get(user_id)
-        if u:
-            result.append(_user_level_out(gid, u, info))
-        else:
-            result.append(
-                UserLevelOut(
-                    guild_id=str(gid),
-                    user_id=str(user_id),
-                    message_count=0,
-                    level=0,
-                    xp=0,
-                    days_on_server=0,
-                    display_name=info.get("name"),
-                    avatar_url=info.get("avatar"),
-                )
-            )
-
-    result.sort(key=lambda x: getattr(x, col), reverse=desc)
-    return result[offset : offset + limit]
+    try:
+        rows, next_cursor = member_view.read_page(view, order_by, order == "desc", offset, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    # Сериализуем только страницу; имя/аватар — актуальные из кэша
+    return [_member_row_out(gid, row, get_user_info(gid, row.user_id)) for row in rows]
 
 
 @router.get("/guilds/{guild_id}/users/{user_id}", response_model=UserLevelOut)
 async def get_user(guild_id: str, user_id: str):
     gid, uid = int(guild_id), int(user_id)
-    session = db.Session()
-    try:
-        user = session.query(UserLevel).filter_by(guild_id=gid, user_id=uid).first()
-    finally:
-        session.close()
+    user = await db.find_user_level(gid, uid)
 
     info = get_user_info(gid, uid)
     if user:
@@ -243,7 +282,7 @@ async def update_user(
 ):
     _ensure_guild_admin(user, guild_id)
     gid, uid = int(guild_id), int(user_id)
-    db.update_user_level(
+    await db.update_user_level(
         guild_id=gid,
         user_id=uid,
         message_count=payload.message_count,
@@ -251,15 +290,14 @@ async def update_user(
         xp=payload.xp,
         days_on_server=payload.days_on_server,
     )
+    # Правка сообщений/XP/дней могла перевести через порог — бот сверит уровень этого участника
+    if payload.message_count is not None or payload.xp is not None or payload.days_on_server is not None:
+        await db.mark_levels_dirty([(gid, uid)])
 
-    session = db.Session()
-    try:
-        user = session.query(UserLevel).filter_by(guild_id=gid, user_id=uid).first()
-    finally:
-        session.close()
-
+    user = await db.find_user_level(gid, uid)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    member_view.apply_rows([user])
 
     info = get_user_info(gid, user.user_id)
     return UserLevelOut(
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends
+
+from app.api.deps import require_auth_or_api_key
+from app.core import guild_config_cache
+from app.db.provider import pool_metrics
+
+router = APIRouter(prefix="/api", tags=["metrics"], dependencies=[Depends(require_auth_or_api_key)])
+
+
+@router.get("/metrics/db")
+async def db_pool_metrics():
+    """Пулы соединений процесса (бот и API): ожидание соединения в мс, занятость, таймауты."""
+    return pool_metrics()
+
+
+@router.get("/metrics/guild-config")
+async def guild_config_cache_metrics():
+    """Кэш настроек гильдий этого процесса: попадания, промахи, сбросы, hit_ratio."""
+    return guild_config_cache.snapshot()
@@ -0,0 +1,135 @@
+"""
+Очередь поздравлений с новым уровнем: у каждого канала уровней своя очередь, которая разбирается
+в фоне. Повышения за окно window секунд склеиваются в одно сообщение (строки до лимита Discord
+в 2000 символов), отправка — не чаще лимита канала (5 сообщений за 5 секунд). Вызывающий код
+(on_message, update_days, полная сверка уровней) ставит поздравление в очередь и идёт дальше,
+не дожидаясь Discord.
+
+Переполнение: повторное повышение участника, который уже ждёт в очереди, сливается с прежним
+(объявляется последний уровень); сверх max_queue ожидающих новые поздравления отбрасываются.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any
+
+from app.bot.rate_limit import RateBucket
+
+MESSAGE_LIMIT = 2000
+# Лимит Discord на сообщения в канал
+CHANNEL_RATE = 5
+CHANNEL_PER = 5.0
+
+
+def format_level_up(mention: str, level: int, suffix: str = "") -> str:
+    return f"Красава брад {mention}! Ты достиг нового уровня {level}{suffix}!"
+
+
+class _ChannelQueue:
+    __slots__ = ("channel", "pending", "bucket", "task")
+
+    def __init__(self, channel):
+        self.channel = channel
+        # user_id -> (строка поздравления, время постановки); порядок — порядок первых повышений
+        self.pending: OrderedDict[int, tuple[str, float]] = OrderedDict()
+        self.bucket = RateBucket(CHANNEL_RATE, CHANNEL_PER)
+        self.task: asyncio.Task | None = None
+
+
+class LevelUpAnnouncer:
+    def __init__(self, window: float = 2.0, max_queue: int = 1000, samples: int = 500):
+        self.window = window
+        self.max_queue = max_queue
+        self._queues: dict[int, _ChannelQueue] = {}
+        self._latency_ms: deque[float] = deque(maxlen=samples)
+        self._closing = False
+        self.stats = {"queued": 0, "merged": 0, "dropped": 0, "messages": 0, "announced": 0, "failed": 0}
+
+    def announce(self, channel, user_id: int, mention: str, level: int, suffix: str = "") -> bool:
+        """Поставить поздравление в очередь канала; False — отброшено (очередь канала переполнена)."""
+        queue = self._queues.get(channel.id)
+        if queue is None:
+            queue = self._queues[channel.id] = _ChannelQueue(channel)
+        queue.channel = channel
+        line = format_level_up(mention, level, suffix)
+        previous = queue.pending.get(user_id)
+        if previous is not None:
+            # уже ждёт: объявим последний уровень, время ожидания считаем от первого повышения
+            queue.pending[user_id] = (line, previous[1])
+            self.stats["merged"] += 1
+        elif len(queue.pending) >= self.max_queue:
+            self.stats["dropped"] += 1
+            return False
+        else:
+            queue.pending[user_id] = (line, time.monotonic())
+            self.stats["queued"] += 1
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self._drain(queue))
+        return True
+
+    def _take_message(self, queue: _ChannelQueue) -> tuple[str, list[float]]:
+        """Снять из очереди строки, которые помещаются в одно сообщение."""
+        lines: list[str] = []
+        queued_at: list[float] = []
+        size = 0
+        while queue.pending:
+            user_id, (line, enqueued) = next(iter(queue.pending.items()))
+            if lines and size + 1 + len(line) > MESSAGE_LIMIT:
+                break
+            del queue.pending[user_id]
+            lines.append(line)
+            queued_at.append(enqueued)
+            size += len(line) + (1 if size else 0)
+        return "\n".join(lines), queued_at
+
+    async def _drain(self, queue: _ChannelQueue) -> None:
+        if not self._closing:
+            # окно склейки: ждём остальные повышения этой пачки; дальше копится, пока ждём лимит канала
+            await asyncio.sleep(self.window)
+        while queue.pending:
+            await queue.bucket.acquire()
+            content, queued_at = self._take_message(queue)
+            if not content:
+                continue
+            try:
+                await queue.channel.send(content)
+            except Exception as e:
+                self.stats["failed"] += len(queued_at)
+                print(f"Поздравления не отправлены в канал {queue.channel.id}: {e}")
+                continue
+            now = time.monotonic()
+            self._latency_ms.extend((now - t) * 1000 for t in queued_at)
+            self.stats["messages"] += 1
+            self.stats["announced"] += len(queued_at)
+
+    @property
+    def depth(self) -> int:
+        return sum(len(queue.pending) for queue in self._queues.values())
+
+    def snapshot(self) -> dict[str, Any]:
+        latencies = sorted(self._latency_ms)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+        return {
+            **self.stats,
+            "depth": self.depth,
+            "channels": sum(1 for queue in self._queues.values() if queue.pending),
+            "latency_ms_p50": round(percentile(50), 1),
+            "latency_ms_p95": round(percentile(95), 1),
+            "latency_ms_max": round(latencies[-1], 1) if latencies else 0.0,
+        }
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Дослать очереди без окна склейки (при остановке бота), не дольше timeout секунд."""
+        self._closing = True
+        tasks = [queue.task for queue in self._queues.values() if queue.task is not None and not queue.task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        for task in tasks:
+            task.cancel()
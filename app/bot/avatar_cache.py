@@ -0,0 +1,168 @@
+"""
+Кэш аватаров для карточек. Два уровня:
+- память: LRU уже декодированных и уменьшенных RGBA-изображений по (хэш аватара, размер);
+- диск: исходные байты с CDN по хэшу аватара, старше TTL — удаляются.
+Хэш аватара в Discord меняется вместе с картинкой, поэтому устаревшее содержимое по ключу не отдаётся.
+Один долгоживущий aiohttp-клиент на весь бот; одновременные запросы одного аватара ждут одну загрузку.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+import aiohttp
+from PIL import Image
+
+_DEFAULT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "cache", "avatars"))
+
+
+class AvatarCache:
+    def __init__(
+        self,
+        decode: Callable[[bytes, int], Awaitable[Image.Image]],
+        max_images: int = 256,
+        cache_dir: str | None = None,
+        ttl_seconds: float = 24 * 3600,
+    ):
+        """
+        decode — корутина (байты, размер) → RGBA-изображение (бот передаёт рендер в пуле).
+        ttl_seconds <= 0 — дисковый уровень отключён.
+        """
+        self._decode = decode
+        self.max_images = max_images
+        self.cache_dir = cache_dir or _DEFAULT_DIR
+        self.ttl_seconds = ttl_seconds
+        self._images: OrderedDict[tuple[str, int], Image.Image] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._http: aiohttp.ClientSession | None = None
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "downloads": 0, "coalesced": 0, "errors": 0, "evicted_files": 0}
+        if self.ttl_seconds > 0:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except OSError:
+                self.ttl_seconds = 0
+
+    @property
+    def http(self) -> aiohttp.ClientSession:
+        """Общий HTTP-клиент (создаётся при первом запросе — уже внутри event loop)."""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+        return self._http
+
+    async def close(self) -> None:
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+
+    def snapshot(self) -> dict[str, Any]:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["downloads"]
+        return {**self.stats, "images": len(self._images), "hit_ratio": hits / total if total else 0.0}
+
+    async def get(self, asset, size: int) -> Image.Image | None:
+        """Аватар (discord.Asset) как RGBA size x size; None — если скачать не удалось."""
+        key = asset.key
+        image = self._images.get((key, size))
+        if image is not None:
+            self._images.move_to_end((key, size))
+            self.stats["memory_hits"] += 1
+            return image
+        data = await self._get_bytes(key, str(asset.url))
+        if data is None:
+            return None
+        image = await self._decode(data, size)
+        self._images[(key, size)] = image
+        self._images.move_to_end((key, size))
+        while len(self._images) > self.max_images:
+            self._images.popitem(last=False)
+        return image
+
+    async def _get_bytes(self, key: str, url: str) -> bytes | None:
+        # Загрузка — отдельной задачей: отмена одного из ожидающих не обрывает её для остальных
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load_bytes(key, url))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        else:
+            self.stats["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _load_bytes(self, key: str, url: str) -> bytes | None:
+        data = await self._read_disk(key)
+        if data is not None:
+            self.stats["disk_hits"] += 1
+            return data
+        data = await self._download(url)
+        if data is not None:
+            await self._write_disk(key, data)
+        return data
+
+    async def _download(self, url: str) -> bytes | None:
+        self.stats["downloads"] += 1
+        try:
+            async with self.http.get(url) as resp:
+                if resp.status != 200:
+                    self.stats["errors"] += 1
+                    return None
+                return await resp.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats["errors"] += 1
+            print(f"Не удалось скачать аватар {url}: {e}")
+            return None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    async def _read_disk(self, key: str) -> bytes | None:
+        if self.ttl_seconds <= 0:
+            return None
+        return await asyncio.to_thread(self._read_file, self._path(key))
+
+    def _read_file(self, path: str) -> bytes | None:
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                os.remove(path)
+                self.stats["evicted_files"] += 1
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    async def _write_disk(self, key: str, data: bytes) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        await asyncio.to_thread(self._write_file, self._path(key), data)
+
+    @staticmethod
+    def _write_file(path: str, data: bytes) -> None:
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """Удалить с диска файлы старше TTL (вызывать в потоке). Возвращает число удалённых."""
+        if self.ttl_seconds <= 0:
+            return 0
+        removed = 0
+        deadline = time.time() - self.ttl_seconds
+        try:
+            entries = list(os.scandir(self.cache_dir))
+        except OSError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.is_file() and entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+                    removed += 1
+            except OSError:
+                continue
+        self.stats["evicted_files"] += removed
+        return removed
@@ -1,81 +1,32 @@
 from __future__ import annotations
 
+import asyncio
 import io
-import os
+import time
 from typing import Optional
 
-# Шрифт: сначала папка fonts в корне проекта, затем системные (для кириллицы)
-_FONTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "fonts"))
-_FONT_CANDIDATES = ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf", "dejavu.ttf")
-# Запас: системные шрифты с кириллицей (если в проекте нет fonts/)
-_WINDOWS_FONTS = (
-    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts", "arial.ttf"),
-    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts", "Arial.ttf"),
-)
-_LINUX_MAC_FONTS = (
-    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
-    "/usr/share/fonts/TTF/DejaVuSans.ttf",
-    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
-    "/System/Library/Fonts/Supplemental/Arial.ttf",
-    "/Library/Fonts/Arial.ttf",
-)
-
-
-def _get_font_path():
-    """Путь к ttf-шрифту: сначала fonts в проекте, потом системный (Arial и т.д.)."""
-    for name in _FONT_CANDIDATES:
-        path = os.path.normpath(os.path.join(_FONTS_DIR, name))
-        if os.path.isfile(path):
-            return path
-    # Если точных имён нет — ищем любой .ttf в папке (на случай другого имени/регистра)
-    if os.path.isdir(_FONTS_DIR):
-        try:
-            for name in os.listdir(_FONTS_DIR):
-                if name.lower().endswith(".ttf"):
-                    path = os.path.join(_FONTS_DIR, name)
-                    if os.path.isfile(path):
-                        return path
-        except OSError:
-            pass
-    for path in _WINDOWS_FONTS:
-        if os.path.isfile(path):
-            return path
-    for path in _LINUX_MAC_FONTS:
-        if os.path.isfile(path):
-            return path
-    return None
-
-
-# При первом запуске без папки fonts — создаём её (без вывода в консоль)
-if not os.path.isdir(_FONTS_DIR):
-    try:
-        os.makedirs(_FONTS_DIR, exist_ok=True)
-    except OSError:
-        pass
-
-
-def _load_font(size: int):
-    """Загружает шрифт для размера size. Читает файл в память, чтобы путь не мешал на Windows."""
-    path = _get_font_path()
-    if not path:
-        return ImageFont.load_default()
-    try:
-        with open(path, "rb") as f:
-            font_bytes = f.read()
-        return ImageFont.truetype(io.BytesIO(font_bytes), size, encoding="unic")
-    except Exception:
-        return ImageFont.load_default()
-
-import aiohttp
 import discord
 from discord import Activity, ActivityType, app_commands
 from discord.ext import commands, tasks
-from PIL import Image, ImageDraw, ImageFont
 
+from app.bot.announcer import LevelUpAnnouncer
+from app.bot.avatar_cache import AvatarCache
+from app.bot.card_cache import CardCache, card_key
+from app.bot.cards import fonts, load_avatar, render_level_card, render_welcome_card, style_for, templates
+from app.bot.leaderboard import Leaderboard
+from app.bot.render_service import RenderQueueFull, RenderService
+from app.bot.startup import CommandSyncState, StartupTimings, command_digest, run_guild_startup
+from app.bot.welcome import RoleGrantQueue, WelcomePipeline
+from app.bot.xp_buffer import XpBuffer
+from app.bot.xp_policy import XpPolicy, XpPolicyEngine, parse_guild_policies
+from app.core import guild_cache, guild_config_cache, member_view
+from app.core.cache_backend import make_backend
+from app.core.cache_sync import CachePublisher
 from app.core.config import Config
+from app.core.guild_cache import AVATAR_DEFAULT, AVATAR_GUILD, AVATAR_USER, MemberInfo
 from app.core.guild_cache import get_user_info as guild_get_user_info, is_deleted_user as guild_is_deleted_user, set_user_info as guild_set_user_info, sync_all as guild_cache_sync
-from app.core.levels import calculate_level, get_message_threshold, get_xp_threshold
-from app.db.database import Database
+from app.core.levels import calculate_level
+from app.db.provider import close_db, db
 
 
 class Bot(commands.Bot):
@@ -85,153 +36,404 @@ class Bot(commands.Bot):
         intents.message_content = True
         intents.presences = True
         super().__init__(command_prefix="!", intents=intents)
-        self.db = Database()
+        # Общий пул соединений loop бота (app.db.provider)
+        self.db = db
+        self.xp_buffer = XpBuffer(self.db, max_pending=Config.XP_FLUSH_MAX_PENDING)
+        # Pillow-рендер карточек — в пуле, чтобы не замораживать event loop
+        self.renderer = RenderService(
+            workers=Config.RENDER_WORKERS or None,
+            max_queue=Config.RENDER_MAX_QUEUE,
+            use_processes=Config.RENDER_USE_PROCESSES,
+        )
+        # Аватары: общий HTTP-клиент, LRU декодированных картинок в памяти и байты на диске
+        self.avatars = AvatarCache(
+            decode=lambda data, size: self.renderer.render(load_avatar, data, size),
+            max_images=Config.AVATAR_CACHE_SIZE,
+            cache_dir=Config.AVATAR_CACHE_DIR or None,
+            ttl_seconds=Config.AVATAR_CACHE_TTL_HOURS * 3600,
+        )
+        # Готовые PNG карточек /level по хэшу входов рендера
+        self.level_cards = CardCache(
+            max_bytes=int(Config.CARD_CACHE_MB * 1024 * 1024),
+            cache_dir=Config.CARD_CACHE_DIR or None,
+            max_disk_bytes=int(Config.CARD_CACHE_DISK_MB * 1024 * 1024),
+        )
+        # Поздравления с уровнем: очередь на канал, склейка за окно, лимит канала
+        self.announcer = LevelUpAnnouncer(window=Config.LEVELUP_WINDOW, max_queue=Config.LEVELUP_MAX_QUEUE)
+        xp_policy = XpPolicy(Config.XP_COOLDOWN, Config.XP_MIN_LENGTH, Config.XP_DUPLICATES, Config.XP_DUPLICATE_WINDOW)
+        self.xp_policy = XpPolicyEngine(
+            xp_policy,
+            parse_guild_policies(Config.XP_POLICY_GUILDS, xp_policy),
+            max_entries=Config.XP_POLICY_MAX_USERS,
+        )
+        # Входы участников: приветствие, строка уровня и роль в фоне; при наплыве — одно сообщение на пачку
+        self.welcome = WelcomePipeline(
+            self.db,
+            self.create_welcome_image,
+            RoleGrantQueue(rate=Config.WELCOME_ROLE_RATE, per=Config.WELCOME_ROLE_PER),
+            workers=Config.WELCOME_WORKERS,
+            burst_threshold=Config.WELCOME_BURST_THRESHOLD,
+            burst_window=Config.WELCOME_BURST_WINDOW,
+            batch_window=Config.WELCOME_BATCH_WINDOW,
+        )
+        # Изменения участников для кэша веб-API: guild_id -> user_id -> MemberInfo или None (вышел)
+        self._member_deltas: dict[int, dict[int, MemberInfo | None]] = {}
+        # Лидерборд в памяти (опционально): ранг за O(log n) без запросов к БД
+        self.leaderboard = Leaderboard() if Config.LEADERBOARD_IN_MEMORY else None
+        # Счётчики сверки уровней: сколько строк проверено и сколько повышено (очередь / полный проход)
+        self.level_sync_stats = {"checked": 0, "promoted": 0, "full_checked": 0, "full_promoted": 0}
+        # Хэши слэш-команд по гильдиям: неизменившиеся команды не синхронизируем заново
+        self.command_sync = CommandSyncState(Config.COMMAND_SYNC_STATE or None)
+        # Публикация снимков гильдий в общий кэш для API в отдельных процессах (если задан CACHE_BACKEND)
+        backend = make_backend()
+        self.cache_publisher = CachePublisher(backend) if backend is not None else None
         self.token = Config.DISCORD_TOKEN
 
     async def setup_hook(self):
-        # В БД не добавляем ботов и удалённые аккаунты (deleted_user_...), чтобы они не появлялись в топе
-        for guild in self.guilds:
-            print(f"Инициализация пользователей на сервере: {guild.name}")
-            members_ok = [
-                m for m in guild.members
-                if not getattr(m, "bot", False)
-                and not guild_is_deleted_user(
-                    m.display_name or getattr(m, "global_name", None) or m.name or ""
-                )
-            ]
-            self.db.add_all_users_to_guild(guild.id, members_ok)
+        font_ms = fonts.preload()
+        print(f"Шрифты карточек: {fonts.paths} — загружены за {font_ms:.1f} мс")
+        template_ms = templates.preload()
+        print(f"Шаблоны карточек построены за {template_ms:.1f} мс")
         self.add_view(RoleSelectView())
         self.update_days.start()
-        self.sync_all_levels.start()
+        self.sync_dirty_levels.start()
+        if Config.LEVEL_FULL_SYNC_HOURS > 0:
+            self.sync_all_levels.start()
+        self.flush_xp.start()
+        self.flush_member_cache.start()
+        self.prune_card_caches.start()
+        if self.cache_publisher is not None:
+            self.publish_cache.start()
+
+    async def close(self):
+        # Дописываем буфер XP до закрытия соединения, чтобы не потерять последние сообщения
+        if self.flush_xp.is_running():
+            self.flush_xp.cancel()
+        await self.xp_buffer.flush()
+        # очереди объявлений и приветствий дописываются, пока шлюз ещё подключён (до ~30 с)
+        await self.announcer.close()
+        await self.welcome.close()
+        await super().close()
+        # после отключения событий больше нет: сообщения, пришедшие за время закрытия очередей, — в БД
+        await self.xp_buffer.flush()
+        await self.avatars.close()
+        self.renderer.shutdown()
+        await close_db()
+
+    @staticmethod
+    def _guild_entry(guild) -> dict:
+        return {
+            "id": guild.id,
+            "name": guild.name,
+            "icon": str(guild.icon.url) if guild.icon else None,
+        }
+
+    @staticmethod
+    def _channel_entries(guild) -> list[dict]:
+        return [
+            {"id": c.id, "name": c.name, "type": getattr(c.type, "value", 0)}
+            for c in guild.channels
+        ]
+
+    @staticmethod
+    def _role_entries(guild) -> list[dict]:
+        return [
+            {"id": r.id, "name": r.name}
+            for r in guild.roles
+            if not r.is_default()
+        ]
+
+    @staticmethod
+    def _member_entry(member) -> MemberInfo | None:
+        """Имя и аватар участника для кэша; None — бот или удалённый аккаунт (в кэш не попадают)."""
+        if getattr(member, "bot", False):
+            return None
+        name = member.display_name or getattr(member, "global_name", None) or member.name or f"User {member.id}"
+        if guild_is_deleted_user(name):
+            return None
+        # Храним хэш аватара (строку discord.py, без копии), URL кэш соберёт сам при выдаче
+        guild_avatar = getattr(member, "guild_avatar", None)
+        if guild_avatar is not None:
+            kind, key = AVATAR_GUILD, guild_avatar.key
+        elif member.avatar is not None:
+            kind, key = AVATAR_USER, member.avatar.key
+        else:
+            kind, key = AVATAR_DEFAULT, member.default_avatar.key
+        return MemberInfo(member.guild.id, member.id, name, kind, key)
+
+    def _member_entries(self, guild) -> dict[int, MemberInfo]:
+        users = {}
+        for member in guild.members:
+            entry = self._member_entry(member)
+            if entry is not None:
+                users[member.id] = entry
+        return users
 
     def _build_guild_cache(self):
-        """Собрать кэш гильдий/каналов/ролей/участников для веб-API."""
+        """Собрать кэш гильдий/каналов/ролей/участников для веб-API целиком (on_ready / восстановление)."""
         guilds = []
         channels = {}
         roles = {}
         users = {}
         for guild in self.guilds:
-            guilds.append({
-                "id": guild.id,
-                "name": guild.name,
-                "icon": str(guild.icon.url) if guild.icon else None,
-            })
-            channels[guild.id] = [
-                {"id": c.id, "name": c.name, "type": getattr(c.type, "value", 0)}
-                for c in guild.channels
-            ]
-            roles[guild.id] = [
-                {"id": r.id, "name": r.name}
-                for r in guild.roles
-                if not r.is_default()
-            ]
-            users[guild.id] = {}
-            for member in guild.members:
-                if getattr(member, "bot", False):
-                    continue
-                name = member.display_name or getattr(member, "global_name", None) or member.name or f"User {member.id}"
-                if guild_is_deleted_user(name):
-                    continue
-                avatar = str(member.display_avatar.url) if member.display_avatar else None
-                users[guild.id][member.id] = {"name": name, "avatar": avatar}
+            guilds.append(self._guild_entry(guild))
+            channels[guild.id] = self._channel_entries(guild)
+            roles[guild.id] = self._role_entries(guild)
+            users[guild.id] = self._member_entries(guild)
+        # Всё, что накопилось до пересборки, в ней уже учтено
+        self._member_deltas.clear()
         guild_cache_sync(guilds, channels, roles, users)
 
+    def _queue_member(self, member, removed: bool = False) -> None:
+        """Изменение участника для кэша веб-API — уходит пачкой в flush_member_cache."""
+        entry = None if removed else self._member_entry(member)
+        self._member_deltas.setdefault(member.guild.id, {})[member.id] = entry
+
+    @tasks.loop(seconds=1)
+    async def flush_member_cache(self):
+        if not self._member_deltas:
+            return
+        deltas, self._member_deltas = self._member_deltas, {}
+        for guild_id, changes in deltas.items():
+            upserts = {uid: entry for uid, entry in changes.items() if entry is not None}
+            removed = [uid for uid, entry in changes.items() if entry is None]
+            guild_cache.apply_user_deltas(guild_id, upserts, removed)
+
+    @tasks.loop(seconds=Config.CACHE_PUBLISH_INTERVAL)
+    async def publish_cache(self):
+        # Сериализация и запись — в потоке: снимки неизменяемы, бот тем временем работает дальше
+        try:
+            await asyncio.to_thread(self.cache_publisher.publish)
+        except Exception as e:
+            print(f"Общий кэш: не удалось опубликовать снимки: {e}")
+
     async def on_ready(self):
         status_type = getattr(ActivityType, Config.BOT_STATUS_TYPE, ActivityType.listening)
         status_name = Config.BOT_STATUS_NAME or "ALBLAK 52"
         await self.change_presence(activity=Activity(type=status_type, name=status_name))
-        for guild in self.guilds:
-            self.tree.copy_global_to(guild=guild)
-            await self.tree.sync(guild=guild)
-            print(f"Команды синхронизированы для сервера: {guild.name}")
-            try:
-                await guild.chunk()
-            except Exception as e:
-                print(f"Предупреждение: не удалось подгрузить участников {guild.name}: {e}")
+        timings = StartupTimings()
+        await run_guild_startup(
+            self.guilds,
+            [
+                ("команды", lambda guild: self._sync_commands(guild, timings)),
+                ("участники", self._chunk_guild),
+                ("БД", self._backfill_guild),
+            ],
+            Config.STARTUP_CONCURRENCY,
+            timings,
+        )
+        self.command_sync.save()
+        started = time.perf_counter()
         self._build_guild_cache()
+        timings.add("кэш API", time.perf_counter() - started)
+        print(timings.report())
         print("Бот готов к работе! Слэш-команды синхронизированы.")
 
+    async def _sync_commands(self, guild, timings: StartupTimings | None = None) -> None:
+        """Слэш-команды для гильдии; tree.sync только если набор команд изменился с прошлого раза."""
+        self.tree.copy_global_to(guild=guild)
+        digest = command_digest(self.tree, guild)
+        if self.command_sync.is_current(guild.id, digest):
+            if timings is not None:
+                timings.count("команды без изменений")
+            return
+        await self.tree.sync(guild=guild)
+        self.command_sync.mark(guild.id, digest)
+        if timings is not None:
+            timings.count("команды синхронизированы")
+        print(f"Команды синхронизированы для сервера: {guild.name}")
+
+    @staticmethod
+    async def _chunk_guild(guild) -> None:
+        if not guild.chunked:
+            await guild.chunk()
+
+    async def _backfill_guild(self, guild) -> None:
+        # В БД не добавляем ботов и удалённые аккаунты (deleted_user_...), чтобы они не появлялись в топе
+        members_ok = [
+            m for m in guild.members
+            if not getattr(m, "bot", False)
+            and not guild_is_deleted_user(
+                m.display_name or getattr(m, "global_name", None) or m.name or ""
+            )
+        ]
+        started = time.perf_counter()
+        added = await self.db.add_all_users_to_guild(guild.id, members_ok)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{guild.name}: участников {len(members_ok)}, добавлено в БД {added} за {elapsed:.2f} с "
+            f"({len(members_ok) / elapsed if elapsed else 0:,.0f} строк/с)"
+        )
+
     async def on_guild_join(self, guild):
         try:
             await guild.chunk()
         except Exception:
             pass
         # Регистрируем слэш-команды для нового сервера (иначе они не появятся сразу)
-        self.tree.copy_global_to(guild=guild)
-        await self.tree.sync(guild=guild)
-        print(f"Команды синхронизированы для нового сервера: {guild.name}")
-        self._build_guild_cache()
+        await self._sync_commands(guild)
+        self.command_sync.save()
+        guild_cache.update_guild(
+            self._guild_entry(guild),
+            self._channel_entries(guild),
+            self._role_entries(guild),
+            self._member_entries(guild),
+        )
 
     async def on_guild_remove(self, guild):
-        self._build_guild_cache()
+        self._member_deltas.pop(guild.id, None)
+        guild_cache.remove_guild(guild.id)
+        self.command_sync.forget(guild.id)
+        self.command_sync.save()
+
+    async def on_guild_update(self, before, after):
+        # Имя/иконка сервера: участников не трогаем
+        guild_cache.update_guild(self._guild_entry(after), self._channel_entries(after), self._role_entries(after))
+
+    async def on_guild_channel_create(self, channel):
+        guild_cache.set_guild_channels(channel.guild.id, self._channel_entries(channel.guild))
+
+    async def on_guild_channel_delete(self, channel):
+        guild_cache.set_guild_channels(channel.guild.id, self._channel_entries(channel.guild))
+
+    async def on_guild_channel_update(self, before, after):
+        if before.name != after.name or before.type != after.type:
+            guild_cache.set_guild_channels(after.guild.id, self._channel_entries(after.guild))
+
+    async def on_guild_role_create(self, role):
+        guild_cache.set_guild_roles(role.guild.id, self._role_entries(role.guild))
+
+    async def on_guild_role_delete(self, role):
+        guild_cache.set_guild_roles(role.guild.id, self._role_entries(role.guild))
+
+    async def on_guild_role_update(self, before, after):
+        if before.name != after.name or before.position != after.position:
+            guild_cache.set_guild_roles(after.guild.id, self._role_entries(after.guild))
+
+    async def on_member_remove(self, member):
+        self._queue_member(member, removed=True)
+        member_view.remove_member(member.guild.id, member.id)
+
+    async def on_member_update(self, before, after):
+        # Роли, таймауты и т.п. кэшу не нужны — только ник и аватар
+        if before.display_name != after.display_name or before.display_avatar != after.display_avatar:
+            self._queue_member(after)
+
+    async def on_user_update(self, before, after):
+        # Глобальное имя/аватар — во всех общих с ботом серверах (если там не задан свой ник/аватар)
+        if before.name == after.name and before.global_name == after.global_name and before.avatar == after.avatar:
+            return
+        for guild in after.mutual_guilds:
+            member = guild.get_member(after.id)
+            if member is not None:
+                self._queue_member(member)
+
+    @tasks.loop(seconds=Config.XP_FLUSH_INTERVAL)
+    async def flush_xp(self):
+        await self.xp_buffer.flush()
+
+    async def _announce_level_ups(self, guild, promoted: list[tuple[int, int]], suffix: str = "") -> None:
+        """Уведомления о новом уровне в канал уровней: promoted = [(user_id, новый уровень)], объявляем с 6-го."""
+        announce = [(user_id, new_level) for user_id, new_level in promoted if new_level > 5]
+        if not announce:
+            return
+        config = await self.db.get_guild_config(guild.id)
+        if not config or not config["level_channel_id"]:
+            return
+        channel = guild.get_channel(config["level_channel_id"])
+        if not channel:
+            return
+        for user_id, new_level in announce:
+            member = guild.get_member(user_id)
+            if member:
+                self.announcer.announce(channel, user_id, member.mention, new_level, suffix)
 
     @tasks.loop(hours=24)
     async def update_days(self):
+        # Сначала дописываем буфер XP, чтобы работать с актуальными строками
+        await self.xp_buffer.flush()
+        total_started = time.perf_counter()
         for guild in self.guilds:
-            users = self.db.get_users_in_guild(guild.id)
-            for user_level in users:
-                new_days = user_level.days_on_server + 1
-                xp_gain = (new_days // 2) * 15 - (user_level.days_on_server // 2) * 15
-                new_xp = user_level.xp + xp_gain
-
-                current_level = user_level.level
-                new_level = calculate_level(user_level.message_count, new_xp, new_days)
-                # уровень только вверх, пересчёт всегда по текущему XP
-                new_level = max(current_level, new_level)
-
-                self.db.update_user_level(
-                    guild.id,
-                    user_level.user_id,
-                    message_count=user_level.message_count,
-                    level=new_level,
-                    xp=new_xp,
-                    days_on_server=new_days,
-                )
-
-                if new_level > current_level and new_level > 5:
-                    config = self.db.get_guild_config(guild.id)
-                    if config and config["level_channel_id"]:
-                        channel = guild.get_channel(config["level_channel_id"])
-                        if channel:
-                            member = guild.get_member(user_level.user_id)
-                            if member:
-                                await channel.send(
-                                    f"Красава брад {member.mention}! Ты достиг нового уровня {new_level} за время на сервере!"
-                                )
+            # Один set-based UPDATE на гильдию: +1 день, бонус XP и уровень (только вверх) считаются в SQL
+            started = time.perf_counter()
+            updated, promoted = await self.db.increment_days_on_server(guild.id)
+            db_ms = (time.perf_counter() - started) * 1000
+            await self._announce_level_ups(guild, promoted, suffix=" за время на сервере")
+            # XP поменялся у всей гильдии — лидерборд и список для веб-панели перечитаем из БД
+            if self.leaderboard is not None:
+                self.leaderboard.invalidate(guild.id)
+            member_view.invalidate(guild.id)
+            total_ms = (time.perf_counter() - started) * 1000
+            print(
+                f"update_days: {guild.name}: строк {updated}, повышений {len(promoted)}, "
+                f"UPDATE {db_ms:.0f} мс, всего {total_ms:.0f} мс"
+            )
+        print(f"update_days: готово за {(time.perf_counter() - total_started) * 1000:.0f} мс")
 
     @update_days.before_loop
     async def before_update_days(self):
         await self.wait_until_ready()
 
-    @tasks.loop(minutes=10)
+    async def _promote(self, rows) -> int:
+        """Поднять уровень тем строкам, у которых он ниже расчётного, и объявить. Возвращает число повышений."""
+        promoted = [
+            (u.guild_id, u.user_id, computed)
+            for u in rows
+            if (computed := calculate_level(u.message_count, u.xp, u.days_on_server)) > u.level
+        ]
+        if not promoted:
+            return 0
+        await self.db.raise_user_levels(promoted)
+        by_key = {(u.guild_id, u.user_id): u for u in rows}
+        for guild_id, user_id, new_level in promoted:
+            u = by_key[(guild_id, user_id)]
+            u.level = new_level
+            self._track_score(guild_id, user_id, new_level, u.xp)
+        member_view.apply_rows(by_key[(gid, uid)] for gid, uid, _ in promoted)
+        by_guild: dict[int, list[tuple[int, int]]] = {}
+        for guild_id, user_id, new_level in promoted:
+            by_guild.setdefault(guild_id, []).append((user_id, new_level))
+        for guild_id, guild_promoted in by_guild.items():
+            guild = self.get_guild(guild_id)
+            if guild:
+                await self._announce_level_ups(guild, guild_promoted)
+        return len(promoted)
+
+    @tasks.loop(minutes=Config.LEVEL_SYNC_MINUTES)
+    async def sync_dirty_levels(self):
+        """Сверяем уровень только у участников из очереди (менялись сообщения/XP/дни) и при переходе порога — авто-ап."""
+        await self.xp_buffer.flush()
+        checked = promoted = 0
+        while True:
+            rows = await self.db.take_dirty_user_levels(limit=1000)
+            if not rows:
+                break
+            checked += len(rows)
+            promoted += await self._promote(rows)
+        self.level_sync_stats["checked"] += checked
+        self.level_sync_stats["promoted"] += promoted
+        if checked:
+            print(f"sync_dirty_levels: проверено {checked}, повышено {promoted}")
+
+    @sync_dirty_levels.before_loop
+    async def before_sync_dirty_levels(self):
+        await self.wait_until_ready()
+
+    @tasks.loop(hours=Config.LEVEL_FULL_SYNC_HOURS)
     async def sync_all_levels(self):
-        """Периодически пересчитываем уровень у всех по текущему XP и при переходе порога — авто-ап и уведомление."""
+        """Полный проход по всем участникам (страховка к очереди сверки) — редко, LEVEL_FULL_SYNC_HOURS."""
+        await self.xp_buffer.flush()
+        checked = promoted = 0
         for guild in self.guilds:
-            users = self.db.get_users_in_guild(guild.id)
-            config = self.db.get_guild_config(guild.id)
-            channel = None
-            if config and config.get("level_channel_id"):
-                channel = guild.get_channel(config["level_channel_id"])
-            for user_level in users:
-                computed = calculate_level(
-                    user_level.message_count, user_level.xp, user_level.days_on_server
-                )
-                if computed <= user_level.level:
-                    continue
-                self.db.update_user_level(
-                    guild.id,
-                    user_level.user_id,
-                    message_count=user_level.message_count,
-                    level=computed,
-                    xp=user_level.xp,
-                    days_on_server=user_level.days_on_server,
-                )
-                if computed > 5 and channel:
-                    member = guild.get_member(user_level.user_id)
-                    if member:
-                        await channel.send(
-                            f"Красава брад {member.mention}! Ты достиг нового уровня {computed}!"
-                        )
+            users = await self.db.get_users_in_guild(guild.id)
+            checked += len(users)
+            promoted += await self._promote(users)
+        self.level_sync_stats["full_checked"] += checked
+        self.level_sync_stats["full_promoted"] += promoted
+        # Страховка от расхождений (например, правки из веб-панели): лидерборд перечитается из БД
+        if self.leaderboard is not None:
+            self.leaderboard.invalidate()
+        print(f"sync_all_levels: проверено {checked}, повышено {promoted}")
 
     @sync_all_levels.before_loop
     async def before_sync_all_levels(self):
@@ -241,25 +443,8 @@ class Bot(commands.Bot):
         if member.bot:
             return
 
-        self.db.get_user_level(member.guild.id, member.id)
-
-        config = self.db.get_guild_config(member.guild.id)
-        if config and config["welcome_channel_id"]:
-            channel = member.guild.get_channel(config["welcome_channel_id"])
-            role = member.guild.get_role(config["welcome_role_id"])
-
-            if channel:
-                member_count = member.guild.member_count
-                image = await self.create_welcome_image(member, member_count)
-                message = f"С нами новый брад {member.mention}, Добро пожаловать на сервер **{member.guild.name}**"
-                if image:
-                    file = discord.File(image, filename="welcome.png")
-                    await channel.send(content=message, file=file)
-                else:
-                    await channel.send(content=message)
-
-            if role:
-                await member.add_roles(role)
+        self._queue_member(member)
+        self.welcome.submit(member, listed=self._member_entry(member) is not None)
 
     async def on_message(self, message):
         if message.author.bot:
@@ -267,97 +452,86 @@ class Bot(commands.Bot):
         name = getattr(message.author, "global_name", None) or message.author.name or ""
         if guild_is_deleted_user(name):
             return  # не создаём запись и не начисляем XP удалённым аккаунтам
-
-        user_level = self.db.get_user_level(message.guild.id, message.author.id)
-        old_level = user_level.level
-        user_level.message_count += 1
-
-        xp_gain = 10 if old_level >= 5 else 0
-        user_level.xp += xp_gain
-
-        # Всегда пересчитываем уровень по текущему XP и сохраняем в БД
-        computed_level = calculate_level(
-            user_level.message_count, user_level.xp, user_level.days_on_server
-        )
-        self.db.update_user_level(
-            message.guild.id,
-            message.author.id,
-            message_count=user_level.message_count,
-            level=computed_level,
-            xp=user_level.xp,
-            days_on_server=user_level.days_on_server,
-        )
+        if not self.xp_policy.check(message.guild.id, message.author.id, message.content):
+            return  # антиспам: сообщение не засчитано, в буфер XP и БД не идём
+
+        # Состояние в памяти (буфер XP), в БД уходит пачкой по таймеру
+        old_level, computed_level = await self.xp_buffer.add_message(message.guild.id, message.author.id)
+        if self.leaderboard is not None:
+            entry = await self.xp_buffer.get(message.guild.id, message.author.id)
+            self._track_score(entry.guild_id, entry.user_id, entry.level, entry.xp)
         if computed_level > old_level and computed_level > 5:
-            config = self.db.get_guild_config(message.guild.id)
+            config = await self.db.get_guild_config(message.guild.id)
             if config and config["level_channel_id"]:
                 channel = message.guild.get_channel(config["level_channel_id"])
                 if channel:
-                    await channel.send(
-                        f"Красава брад {message.author.mention}! Ты достиг нового уровня {computed_level}!"
-                    )
+                    self.announcer.announce(channel, message.author.id, message.author.mention, computed_level)
 
-    async def create_welcome_image(self, member, member_count):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(str(member.display_avatar.url)) as resp:
-                if resp.status != 200:
-                    return None
-                avatar_data = await resp.read()
-
-        avatar = Image.open(io.BytesIO(avatar_data)).convert("RGBA")
-        avatar = avatar.resize((200, 200), Image.LANCZOS)
-
-        mask = Image.new("L", (200, 200), 0)
-        draw_mask = ImageDraw.Draw(mask)
-        draw_mask.ellipse((0, 0, 200, 200), fill=255)
-
-        avatar_circle = Image.new("RGBA", (200, 200), (0, 0, 0, 0))
-        avatar_circle.paste(avatar, (0, 0), mask)
-
-        background = Image.new("RGBA", (600, 300), (0, 0, 0, 255))
-        draw_border = ImageDraw.Draw(background)
-        draw_border.ellipse((195, 15, 405, 225), outline=(255, 255, 255, 255), width=5)
-        background.paste(avatar_circle, (200, 20), avatar_circle)
-
-        draw = ImageDraw.Draw(background)
-        font = _load_font(30)
-        small_font = _load_font(20)
-
-        text1 = f"{member.name} уже на нашем сервере"
-        draw.text((300 - draw.textlength(text1, font=font) / 2, 230), text1, fill=(255, 255, 255, 255), font=font)
-
-        text2 = f"БРАД #{member_count}"
-        draw.text(
-            (300 - draw.textlength(text2, font=small_font) / 2, 270),
-            text2,
-            fill=(255, 255, 255, 255),
-            font=small_font,
-        )
-
-        buffer = io.BytesIO()
-        background.save(buffer, format="PNG")
-        buffer.seek(0)
-        return buffer
+    def _track_score(self, guild_id: int, user_id: int, level: int, xp: int) -> None:
+        if self.leaderboard is not None:
+            self.leaderboard.update(guild_id, user_id, level, xp)
 
-    async def create_level_image(self, member, user_level):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(str(member.display_avatar.url)) as resp:
-                if resp.status != 200:
-                    return None
-                avatar_data = await resp.read()
-
-        avatar = Image.open(io.BytesIO(avatar_data)).convert("RGBA")
-        avatar = avatar.resize((100, 100), Image.LANCZOS)
+    async def _ensure_leaderboard(self, guild_id: int) -> None:
+        if self.leaderboard.is_loaded(guild_id):
+            return
+        scores = {u.user_id: (u.user_id, u.level, u.xp) for u in await self.db.get_users_in_guild(guild_id)}
+        # Поверх БД — ещё не записанное из буфера XP
+        for entry in self.xp_buffer.guild_entries(guild_id):
+            scores[entry.user_id] = (entry.user_id, entry.level, entry.xp)
+        self.leaderboard.load(guild_id, scores.values())
+
+    async def top_users(self, guild_id: int, n: int):
+        """Первые n участников по (уровень, XP): строки с user_id/level/xp."""
+        if self.leaderboard is None:
+            return await self.db.top_n(guild_id, n)
+        await self._ensure_leaderboard(guild_id)
+        return self.leaderboard.top(guild_id, n)
+
+    async def rank_of(self, guild_id: int, user_id: int, level: int, xp: int) -> int:
+        """Место участника по (уровень, XP) с его текущими (возможно, ещё не записанными) значениями."""
+        if self.leaderboard is None:
+            return await self.db.rank_of(guild_id, user_id, level, xp)
+        await self._ensure_leaderboard(guild_id)
+        self.leaderboard.update(guild_id, user_id, level, xp)
+        return self.leaderboard.rank(guild_id, level, xp)
+
+    async def _fetch_avatar(self, member, size: int):
+        """Аватар участника как RGBA size x size из кэша; None — не скачался или очередь рендера полна."""
+        try:
+            return await self.avatars.get(member.display_avatar, size)
+        except RenderQueueFull as e:
+            print(f"Рендер пропущен: {e}")
+            return None
+
+    @tasks.loop(hours=1)
+    async def prune_card_caches(self):
+        removed = await asyncio.to_thread(self.avatars.prune)
+        removed_cards = await asyncio.to_thread(self.level_cards.prune)
+        print(
+            f"Кэши карточек: аватары {self.avatars.snapshot()}, удалено файлов {removed}; "
+            f"карточки уровня {self.level_cards.snapshot()}, удалено файлов {removed_cards}"
+        )
+        print(f"Кэш настроек гильдий: {guild_config_cache.snapshot()}")
+        print(f"Поздравления с уровнем: {self.announcer.snapshot()}")
+        print(f"Антиспам XP: {self.xp_policy.snapshot()}")
+        print(f"Приветствия: {self.welcome.snapshot()}")
 
-        mask = Image.new("L", (100, 100), 0)
-        draw_mask = ImageDraw.Draw(mask)
-        draw_mask.ellipse((0, 0, 100, 100), fill=255)
-        avatar.putalpha(mask)
+    async def _render(self, fn, *args) -> io.BytesIO | None:
+        """Отрисовка в пуле; при переполненной очереди — None (отправим без картинки)."""
+        try:
+            data = await self.renderer.render(fn, *args)
+        except RenderQueueFull as e:
+            print(f"Рендер пропущен: {e}")
+            return None
+        return io.BytesIO(data)
 
-        background = Image.new("RGBA", (600, 168), (0, 0, 0, 255))
-        draw_border = ImageDraw.Draw(background)
-        draw_border.ellipse((15, 20, 125, 130), outline=(255, 255, 255, 255), width=3)
-        background.paste(avatar, (20, 25), avatar)
+    async def create_welcome_image(self, member, member_count):
+        avatar = await self._fetch_avatar(member, 200)
+        if avatar is None:
+            return None
+        return await self._render(render_welcome_card, avatar, member.name, member_count, style_for(member.guild.id))
 
+    async def create_level_image(self, member, user_level):
         status_colors = {
             discord.Status.online: (67, 181, 129, 255),
             discord.Status.offline: (67, 181, 129, 255),
@@ -366,79 +540,44 @@ class Bot(commands.Bot):
         }
         status = member.status
         status_color = status_colors.get(status, (67, 181, 129, 255))
-        draw = ImageDraw.Draw(background)
-        draw.ellipse((95, 100, 115, 120), fill=status_color)
 
-        font = _load_font(30)
-        small_font = _load_font(20)
-
-        draw.text((140, 20), member.name, fill=(255, 255, 255, 255), font=font)
-
-        rank = sum(1 for u in self.db.get_users_in_guild(member.guild.id) if u.level > user_level.level) + 1
-        level_text = f"РАНГ #{rank} УРОВЕНЬ {user_level.level}"
-        draw.text((140, 60), level_text, fill=(186, 85, 211, 255), font=small_font)
-
-        next_level = min(user_level.level + 1, 999)
-        current_threshold = get_message_threshold(user_level.level) if user_level.level < 5 else get_xp_threshold(user_level.level)
-        next_threshold = get_message_threshold(next_level) if next_level <= 5 else get_xp_threshold(next_level)
-
-        if user_level.level < 5:
-            progress = user_level.message_count / next_threshold if next_threshold > 0 else 1
-            xp_text = f"{user_level.message_count}/{next_threshold} сообщений"
-        else:
-            # Полоса: прогресс в сегменте 0–600 до след. уровня (сбрасывается после аппа)
-            required_in_segment = next_threshold - current_threshold  # 600 XP до след. уровня
-            if required_in_segment <= 0:
-                progress = 1.0
-                xp_in_segment = 0
-            else:
-                xp_in_segment = max(0, user_level.xp - current_threshold)
-                progress = min(1.0, float(xp_in_segment) / required_in_segment)
-            # Текст — полный XP (209455), полоса — по сегменту (5/600)
-            xp_text = f"{user_level.xp}/{next_threshold} XP"
-
-        draw.text((140, 88), xp_text, fill=(255, 255, 255, 255), font=small_font)
-
-        # Полоса прогресса: отступ от текста, ровная и аккуратная
-        bar_left = 140
-        bar_top = 118
-        bar_width = 440
-        bar_height = 22
-        bar_radius = 11
-        progress = max(0.0, min(1.0, float(progress)))
-        filled_width = int(bar_width * progress)
-        if filled_width == 0 and (progress > 0 or (user_level.level >= 5 and user_level.xp > 0)):
-            filled_width = 8
-        if filled_width > bar_width:
-            filled_width = bar_width
-
-        # Фон полосы (серый, скруглённый)
-        draw.rounded_rectangle(
-            (bar_left, bar_top, bar_left + bar_width, bar_top + bar_height),
-            radius=bar_radius,
-            fill=(70, 70, 70, 255),
-            outline=(100, 100, 100, 255),
-            width=1,
+        rank = await self.rank_of(member.guild.id, member.id, user_level.level, user_level.xp)
+        style = style_for(member.guild.id)
+
+        # Всё, что видно на карточке: при совпадении отдаём готовый PNG без скачивания аватара и Pillow
+        key = card_key(
+            "level",
+            member.display_avatar.key,
+            member.name,
+            status_color,
+            rank,
+            user_level.level,
+            user_level.message_count,
+            user_level.xp,
+            fonts.paths,
+            tuple(style),
         )
-        # Заливка прогресса: скруглённая слева и справа (капсула), как контейнер
-        inset = 2
-        fill_left = bar_left + inset
-        fill_top = bar_top + inset
-        fill_height = bar_height - 2 * inset
-        fill_width = max(0, filled_width - 2 * inset)
-        if fill_width > 0 and fill_height > 0:
-            fill_radius = min(bar_radius - 1, fill_height // 2, fill_width // 2)
-            draw.rounded_rectangle(
-                (fill_left, fill_top, fill_left + fill_width, fill_top + fill_height),
-                radius=fill_radius,
-                fill=(186, 85, 211, 255),
-            )
-
-        buffer = io.BytesIO()
-        background.save(buffer, format="PNG", quality=95)
-        buffer.seek(0)
-        return buffer
-
+        cached = await self.level_cards.get(key)
+        if cached is not None:
+            return io.BytesIO(cached)
+
+        avatar = await self._fetch_avatar(member, 100)
+        if avatar is None:
+            return None
+        image = await self._render(
+            render_level_card,
+            avatar,
+            member.name,
+            status_color,
+            rank,
+            user_level.level,
+            user_level.message_count,
+            user_level.xp,
+            style,
+        )
+        if image is not None:
+            await self.level_cards.put(key, image.getvalue())
+        return image
 
 bot = Bot()
 
@@ -450,36 +589,28 @@ async def level(interaction: discord.Interaction):
     if guild_is_deleted_user(name):
         await interaction.followup.send("Для удалённых аккаунтов уровень не отображается.", ephemeral=True)
         return
-    user_level = bot.db.get_user_level(interaction.guild.id, interaction.user.id)
+    # Берём состояние через буфер XP: там могут быть ещё не записанные в БД сообщения
+    user_level = await bot.xp_buffer.get(interaction.guild.id, interaction.user.id)
     old_level = user_level.level
     computed_level = calculate_level(
         user_level.message_count, user_level.xp, user_level.days_on_server
     )
-    # Всегда записываем в БД рассчитанный уровень (синхронизация)
-    bot.db.update_user_level(
-        interaction.guild.id,
-        interaction.user.id,
-        message_count=user_level.message_count,
-        level=computed_level,
-        xp=user_level.xp,
-        days_on_server=user_level.days_on_server,
-    )
+    # Синхронизация уровня уходит в БД вместе с буфером (уровень только вверх)
+    computed_level = max(old_level, computed_level)
     user_level.level = computed_level
     if computed_level > old_level and computed_level > 5:
-        config = bot.db.get_guild_config(interaction.guild.id)
+        config = await bot.db.get_guild_config(interaction.guild.id)
         if config and config["level_channel_id"]:
             channel = interaction.guild.get_channel(config["level_channel_id"])
             if channel:
-                await channel.send(
-                    f"Красава брад {interaction.user.mention}! Ты достиг нового уровня {computed_level}!"
-                )
+                bot.announcer.announce(channel, interaction.user.id, interaction.user.mention, computed_level)
     image = await bot.create_level_image(interaction.user, user_level)
     if not image:
         await interaction.followup.send("Не удалось собрать картинку уровня (аватар недоступен).", ephemeral=True)
         return
     file = discord.File(image, filename="level.png")
 
-    config = bot.db.get_guild_config(interaction.guild.id)
+    config = await bot.db.get_guild_config(interaction.guild.id)
     if config and config["level_channel_id"]:
         channel = interaction.guild.get_channel(config["level_channel_id"])
         if channel:
@@ -498,7 +629,7 @@ async def set_welcome(interaction: discord.Interaction, channel: discord.TextCha
         await interaction.response.send_message("У вас нет прав администратора для этой команды!", ephemeral=True)
         return
 
-    bot.db.update_guild_config(interaction.guild.id, channel_id=channel.id, role_id=role.id)
+    await bot.db.update_guild_config(interaction.guild.id, channel_id=channel.id, role_id=role.id)
     await interaction.response.send_message(
         f"Настройки обновлены! Канал приветствия: {channel.mention}, Роль: {role.name}",
         ephemeral=True,
@@ -518,8 +649,7 @@ def _rank_emoji(rank: int) -> str:
 @app_commands.command(name="top", description="Показать топ-10 пользователей по уровню")
 async def top(interaction: discord.Interaction):
     await interaction.response.defer()
-    users = bot.db.get_users_in_guild(interaction.guild.id)
-    top_candidates = sorted(users, key=lambda x: (x.level, x.xp), reverse=True)[:50]
+    top_candidates = await bot.top_users(interaction.guild.id, 50)
     gid = interaction.guild.id
     rank = 0
     lines = []
@@ -639,7 +769,7 @@ class RoleSelectMenu(discord.ui.Select):
         )
 
     async def callback(self, interaction: discord.Interaction):
-        config = bot.db.get_guild_config(interaction.guild.id)
+        config = await bot.db.get_guild_config(interaction.guild.id)
         if not config:
             await interaction.response.send_message("Роли не настроены. Настройте через API/фронтенд.", ephemeral=True)
             return
@@ -699,7 +829,7 @@ async def setup_roles(interaction: discord.Interaction):
         await interaction.response.send_message("У вас нет прав администратора для этой команды!", ephemeral=True)
         return
 
-    config = bot.db.get_guild_config(interaction.guild.id)
+    config = await bot.db.get_guild_config(interaction.guild.id)
     if not config or not config["role_select_channel_id"] or not config["selectable_roles"]:
         await interaction.response.send_message(
             "Сначала настройте канал и роли для выбора через API или будущий фронтенд.",
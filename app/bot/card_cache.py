@@ -0,0 +1,129 @@
+"""
+Кэш готовых PNG карточек уровня. Ключ — хэш всех входов рендера (аватар, ник, статус, ранг, уровень,
+сообщения, XP, шрифты): одинаковый ключ = байт-в-байт та же картинка, поэтому инвалидация не нужна —
+изменилось что-то видимое, изменился и ключ. Память ограничена по байтам (LRU), на диск — по желанию.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Any
+
+
+def card_key(*parts) -> str:
+    """Ключ карточки по входам рендера (repr стабилен для int/str/tuple)."""
+    return hashlib.sha256(repr(parts).encode("utf-8")).hexdigest()
+
+
+class CardCache:
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, cache_dir: str | None = None, max_disk_bytes: int = 0):
+        """cache_dir=None — только память; max_disk_bytes=0 — на диске без ограничения размера."""
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._cards: OrderedDict[str, bytes] = OrderedDict()
+        self._bytes = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "bytes_saved": 0}
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            except OSError:
+                self.cache_dir = None
+
+    def snapshot(self) -> dict[str, Any]:
+        hits = self.stats["hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "cards": len(self._cards),
+            "bytes": self._bytes,
+            "hit_ratio": hits / total if total else 0.0,
+        }
+
+    async def get(self, key: str) -> bytes | None:
+        data = self._cards.get(key)
+        if data is not None:
+            self._cards.move_to_end(key)
+            self.stats["hits"] += 1
+            self.stats["bytes_saved"] += len(data)
+            return data
+        if self.cache_dir:
+            data = await asyncio.to_thread(self._read_file, key)
+            if data is not None:
+                self._remember(key, data)
+                self.stats["disk_hits"] += 1
+                self.stats["bytes_saved"] += len(data)
+                return data
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, data: bytes) -> None:
+        self._remember(key, data)
+        if self.cache_dir:
+            await asyncio.to_thread(self._write_file, key, data)
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        old = self._cards.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._cards[key] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._cards.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _read_file(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mtime = время последнего обращения: prune удаляет давно не читанные
+            os.utime(path)
+            return data
+        except OSError:
+            return None
+
+    def _write_file(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """Ужать папку на диске до max_disk_bytes, удаляя самые старые файлы (вызывать в потоке)."""
+        if not self.cache_dir or self.max_disk_bytes <= 0:
+            return 0
+        try:
+            files = [e for e in os.scandir(self.cache_dir) if e.is_file()]
+        except OSError:
+            return 0
+        stats = []
+        for entry in files:
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            stats.append((st.st_mtime, st.st_size, entry.path))
+        total = sum(size for _, size, _ in stats)
+        removed = 0
+        for _, size, path in sorted(stats):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,442 @@
+"""
+Отрисовка карточек (приветствие, уровень) на Pillow. Чистые функции: на вход аватар (байты или
+готовое изображение из кэша) и простые значения, на выход PNG-байты — без discord-объектов и без
+event loop, чтобы их можно было гонять в пуле потоков/процессов (см. app.bot.render_service).
+
+Статичная часть карточки (фон, рамка аватара, подложка полосы прогресса, круглая маска) одна
+на размер и стиль: она рисуется один раз (templates) и на каждую карточку только копируется.
+Стиль (CardStyle — цвета) задаётся для всех (CARD_STYLE) или по гильдиям (CARD_STYLE_GUILDS).
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import threading
+import time
+from typing import NamedTuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+from app.core.config import Config
+from app.core.levels import get_message_threshold, get_xp_threshold
+
+# Шрифт: сначала папка fonts в корне проекта, затем системные (для кириллицы)
+_FONTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "fonts"))
+_FONT_CANDIDATES = ("DejaVuSans.ttf", "DejaVuSans-Bold.ttf", "dejavu.ttf")
+# Запас: системные шрифты с кириллицей (если в проекте нет fonts/)
+_WINDOWS_FONTS = (
+    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts", "arial.ttf"),
+    os.path.join(os.environ.get("WINDIR", "C:\\Windows"), "Fonts", "Arial.ttf"),
+)
+_LINUX_MAC_FONTS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+    "/Library/Fonts/Arial.ttf",
+)
+
+
+def _get_font_path():
+    """Путь к ttf-шрифту: сначала fonts в проекте, потом системный (Arial и т.д.)."""
+    for name in _FONT_CANDIDATES:
+        path = os.path.normpath(os.path.join(_FONTS_DIR, name))
+        if os.path.isfile(path):
+            return path
+    # Если точных имён нет — ищем любой .ttf в папке (на случай другого имени/регистра)
+    if os.path.isdir(_FONTS_DIR):
+        try:
+            for name in os.listdir(_FONTS_DIR):
+                if name.lower().endswith(".ttf"):
+                    path = os.path.join(_FONTS_DIR, name)
+                    if os.path.isfile(path):
+                        return path
+        except OSError:
+            pass
+    for path in _WINDOWS_FONTS:
+        if os.path.isfile(path):
+            return path
+    for path in _LINUX_MAC_FONTS:
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+# При первом запуске без папки fonts — создаём её (без вывода в консоль)
+if not os.path.isdir(_FONTS_DIR):
+    try:
+        os.makedirs(_FONTS_DIR, exist_ok=True)
+    except OSError:
+        pass
+
+
+class FontRegistry:
+    """
+    Шрифты карточек: путь ищется и файл читается один раз, FreeTypeFont кэшируется по (путь, размер).
+    FreeType-объекты не потокобезопасны, поэтому кэш объектов — свой у каждого потока пула рендера;
+    байты файла общие, так что на горячем пути к файловой системе не обращаемся.
+    """
+
+    def __init__(self, regular_path: str | None = None, bold_path: str | None = None):
+        self._configured = {"regular": regular_path, "bold": bold_path}
+        self._paths: dict[str, str | None] | None = None
+        self._font_bytes: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _resolve(self) -> dict[str, str | None]:
+        if self._paths is None:
+            with self._lock:
+                if self._paths is None:
+                    regular = self._configured["regular"] or _get_font_path()
+                    # Жирный — свой файл, если задан; иначе тот же, что обычный
+                    bold = self._configured["bold"] or regular
+                    self._paths = {"regular": regular, "bold": bold}
+        return self._paths
+
+    def _read(self, path: str) -> bytes:
+        data = self._font_bytes.get(path)
+        if data is None:
+            with self._lock:
+                data = self._font_bytes.get(path)
+                if data is None:
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    self._font_bytes[path] = data
+        return data
+
+    def get(self, size: int, style: str = "regular"):
+        """Шрифт размера size (style: regular | bold). Без шрифта или при ошибке — встроенный Pillow."""
+        path = self._resolve().get(style) or self._resolve()["regular"]
+        cache = getattr(self._local, "fonts", None)
+        if cache is None:
+            cache = self._local.fonts = {}
+        key = (path, size)
+        font = cache.get(key)
+        if font is None:
+            if not path:
+                font = ImageFont.load_default()
+            else:
+                try:
+                    # Читаем файл в память, чтобы путь не мешал на Windows
+                    font = ImageFont.truetype(io.BytesIO(self._read(path)), size, encoding="unic")
+                except Exception:
+                    font = ImageFont.load_default()
+            cache[key] = font
+        return font
+
+    def preload(self, sizes=(20, 30)) -> float:
+        """Найти и прочитать шрифты заранее (старт бота). Возвращает время загрузки в мс."""
+        started = time.perf_counter()
+        for style in ("regular", "bold"):
+            for size in sizes:
+                self.get(size, style)
+        return (time.perf_counter() - started) * 1000
+
+    @property
+    def paths(self) -> dict[str, str | None]:
+        return dict(self._resolve())
+
+
+# Из Config, а не из bot.py: в пуле процессов модуль импортируется воркером заново
+fonts = FontRegistry(Config.FONT_REGULAR or None, Config.FONT_BOLD or None)
+
+
+Color = tuple[int, int, int, int]
+
+
+class CardStyle(NamedTuple):
+    background: Color = (0, 0, 0, 255)
+    border: Color = (255, 255, 255, 255)
+    text: Color = (255, 255, 255, 255)
+    # ранг/уровень и заливка полосы прогресса
+    accent: Color = (186, 85, 211, 255)
+    track: Color = (70, 70, 70, 255)
+    track_outline: Color = (100, 100, 100, 255)
+
+
+STYLES: dict[str, CardStyle] = {
+    "default": CardStyle(),
+    "light": CardStyle(
+        background=(245, 245, 245, 255),
+        border=(40, 40, 40, 255),
+        text=(30, 30, 30, 255),
+        accent=(88, 101, 242, 255),
+        track=(210, 210, 210, 255),
+        track_outline=(180, 180, 180, 255),
+    ),
+    "ocean": CardStyle(
+        background=(12, 24, 48, 255),
+        border=(120, 200, 255, 255),
+        accent=(0, 170, 255, 255),
+        track=(40, 60, 90, 255),
+        track_outline=(70, 100, 140, 255),
+    ),
+}
+
+
+def _parse_color(value: str) -> Color:
+    value = value.lstrip("#")
+    if len(value) not in (6, 8):
+        raise ValueError(f"цвет карточки должен быть #RRGGBB или #RRGGBBAA, а не {value!r}")
+    channels = tuple(int(value[i:i + 2], 16) for i in range(0, len(value), 2))
+    return channels if len(channels) == 4 else (*channels, 255)
+
+
+def parse_style(spec: str | dict) -> CardStyle:
+    """Имя из STYLES или {"base": "light", "accent": "#ff8800", ...} — база с заменой цветов."""
+    if isinstance(spec, str):
+        if spec not in STYLES:
+            raise RuntimeError(f"Неизвестный стиль карточек: {spec} ({' | '.join(STYLES)})")
+        return STYLES[spec]
+    overrides = dict(spec)
+    base = parse_style(overrides.pop("base", "default"))
+    unknown = set(overrides) - set(CardStyle._fields)
+    if unknown:
+        raise RuntimeError(f"Неизвестные цвета стиля карточек: {sorted(unknown)}")
+    return base._replace(**{name: _parse_color(value) for name, value in overrides.items()})
+
+
+def parse_guild_styles(raw: str) -> dict[int, CardStyle]:
+    """CARD_STYLE_GUILDS: {"guild_id": "light" | {"base": ..., "accent": "#..."}}."""
+    if not raw.strip():
+        return {}
+    return {int(guild_id): parse_style(spec) for guild_id, spec in json.loads(raw).items()}
+
+
+default_style = parse_style(Config.CARD_STYLE or "default")
+_guild_styles = parse_guild_styles(Config.CARD_STYLE_GUILDS)
+
+
+def style_for(guild_id: int) -> CardStyle:
+    return _guild_styles.get(guild_id, default_style)
+
+
+def styles_in_use() -> set[CardStyle]:
+    return {default_style, *_guild_styles.values()}
+
+
+def configure_styles(default: str | dict, guilds: str = "") -> float:
+    """
+    Сменить стили (смена настроек без перезапуска): шаблоны старых стилей выбрасываются, новых —
+    строятся сразу. Возвращает время построения в мс.
+    """
+    global default_style, _guild_styles
+    default_style, _guild_styles = parse_style(default or "default"), parse_guild_styles(guilds)
+    in_use = styles_in_use()
+    templates.retain(in_use)
+    return templates.preload(in_use)
+
+
+# Полоса прогресса карточки уровня: left, top, width, height, radius
+LEVEL_BAR = (140, 118, 440, 22, 11)
+
+
+def _circle_mask(size: int) -> Image.Image:
+    mask = Image.new("L", (size, size), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size, size), fill=255)
+    return mask
+
+
+def _welcome_template(style: CardStyle) -> Image.Image:
+    background = Image.new("RGBA", (600, 300), style.background)
+    ImageDraw.Draw(background).ellipse((195, 15, 405, 225), outline=style.border, width=5)
+    return background
+
+
+def _level_template(style: CardStyle) -> Image.Image:
+    background = Image.new("RGBA", (600, 168), style.background)
+    draw = ImageDraw.Draw(background)
+    draw.ellipse((15, 20, 125, 130), outline=style.border, width=3)
+    # Фон полосы прогресса (скруглённый)
+    draw.rounded_rectangle(
+        (LEVEL_BAR[0], LEVEL_BAR[1], LEVEL_BAR[0] + LEVEL_BAR[2], LEVEL_BAR[1] + LEVEL_BAR[3]),
+        radius=LEVEL_BAR[4],
+        fill=style.track,
+        outline=style.track_outline,
+        width=1,
+    )
+    return background
+
+
+class TemplateRegistry:
+    """
+    Готовые статичные части карточек по (вид, стиль) и круглые маски по размеру. Общие для потоков
+    пула: рендер их только читает (copy(), маска в paste/putalpha), поэтому блокировка — только
+    на построение.
+    """
+
+    _builders = {"welcome": _welcome_template, "level": _level_template}
+
+    def __init__(self):
+        self._templates: dict[tuple[str, CardStyle], Image.Image] = {}
+        self._masks: dict[int, Image.Image] = {}
+        self._lock = threading.Lock()
+
+    def background(self, kind: str, style: CardStyle) -> Image.Image:
+        """Копия фона карточки kind в стиле style — её можно рисовать дальше."""
+        key = (kind, style)
+        template = self._templates.get(key)
+        if template is None:
+            with self._lock:
+                template = self._templates.get(key)
+                if template is None:
+                    template = self._templates[key] = self._builders[kind](style)
+        return template.copy()
+
+    def mask(self, size: int) -> Image.Image:
+        """Круглая маска size x size (только для чтения)."""
+        mask = self._masks.get(size)
+        if mask is None:
+            with self._lock:
+                mask = self._masks.get(size)
+                if mask is None:
+                    mask = self._masks[size] = _circle_mask(size)
+        return mask
+
+    def retain(self, styles) -> None:
+        """Выбросить шаблоны стилей, которых нет в styles (стиль сменили в настройках)."""
+        keep = set(styles)
+        with self._lock:
+            self._templates = {key: image for key, image in self._templates.items() if key[1] in keep}
+
+    def preload(self, styles=None) -> float:
+        """Построить шаблоны используемых стилей заранее (старт бота). Возвращает время в мс."""
+        started = time.perf_counter()
+        for style in styles or styles_in_use():
+            for kind in self._builders:
+                self.background(kind, style)
+        self.mask(100)
+        self.mask(200)
+        return (time.perf_counter() - started) * 1000
+
+
+templates = TemplateRegistry()
+
+
+def load_avatar(avatar_data: bytes, size: int) -> Image.Image:
+    """Декодировать аватар в RGBA size x size (такой кладёт в память кэш аватаров)."""
+    avatar = Image.open(io.BytesIO(avatar_data)).convert("RGBA")
+    return avatar.resize((size, size), Image.LANCZOS)
+
+
+def _avatar_image(avatar: bytes | Image.Image, size: int) -> Image.Image:
+    # Готовое изображение из кэша копируем: карточка его меняет, а кэш общий
+    if isinstance(avatar, Image.Image) and avatar.size == (size, size):
+        return avatar.copy()
+    if isinstance(avatar, Image.Image):
+        return avatar.convert("RGBA").resize((size, size), Image.LANCZOS)
+    return load_avatar(avatar, size)
+
+
+def render_welcome_card(
+    avatar: bytes | Image.Image, member_name: str, member_count: int, style: CardStyle | None = None
+) -> bytes:
+    """Картинка приветствия 600x300: аватар в круге, ник и номер участника."""
+    style = style or default_style
+    avatar = _avatar_image(avatar, 200)
+
+    avatar_circle = Image.new("RGBA", (200, 200), (0, 0, 0, 0))
+    avatar_circle.paste(avatar, (0, 0), templates.mask(200))
+
+    background = templates.background("welcome", style)
+    background.paste(avatar_circle, (200, 20), avatar_circle)
+
+    draw = ImageDraw.Draw(background)
+    font = fonts.get(30, "bold")
+    small_font = fonts.get(20)
+
+    text1 = f"{member_name} уже на нашем сервере"
+    draw.text((300 - draw.textlength(text1, font=font) / 2, 230), text1, fill=style.text, font=font)
+
+    text2 = f"БРАД #{member_count}"
+    draw.text(
+        (300 - draw.textlength(text2, font=small_font) / 2, 270),
+        text2,
+        fill=style.text,
+        font=small_font,
+    )
+
+    buffer = io.BytesIO()
+    background.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_level_card(
+    avatar: bytes | Image.Image,
+    member_name: str,
+    status_color: tuple[int, int, int, int],
+    rank: int,
+    level: int,
+    message_count: int,
+    xp: int,
+    style: CardStyle | None = None,
+) -> bytes:
+    """Карточка уровня 600x168: аватар со статусом, ник, ранг/уровень и полоса прогресса."""
+    style = style or default_style
+    avatar = _avatar_image(avatar, 100)
+    avatar.putalpha(templates.mask(100))
+
+    background = templates.background("level", style)
+    background.paste(avatar, (20, 25), avatar)
+
+    draw = ImageDraw.Draw(background)
+    draw.ellipse((95, 100, 115, 120), fill=status_color)
+
+    font = fonts.get(30, "bold")
+    small_font = fonts.get(20)
+
+    draw.text((140, 20), member_name, fill=style.text, font=font)
+
+    level_text = f"РАНГ #{rank} УРОВЕНЬ {level}"
+    draw.text((140, 60), level_text, fill=style.accent, font=small_font)
+
+    next_level = min(level + 1, 999)
+    current_threshold = get_message_threshold(level) if level < 5 else get_xp_threshold(level)
+    next_threshold = get_message_threshold(next_level) if next_level <= 5 else get_xp_threshold(next_level)
+
+    if level < 5:
+        progress = message_count / next_threshold if next_threshold > 0 else 1
+        xp_text = f"{message_count}/{next_threshold} сообщений"
+    else:
+        # Полоса: прогресс в сегменте 0–600 до след. уровня (сбрасывается после аппа)
+        required_in_segment = next_threshold - current_threshold  # 600 XP до след. уровня
+        if required_in_segment <= 0:
+            progress = 1.0
+            xp_in_segment = 0
+        else:
+            xp_in_segment = max(0, xp - current_threshold)
+            progress = min(1.0, float(xp_in_segment) / required_in_segment)
+        # Текст — полный XP (209455), полоса — по сегменту (5/600)
+        xp_text = f"{xp}/{next_threshold} XP"
+
+    draw.text((140, 88), xp_text, fill=style.text, font=small_font)
+
+    # Полоса прогресса: отступ от текста, ровная и аккуратная
+    # (фон полосы уже в шаблоне)
+    bar_left, bar_top, bar_width, bar_height, bar_radius = LEVEL_BAR
+    progress = max(0.0, min(1.0, float(progress)))
+    filled_width = int(bar_width * progress)
+    if filled_width == 0 and (progress > 0 or (level >= 5 and xp > 0)):
+        filled_width = 8
+    if filled_width > bar_width:
+        filled_width = bar_width
+
+    # Заливка прогресса: скруглённая слева и справа (капсула), как контейнер
+    inset = 2
+    fill_left = bar_left + inset
+    fill_top = bar_top + inset
+    fill_height = bar_height - 2 * inset
+    fill_width = max(0, filled_width - 2 * inset)
+    if fill_width > 0 and fill_height > 0:
+        fill_radius = min(bar_radius - 1, fill_height // 2, fill_width // 2)
+        draw.rounded_rectangle(
+            (fill_left, fill_top, fill_left + fill_width, fill_top + fill_height),
+            radius=fill_radius,
+            fill=style.accent,
+        )
+
+    buffer = io.BytesIO()
+    background.save(buffer, format="PNG", quality=95)
+    return buffer.getvalue()
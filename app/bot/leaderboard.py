@@ -0,0 +1,71 @@
+"""
+Лидерборд гильдий в памяти (опционально, LEADERBOARD_IN_MEMORY): отсортированный список ключей
+(-уровень, -XP, user_id) на гильдию. Ранг — bisect за O(log n), топ — срез. Гильдия загружается
+из БД при первом обращении, дальше обновляется вместе с буфером XP; после массовых изменений
+в БД (update_days, полная сверка) бот сбрасывает её и она перечитывается.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Iterable, NamedTuple
+
+
+class LeaderboardEntry(NamedTuple):
+    user_id: int
+    level: int
+    xp: int
+
+
+class _GuildBoard:
+    __slots__ = ("keys", "scores")
+
+    def __init__(self, rows: Iterable[tuple[int, int, int]]):
+        self.scores: dict[int, tuple[int, int]] = {uid: (level, xp) for uid, level, xp in rows}
+        self.keys: list[tuple[int, int, int]] = sorted((-lvl, -xp, uid) for uid, (lvl, xp) in self.scores.items())
+
+    def update(self, user_id: int, level: int, xp: int) -> None:
+        old = self.scores.get(user_id)
+        if old == (level, xp):
+            return
+        if old is not None:
+            key = (-old[0], -old[1], user_id)
+            i = bisect_left(self.keys, key)
+            if i < len(self.keys) and self.keys[i] == key:
+                del self.keys[i]
+        self.scores[user_id] = (level, xp)
+        insort(self.keys, (-level, -xp, user_id))
+
+
+class Leaderboard:
+    def __init__(self):
+        self._boards: dict[int, _GuildBoard] = {}
+
+    def is_loaded(self, guild_id: int) -> bool:
+        return guild_id in self._boards
+
+    def load(self, guild_id: int, rows: Iterable[tuple[int, int, int]]) -> None:
+        """Заполнить гильдию строками (user_id, level, xp)."""
+        self._boards[guild_id] = _GuildBoard(rows)
+
+    def invalidate(self, guild_id: int | None = None) -> None:
+        """Сбросить гильдию (или все) — перечитается из БД при следующем обращении."""
+        if guild_id is None:
+            self._boards.clear()
+        else:
+            self._boards.pop(guild_id, None)
+
+    def update(self, guild_id: int, user_id: int, level: int, xp: int) -> None:
+        """Новые уровень/XP участника; незагруженную гильдию не трогаем (её прочитают из БД целиком)."""
+        board = self._boards.get(guild_id)
+        if board is not None:
+            board.update(user_id, level, xp)
+
+    def rank(self, guild_id: int, level: int, xp: int) -> int:
+        """Место для (уровень, XP): сколько участников строго выше + 1."""
+        return bisect_left(self._boards[guild_id].keys, (-level, -xp)) + 1
+
+    def top(self, guild_id: int, n: int) -> list[LeaderboardEntry]:
+        return [LeaderboardEntry(uid, -lvl, -xp) for lvl, xp, uid in self._boards[guild_id].keys[:n]]
+
+    def __len__(self) -> int:
+        return sum(len(board.scores) for board in self._boards.values())
@@ -0,0 +1,30 @@
+"""
+Темп запросов к Discord на стороне бота: не больше rate вызовов за per секунд (скользящее окно).
+Общий для очередей, которые сами разбирают свои задачи (поздравления с уровнем, выдача ролей
+при входе), — чтобы не упираться в 429 и не полагаться только на повторы discord.py.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+
+
+class RateBucket:
+    """Не больше rate отправок за per секунд (скользящее окно)."""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self._sent: deque[float] = deque()
+
+    async def acquire(self) -> None:
+        """Дождаться свободного места в окне и занять его."""
+        while True:
+            now = time.monotonic()
+            while self._sent and now - self._sent[0] >= self.per:
+                self._sent.popleft()
+            if len(self._sent) < self.rate:
+                self._sent.append(now)
+                return
+            await asyncio.sleep(self.per - (now - self._sent[0]))
@@ -0,0 +1,109 @@
+"""
+Сервис отрисовки карточек вне event loop: функции из app.bot.cards выполняются в пуле потоков
+(Pillow отпускает GIL на resize/encode) или процессов. Очередь ограничена: если ждущих рендеров
+больше max_queue, новый запрос сразу получает RenderQueueFull (бот отправит сообщение без картинки).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class RenderQueueFull(RuntimeError):
+    """Очередь рендера переполнена — запрос отклонён без ожидания."""
+
+
+def default_workers() -> int:
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+class RenderStats:
+    """Задержки рендера: ожидание в очереди и сама отрисовка, по последним samples запросам."""
+
+    def __init__(self, samples: int = 500):
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self._wait_ms: deque[float] = deque(maxlen=samples)
+        self._render_ms: deque[float] = deque(maxlen=samples)
+
+    def record(self, wait_ms: float, render_ms: float) -> None:
+        self.completed += 1
+        self._wait_ms.append(wait_ms)
+        self._render_ms.append(render_ms)
+
+    @staticmethod
+    def _percentile(values, p: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    def snapshot(self) -> dict[str, Any]:
+        return {
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "wait_ms_p50": self._percentile(self._wait_ms, 50),
+            "wait_ms_p95": self._percentile(self._wait_ms, 95),
+            "render_ms_p50": self._percentile(self._render_ms, 50),
+            "render_ms_p95": self._percentile(self._render_ms, 95),
+            "render_ms_max": max(self._render_ms, default=0.0),
+        }
+
+
+class RenderService:
+    def __init__(self, workers: int | None = None, max_queue: int = 32, use_processes: bool = False):
+        self.workers = workers or default_workers()
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self.stats = RenderStats()
+        self._executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._waiting = 0
+
+    def _ensure_started(self) -> None:
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.workers)
+            self._slots = asyncio.Semaphore(self.workers)
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    async def render(self, fn: Callable[..., bytes], *args) -> bytes:
+        """Выполнить fn(*args) в пуле. RenderQueueFull — если очередь ожидания уже заполнена."""
+        self._ensure_started()
+        if self._waiting >= self.max_queue:
+            self.stats.rejected += 1
+            raise RenderQueueFull(f"очередь рендера заполнена ({self._waiting})")
+        queued = time.perf_counter()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            started = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(self._executor, fn, *args)
+            except Exception:
+                self.stats.failed += 1
+                raise
+            finished = time.perf_counter()
+            self.stats.record((started - queued) * 1000, (finished - started) * 1000)
+            return result
+        finally:
+            self._slots.release()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            self._slots = None
@@ -0,0 +1,124 @@
+"""
+Запуск бота по гильдиям (on_ready): синхронизация слэш-команд, подгрузка участников (guild.chunk)
+и заполнение БД идут параллельно для нескольких гильдий, но не больше STARTUP_CONCURRENCY сразу —
+лимиты Discord (429 по HTTP, лимит запросов шлюза) discord.py соблюдает сам, ограничение лишь не даёт
+поставить в очередь сразу все гильдии.
+
+tree.sync пропускается, если набор команд гильдии не изменился с прошлой синхронизации: хэши
+хранятся в JSON-файле (по умолчанию cache/command_sync.json в корне проекта).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Iterable, Sequence
+
+_DEFAULT_STATE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "cache", "command_sync.json"))
+
+
+def command_digest(tree, guild) -> str:
+    """Хэш набора слэш-команд гильдии в том виде, в каком tree.sync отправит его в Discord."""
+    payload = sorted(
+        (cmd.to_dict(tree) for cmd in tree.get_commands(guild=guild)),
+        key=lambda c: (c.get("type", 1), c["name"]),
+    )
+    data = json.dumps([tree.client.application_id, payload], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class CommandSyncState:
+    """Хэши команд, с которыми гильдии последний раз синхронизировались (guild_id -> хэш)."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or _DEFAULT_STATE
+        self._digests: dict[str, str] = {}
+        self._dirty = False
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self._digests = {str(k): str(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def is_current(self, guild_id: int, digest: str) -> bool:
+        return self._digests.get(str(guild_id)) == digest
+
+    def mark(self, guild_id: int, digest: str) -> None:
+        if self._digests.get(str(guild_id)) != digest:
+            self._digests[str(guild_id)] = digest
+            self._dirty = True
+
+    def forget(self, guild_id: int) -> None:
+        """Бота убрали с сервера: при повторном добавлении команды синхронизируются заново."""
+        if self._digests.pop(str(guild_id), None) is not None:
+            self._dirty = True
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._digests, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._dirty = False
+        except OSError as e:
+            print(f"Предупреждение: не удалось сохранить хэши команд ({self.path}): {e}")
+
+
+class StartupTimings:
+    """Время по фазам: сумма по гильдиям, самая долгая гильдия и общее время запуска."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: dict[str, list[float]] = defaultdict(list)
+        self.counters: dict[str, int] = defaultdict(int)
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase].append(seconds)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] += n
+
+    def report(self) -> str:
+        lines = [f"Запуск: {time.perf_counter() - self.started:.2f} с"]
+        for phase, times in self.phases.items():
+            lines.append(
+                f"  {phase:<12} сумма {sum(times):7.2f} с, макс. {max(times):6.2f} с ({len(times)} шт.)"
+            )
+        if self.counters:
+            lines.append("  " + ", ".join(f"{name}: {n}" for name, n in self.counters.items()))
+        return "\n".join(lines)
+
+
+GuildStep = Callable[[Any], Awaitable[Any]]
+
+
+async def run_guild_startup(
+    guilds: Iterable,
+    steps: Sequence[tuple[str, GuildStep]],
+    concurrency: int,
+    timings: StartupTimings,
+) -> None:
+    """
+    Для каждой гильдии — шаги по порядку (фаза, корутина от гильдии); гильдии параллельно, не больше
+    concurrency одновременно. Ошибка шага пишется в лог и не останавливает остальные шаги и гильдии.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(guild) -> None:
+        async with semaphore:
+            for phase, step in steps:
+                started = time.perf_counter()
+                try:
+                    await step(guild)
+                except Exception as e:
+                    timings.count(f"ошибки ({phase})")
+                    print(f"Предупреждение: {phase} для {guild.name}: {e}")
+                timings.add(phase, time.perf_counter() - started)
+
+    await asyncio.gather(*(one(guild) for guild in guilds))
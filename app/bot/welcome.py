@@ -0,0 +1,278 @@
+"""
+Приветствие новых участников без очереди из рендеров и запросов к Discord при наплыве (рейд,
+массовое приглашение). on_member_join только ставит участника в очередь гильдии; дальше:
+
+- строки уровней входящих пачкой создаются одной вставкой (db.ensure_user_levels), а не запросом
+  на каждого; настройки гильдии — из кэша (guild_config_cache);
+- пока входов за burst_window секунд не больше burst_threshold — каждому своя карточка, как раньше;
+  выше — режим наплыва: входы копятся batch_window секунд и приветствуются одним текстовым
+  сообщением с упоминаниями (строки до лимита Discord), без рендера;
+- пачки разных гильдий обрабатываются не больше чем workers одновременно;
+- роль при входе выдаёт RoleGrantQueue: очередь на гильдию, не чаще rate выдач за per секунд,
+  при 429 — пауза и повтор.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import discord
+
+from app.bot.announcer import MESSAGE_LIMIT
+from app.bot.rate_limit import RateBucket
+from app.core import member_view
+
+
+def format_welcome(mention: str, guild_name: str) -> str:
+    return f"С нами новый брад {mention}, Добро пожаловать на сервер **{guild_name}**"
+
+
+def format_burst_welcome(mentions: list[str], guild_name: str) -> list[tuple[str, int]]:
+    """
+    Одно приветствие на пачку входов; упоминания делятся на сообщения до MESSAGE_LIMIT.
+    Возвращает (текст, сколько упоминаний в нём) в порядке mentions.
+    """
+    head = "С нами новые брады "
+    tail = f", Добро пожаловать на сервер **{guild_name}**"
+    messages: list[tuple[str, int]] = []
+    chunk: list[str] = []
+    size = len(head) + len(tail)
+    for mention in mentions:
+        if chunk and size + len(mention) + 1 > MESSAGE_LIMIT:
+            messages.append((head + " ".join(chunk) + tail, len(chunk)))
+            chunk, size = [], len(head) + len(tail)
+        chunk.append(mention)
+        size += len(mention) + 1
+    if chunk:
+        messages.append((head + " ".join(chunk) + tail, len(chunk)))
+    return messages
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class RoleGrantQueue:
+    """Выдача ролей при входе: очередь на гильдию, темп — не больше rate выдач за per секунд."""
+
+    def __init__(self, rate: int = 10, per: float = 10.0):
+        self.rate = rate
+        self.per = per
+        self._pending: dict[int, deque] = {}
+        self._buckets: dict[int, RateBucket] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+        self.stats = {"queued": 0, "granted": 0, "skipped": 0, "retried": 0, "failed": 0}
+
+    def grant(self, member, role) -> None:
+        guild_id = member.guild.id
+        self._pending.setdefault(guild_id, deque()).append((member, role))
+        self.stats["queued"] += 1
+        task = self._tasks.get(guild_id)
+        if task is None or task.done():
+            self._tasks[guild_id] = asyncio.create_task(self._drain(guild_id))
+
+    async def _drain(self, guild_id: int) -> None:
+        pending = self._pending[guild_id]
+        bucket = self._buckets.setdefault(guild_id, RateBucket(self.rate, self.per))
+        while pending:
+            member, role = pending[0]
+            if any(r.id == role.id for r in getattr(member, "roles", ())):
+                pending.popleft()
+                self.stats["skipped"] += 1
+                continue
+            await bucket.acquire()
+            try:
+                await member.add_roles(role, reason="Роль при входе на сервер")
+            except discord.NotFound:
+                self.stats["skipped"] += 1  # участник уже вышел
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    # лимит всё же упёрся (общий с другими запросами бота): ждём и повторяем того же
+                    self.stats["retried"] += 1
+                    await asyncio.sleep(getattr(e, "retry_after", None) or self.per)
+                    continue
+                self.stats["failed"] += 1
+                print(f"Роль {role.id} не выдана участнику {member.id}: {e}")
+            else:
+                self.stats["granted"] += 1
+            pending.popleft()
+
+    @property
+    def depth(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def snapshot(self) -> dict[str, Any]:
+        return {**self.stats, "depth": self.depth}
+
+    async def close(self, timeout: float = 10.0) -> None:
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        for task in tasks:
+            task.cancel()
+
+
+class _GuildJoins:
+    __slots__ = ("joins", "pending", "task")
+
+    def __init__(self):
+        # время входов за последние burst_window секунд
+        self.joins: deque[float] = deque()
+        # (участник, время входа, показывать в списке веб-панели) в ожидании приветствия
+        self.pending: list[tuple[Any, float, bool]] = []
+        self.task: asyncio.Task | None = None
+
+
+class WelcomePipeline:
+    def __init__(
+        self,
+        db,
+        render: Callable[[Any, int], Awaitable[Any]],
+        role_grants: RoleGrantQueue,
+        workers: int = 4,
+        burst_threshold: int = 10,
+        burst_window: float = 60.0,
+        batch_window: float = 5.0,
+        max_batch: int = 500,
+        samples: int = 500,
+    ):
+        self.db = db
+        self.render = render
+        self.role_grants = role_grants
+        self.burst_threshold = burst_threshold
+        self.burst_window = burst_window
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self._slots = asyncio.Semaphore(workers)
+        self._guilds: dict[int, _GuildJoins] = {}
+        self._latency_ms: deque[float] = deque(maxlen=samples)
+        self._closing = False
+        self.stats = {"joins": 0, "batches": 0, "cards": 0, "burst_batches": 0, "burst_members": 0, "failed": 0}
+
+    def submit(self, member, listed: bool = True) -> None:
+        """Участник зашёл: приветствие, строка уровня и роль — в фоне; listed — показывать в списке веб-панели."""
+        joins = self._guilds.get(member.guild.id)
+        if joins is None:
+            joins = self._guilds[member.guild.id] = _GuildJoins()
+        now = time.monotonic()
+        joins.joins.append(now)
+        joins.pending.append((member, now, listed))
+        self.stats["joins"] += 1
+        if joins.task is None or joins.task.done():
+            joins.task = asyncio.create_task(self._drain(joins))
+
+    def in_burst(self, guild_id: int) -> bool:
+        joins = self._guilds.get(guild_id)
+        if joins is None:
+            return False
+        now = time.monotonic()
+        while joins.joins and now - joins.joins[0] >= self.burst_window:
+            joins.joins.popleft()
+        return len(joins.joins) > self.burst_threshold
+
+    async def _drain(self, joins: _GuildJoins) -> None:
+        while joins.pending:
+            guild_id = joins.pending[0][0].guild.id
+            burst = self.in_burst(guild_id)
+            if burst and not self._closing:
+                # режим наплыва: копим входы окна и приветствуем их одним сообщением
+                await asyncio.sleep(self.batch_window)
+            batch, joins.pending = joins.pending[:self.max_batch], joins.pending[self.max_batch:]
+            async with self._slots:
+                try:
+                    await self._handle(batch, burst)
+                except Exception as e:
+                    self.stats["failed"] += len(batch)
+                    print(f"Приветствие на сервере {guild_id} не обработано ({len(batch)} участн.): {e}")
+
+    async def _handle(self, batch: list[tuple[Any, float, bool]], burst: bool) -> None:
+        guild = batch[0][0].guild
+        members = [member for member, _, _ in batch]
+        listed = {member.id for member, _, shown in batch if shown}
+        self.stats["batches"] += 1
+        for row in await self.db.ensure_user_levels(guild.id, members):
+            if row.user_id in listed:
+                member_view.add_member(guild.id, row)
+
+        config = await self.db.get_guild_config(guild.id)
+        if not config or not config["welcome_channel_id"]:
+            return
+        channel = guild.get_channel(config["welcome_channel_id"])
+        role = guild.get_role(config["welcome_role_id"]) if config["welcome_role_id"] else None
+        if role:
+            # роль не ждёт приветствия (и не теряется, если отправка в канал не удалась)
+            for member in members:
+                self.role_grants.grant(member, role)
+
+        if channel:
+            if burst:
+                self.stats["burst_batches"] += 1
+                self.stats["burst_members"] += len(members)
+                start = 0
+                for content, count in format_burst_welcome([m.mention for m in members], guild.name):
+                    chunk, start = batch[start:start + count], start + count
+                    try:
+                        await channel.send(content=content)
+                    except discord.HTTPException as e:
+                        self.stats["failed"] += count
+                        print(f"Приветствие на сервере {guild.id} не отправлено ({count} участн.): {e}")
+                        continue
+                    self._record([joined_at for _, joined_at, _ in chunk])
+            else:
+                for member, joined_at, _ in batch:
+                    await self._welcome_one(channel, member, joined_at)
+
+    async def _welcome_one(self, channel, member, joined_at: float) -> None:
+        """Карточка и приветствие одного участника; ошибка не мешает остальным в пачке."""
+        guild = member.guild
+        message = format_welcome(member.mention, guild.name)
+        try:
+            image = await self.render(member, guild.member_count)
+        except Exception as e:
+            image = None
+            print(f"Карточка приветствия для {member.id} не нарисована: {e}")
+        try:
+            if image:
+                await channel.send(content=message, file=discord.File(image, filename="welcome.png"))
+                self.stats["cards"] += 1
+            else:
+                await channel.send(content=message)
+        except discord.HTTPException as e:
+            self.stats["failed"] += 1
+            print(f"Приветствие для {member.id} на сервере {guild.id} не отправлено: {e}")
+            return
+        self._record([joined_at])
+
+    def _record(self, joined: list[float]) -> None:
+        now = time.monotonic()
+        self._latency_ms.extend((now - joined_at) * 1000 for joined_at in joined)
+
+    @property
+    def depth(self) -> int:
+        return sum(len(joins.pending) for joins in self._guilds.values())
+
+    def snapshot(self) -> dict[str, Any]:
+        latencies = sorted(self._latency_ms)
+        return {
+            **self.stats,
+            "depth": self.depth,
+            "guilds_in_burst": sum(1 for guild_id in self._guilds if self.in_burst(guild_id)),
+            "latency_ms_p50": round(_percentile(latencies, 50), 1),
+            "latency_ms_p95": round(_percentile(latencies, 95), 1),
+            "latency_ms_max": round(latencies[-1], 1) if latencies else 0.0,
+            "roles": self.role_grants.snapshot(),
+        }
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Дообработать очереди без окна наплыва (при остановке бота), не дольше timeout секунд."""
+        self._closing = True
+        tasks = [joins.task for joins in self._guilds.values() if joins.task is not None and not joins.task.done()]
+        if tasks:
+            await asyncio.wait(tasks, timeout=timeout)
+        for task in tasks:
+            task.cancel()
+        await self.role_grants.close(timeout)
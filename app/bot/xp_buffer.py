@@ -0,0 +1,147 @@
+"""
+Write-behind буфер XP: on_message меняет состояние участника в памяти (сразу видно повышение уровня),
+а в user_levels приращения уходят пачкой UPSERT — по таймеру или когда набралось много записей.
+Максимальное окно потерь при падении процесса = интервал сброса (XP_FLUSH_INTERVAL).
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.core import member_view
+from app.core.levels import calculate_level
+from app.db.async_database import AsyncDatabase
+
+
+class BufferedUserLevel:
+    """Состояние участника: текущие значения (как в UserLevel) + ещё не записанные приращения."""
+
+    __slots__ = (
+        "guild_id",
+        "user_id",
+        "message_count",
+        "level",
+        "xp",
+        "days_on_server",
+        "pending_messages",
+        "pending_xp",
+    )
+
+    def __init__(self, guild_id: int, user_id: int, message_count: int, level: int, xp: int, days_on_server: int):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.message_count = message_count
+        self.level = level
+        self.xp = xp
+        self.days_on_server = days_on_server
+        self.pending_messages = 0
+        self.pending_xp = 0
+
+    def to_row(self) -> dict:
+        return {
+            "guild_id": self.guild_id,
+            "user_id": self.user_id,
+            "message_count": self.pending_messages,
+            "xp": self.pending_xp,
+            "level": self.level,
+            "days_on_server": self.days_on_server,
+        }
+
+
+class XpBuffer:
+    def __init__(self, db: AsyncDatabase, max_pending: int = 500):
+        self.db = db
+        self.max_pending = max_pending
+        self._entries: dict[tuple[int, int], BufferedUserLevel] = {}
+        # Пачка, которая прямо сейчас пишется в БД: новые сообщения берут состояние отсюда, а не из БД
+        self._flushing: dict[tuple[int, int], BufferedUserLevel] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        # Сколько раз начинался сброс: get() по нему понимает, что строка из БД могла устареть
+        self._flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def guild_entries(self, guild_id: int) -> list[BufferedUserLevel]:
+        """Участники гильдии, чьё состояние сейчас в буфере (новее, чем в БД)."""
+        merged = {key: e for key, e in self._flushing.items() if key[0] == guild_id}
+        merged.update((key, e) for key, e in self._entries.items() if key[0] == guild_id)
+        return list(merged.values())
+
+    async def get(self, guild_id: int, user_id: int) -> BufferedUserLevel:
+        """Состояние участника из буфера; если его там нет — читаем из БД (создаётся строка при отсутствии)."""
+        key = (guild_id, user_id)
+        while True:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+            source = self._flushing.get(key)
+            if source is not None:
+                break
+            flushes = self._flushes
+            source = await self.db.get_user_level(guild_id, user_id)
+            # Пока ждали БД, соседнее сообщение того же участника могло создать запись, а сброс — записать
+            # её приращения уже после нашего чтения: тогда строка устарела, проверяем буфер заново
+            if self._flushes == flushes and key not in self._entries:
+                break
+        entry = BufferedUserLevel(
+            guild_id,
+            user_id,
+            message_count=source.message_count,
+            level=source.level,
+            xp=source.xp,
+            days_on_server=source.days_on_server,
+        )
+        self._entries[key] = entry
+        return entry
+
+    async def add_message(self, guild_id: int, user_id: int) -> tuple[int, int]:
+        """Засчитать сообщение. Возвращает (старый уровень, новый уровень)."""
+        entry = await self.get(guild_id, user_id)
+        old_level = entry.level
+        xp_gain = 10 if old_level >= 5 else 0
+        entry.message_count += 1
+        entry.pending_messages += 1
+        entry.xp += xp_gain
+        entry.pending_xp += xp_gain
+        # уровень только вверх (так же пишется и в БД при сбросе)
+        entry.level = max(old_level, calculate_level(entry.message_count, entry.xp, entry.days_on_server))
+        if len(self._entries) >= self.max_pending:
+            self._schedule_flush()
+        return old_level, entry.level
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Записать накопленное в БД одной пачкой UPSERT. Возвращает число записанных строк."""
+        async with self._flush_lock:
+            if not self._entries:
+                return 0
+            self._flushing, self._entries = self._entries, {}
+            self._flushes += 1
+            rows = [entry.to_row() for entry in self._flushing.values()]
+            started = time.perf_counter()
+            try:
+                await self.db.apply_user_level_deltas(rows)
+            except Exception as e:
+                # Не теряем приращения: возвращаем пачку в буфер (поверх неё могли прийти новые сообщения)
+                print(f"Ошибка сброса буфера XP ({len(rows)} строк): {e}")
+                for key, entry in self._flushing.items():
+                    newer = self._entries.get(key)
+                    if newer is not None:
+                        newer.pending_messages += entry.pending_messages
+                        newer.pending_xp += entry.pending_xp
+                    else:
+                        self._entries[key] = entry
+                return 0
+            else:
+                member_view.apply_rows(self._flushing.values())
+            finally:
+                self._flushing = {}
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if elapsed_ms > 1000:
+                print(f"Буфер XP: записано {len(rows)} строк за {elapsed_ms:.0f} мс")
+            return len(rows)
@@ -0,0 +1,142 @@
+"""
+Антиспам для XP: решает, засчитывать ли сообщение, до буфера XP и БД — отсеянное сообщение
+не создаёт записи участника и не делает ни одного запроса.
+
+Правила гильдии (XpPolicy):
+- cooldown — после засчитанного сообщения следующее засчитывается не раньше, чем через N секунд;
+- min_length — короче (без пробелов по краям) не засчитывается;
+- duplicates / duplicate_window — тот же текст (без учёта регистра и пробелов), что и одно из последних
+  duplicates сообщений участника за duplicate_window секунд, не засчитывается.
+Значения по умолчанию — Config.XP_*, отдельные гильдии переопределяются в XP_POLICY_GUILDS (JSON).
+
+Состояние — несколько чисел на активного участника (время засчитанного сообщения и crc32 последних
+текстов) в OrderedDict по времени последнего сообщения: устаревшие записи снимаются с начала при
+каждой проверке, сверх max_entries вытесняются самые давние — память ограничена при любом флуде.
+"""
+from __future__ import annotations
+
+import json
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Mapping, NamedTuple
+
+
+class XpPolicy(NamedTuple):
+    cooldown: float = 0.0
+    min_length: int = 0
+    duplicates: int = 0
+    duplicate_window: float = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.cooldown > 0 or self.min_length > 0 or (self.duplicates > 0 and self.duplicate_window > 0)
+
+    @property
+    def horizon(self) -> float:
+        """Сколько секунд после последнего сообщения состояние участника ещё влияет на решение."""
+        return max(self.cooldown, self.duplicate_window if self.duplicates > 0 else 0.0)
+
+
+def parse_guild_policies(raw: str, default: XpPolicy) -> dict[int, XpPolicy]:
+    """XP_POLICY_GUILDS: {"guild_id": {"cooldown": 30, "min_length": 3, ...}}; не указанное — из default."""
+    if not raw.strip():
+        return {}
+    policies = {}
+    for guild_id, overrides in json.loads(raw).items():
+        unknown = set(overrides) - set(XpPolicy._fields)
+        if unknown:
+            raise RuntimeError(f"XP_POLICY_GUILDS: неизвестные поля {sorted(unknown)} у гильдии {guild_id}")
+        policies[int(guild_id)] = default._replace(**overrides)
+    return policies
+
+
+def content_hash(content: str) -> int:
+    return zlib.crc32(" ".join(content.casefold().split()).encode("utf-8"))
+
+
+class _UserState:
+    __slots__ = ("seen_at", "awarded_at", "hashes")
+
+    def __init__(self):
+        self.seen_at = 0.0
+        self.awarded_at = float("-inf")
+        # (crc32 текста, время) последних сообщений, не больше XpPolicy.duplicates
+        self.hashes: tuple[tuple[int, float], ...] = ()
+
+
+class XpPolicyEngine:
+    def __init__(
+        self,
+        default: XpPolicy,
+        guilds: Mapping[int, XpPolicy] | None = None,
+        max_entries: int = 100_000,
+    ):
+        self.default = default
+        self.guilds = dict(guilds or {})
+        self.max_entries = max_entries
+        # состояние живёт, пока может повлиять на решение хоть в одной гильдии
+        self._ttl = max([default.horizon, *(policy.horizon for policy in self.guilds.values())])
+        self._states: OrderedDict[tuple[int, int], _UserState] = OrderedDict()
+        self.stats = {"allowed": 0, "cooldown": 0, "short": 0, "duplicate": 0, "expired": 0, "evicted": 0}
+
+    def policy(self, guild_id: int) -> XpPolicy:
+        return self.guilds.get(guild_id, self.default)
+
+    def _expire(self, now: float) -> None:
+        states = self._states
+        while states:
+            key, state = next(iter(states.items()))
+            if now - state.seen_at < self._ttl:
+                break
+            del states[key]
+            self.stats["expired"] += 1
+
+    def check(self, guild_id: int, user_id: int, content: str, now: float | None = None) -> bool:
+        """Засчитать ли сообщение; False — причина в stats (cooldown / short / duplicate)."""
+        policy = self.policy(guild_id)
+        if not policy.enabled:
+            self.stats["allowed"] += 1
+            return True
+        if len(content.strip()) < policy.min_length:
+            self.stats["short"] += 1
+            return False
+        if policy.horizon <= 0:
+            self.stats["allowed"] += 1
+            return True
+
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        key = (guild_id, user_id)
+        state = self._states.get(key)
+        if state is None:
+            if len(self._states) >= self.max_entries:
+                self._states.popitem(last=False)
+                self.stats["evicted"] += 1
+            state = self._states[key] = _UserState()
+        else:
+            self._states.move_to_end(key)
+        state.seen_at = now
+
+        verdict = "allowed"
+        if policy.duplicates > 0 and policy.duplicate_window > 0:
+            digest = content_hash(content)
+            recent = tuple(item for item in state.hashes if now - item[1] < policy.duplicate_window)
+            if any(item[0] == digest for item in recent):
+                verdict = "duplicate"
+            state.hashes = (recent + ((digest, now),))[-policy.duplicates:]
+        if verdict == "allowed" and now - state.awarded_at < policy.cooldown:
+            verdict = "cooldown"
+        if verdict == "allowed":
+            state.awarded_at = now
+        self.stats[verdict] += 1
+        return verdict == "allowed"
+
+    def snapshot(self) -> dict[str, Any]:
+        checked = sum(self.stats[name] for name in ("allowed", "cooldown", "short", "duplicate"))
+        suppressed = checked - self.stats["allowed"]
+        return {
+            **self.stats,
+            "tracked": len(self._states),
+            "suppressed_ratio": round(suppressed / checked, 3) if checked else 0.0,
+        }
@@ -0,0 +1,95 @@
+"""
+Общий кэш между процессами (бот и отдельно запущенный API): ключ -> байты.
+Бот пишет туда снимки guild_cache (app.core.cache_sync), процессы API читают.
+
+- file  — папка на локальном диске (бот и API на одной машине); запись атомарная (tmp + rename),
+  читатель никогда не видит наполовину записанный файл;
+- redis — Redis-совместимый сервер (нужен пакет redis: pip install redis).
+
+Выбирается CACHE_BACKEND / CACHE_URL в .env; пусто — общего кэша нет (API в процессе бота).
+"""
+from __future__ import annotations
+
+import os
+import re
+from abc import ABC, abstractmethod
+
+from app.core.config import Config
+
+_DEFAULT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "cache", "shared"))
+
+
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+
+class FileCacheBackend(CacheBackend):
+    def __init__(self, directory: str | None = None):
+        self.directory = directory or _DEFAULT_DIR
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        # ключи вида "guild:123:users" — в имя файла без ":" и прочих недопустимых символов
+        return os.path.join(self.directory, re.sub(r"[^A-Za-z0-9_.-]", "_", key))
+
+    def get(self, key: str) -> bytes | None:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(value)
+        os.replace(tmp, path)
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, url: str, prefix: str = "witrix:"):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis требует пакет redis (pip install redis)") from e
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> bytes | None:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self._client.set(self.prefix + key, value)
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+
+def make_backend(kind: str | None = None, url: str | None = None) -> CacheBackend | None:
+    """Бэкенд по настройкам (CACHE_BACKEND, CACHE_URL); None — общий кэш не используется."""
+    kind = (Config.CACHE_BACKEND if kind is None else kind).strip().lower()
+    url = Config.CACHE_URL if url is None else url
+    if not kind:
+        return None
+    if kind == "file":
+        return FileCacheBackend(url or None)
+    if kind == "redis":
+        return RedisCacheBackend(url or "redis://localhost:6379/0")
+    raise RuntimeError(f"Неизвестный CACHE_BACKEND: {kind} (file | redis)")
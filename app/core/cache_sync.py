@@ -0,0 +1,296 @@
+"""
+Снимки guild_cache через общий кэш (app.core.cache_backend) — для API, запущенного отдельно от бота
+(`uvicorn app.main:app --workers N`, API_IN_PROCESS=false).
+
+Бот (CachePublisher) раз в CACHE_PUBLISH_INTERVAL пишет изменившиеся части: у каждой гильдии
+"guild:{id}:meta" (каналы и роли), участников и "guild:{id}:levels" (журнал member_view: записанные
+в БД уровни/XP, входы и выходы), затем манифест "guilds" — список гильдий и ревизии частей. Снимки
+guild_cache неизменяемы, поэтому «изменилось» — это просто другой объект, сравнивать содержимое не нужно.
+
+Участники публикуются по шардам guild_cache.UserShards: "guild:{id}:users:{n}" — только шарды, которые
+поменялись (вход, выход, ник), и "guild:{id}:users" — ревизии всех шардов. Процесс API читает только
+шарды с новой ревизией. Все шарды пишутся, только когда бот пересобрал список участников целиком.
+
+Процесс API (CacheReader) раз в CACHE_POLL_INTERVAL читает манифест и подгружает только части с новой
+ревизией. Ревизии становятся версиями снимков в процессе API; они отсчитываются от времени запуска бота
+и не повторяются после его перезапуска. Версия участников, по которой пересобирается member_view, —
+отдельная ревизия состава: она меняется, только когда бот пересобрал список участников целиком; смена
+ника или аватара и точечные входы/выходы сводный список не пересобирают.
+
+Журнал уровней — последние LEVEL_LOG_BATCHES пачек с номерами подряд внутри эпохи. Эпоха меняется,
+когда бот сбросил список гильдии (update_days): процессы API тогда пересобирают его из БД. Пропустивший
+пачки процесс (отстал больше чем на журнал) тоже пересобирает список, а не применяет его с дырой.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from app.core import guild_cache, member_view
+from app.core.cache_backend import CacheBackend
+from app.core.guild_cache import MemberInfo
+
+MANIFEST_KEY = "guilds"
+# Пачек журнала уровней в общем кэше на гильдию (пачка — одна публикация)
+LEVEL_LOG_BATCHES = 300
+
+
+def _meta_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:meta"
+
+
+def _users_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:users"
+
+
+def _shard_key(guild_id: int, index: int) -> str:
+    return f"guild:{guild_id}:users:{index}"
+
+
+def _levels_key(guild_id: int) -> str:
+    return f"guild:{guild_id}:levels"
+
+
+def _dumps(payload: Any) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class _LevelLog:
+    """Журнал уровней гильдии у публикатора: эпоха, номер последней пачки, пачки и ревизия части."""
+
+    __slots__ = ("epoch", "seq", "batches", "rev")
+
+    def __init__(self, epoch: int):
+        self.epoch = epoch
+        self.seq = 0
+        self.batches: deque[list] = deque(maxlen=LEVEL_LOG_BATCHES)
+        self.rev = epoch
+
+
+class CachePublisher:
+    """Публикация снимков guild_cache процесса бота."""
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._revs = itertools.count(time.time_ns() // 1000)
+        self._registry: Any = None
+        self._registry_rev = 0
+        # guild_id -> (каналы, роли, ревизия) / (участники, ревизия, ревизии шардов) последней публикации
+        self._meta: dict[int, tuple[Any, Any, int]] = {}
+        self._users: dict[int, tuple[Any, int, list[int]]] = {}
+        # guild_id -> (users_version снимка, ревизия состава)
+        self._members: dict[int, tuple[int, int]] = {}
+        self._levels: dict[int, _LevelLog] = {}
+        member_view.enable_journal()
+        self.stats = {"publishes": 0, "keys": 0, "bytes": 0}
+
+    def _write(self, key: str, payload: Any) -> None:
+        data = _dumps(payload)
+        self.backend.set(key, data)
+        self.stats["keys"] += 1
+        self.stats["bytes"] += len(data)
+
+    def publish(self) -> int:
+        """Записать части, изменившиеся с прошлого раза; возвращает их число (0 — публиковать нечего)."""
+        by_id, _, snapshots = guild_cache.current_state()
+        changes, resets = member_view.take_journal()
+        written = 0
+        for gid, snap in snapshots.items():
+            meta = self._meta.get(gid)
+            if meta is None or meta[0] is not snap.channels or meta[1] is not snap.roles:
+                self._write(
+                    _meta_key(gid),
+                    {"channels": [dict(c) for c in snap.channels], "roles": [dict(r) for r in snap.roles]},
+                )
+                self._meta[gid] = (snap.channels, snap.roles, next(self._revs))
+                written += 1
+            users = self._users.get(gid)
+            if users is None or users[0] is not snap.users:
+                written += self._publish_users(gid, snap.users, users)
+            members = self._members.get(gid)
+            if members is None or members[0] != snap.users_version:
+                # users_version меняется только вместе с объектом участников — часть users уже записана
+                self._members[gid] = (snap.users_version, next(self._revs))
+            written += self._publish_levels(gid, changes.get(gid), None in resets or gid in resets)
+        removed = [gid for gid in self._meta if gid not in snapshots]
+        if by_id is not self._registry:
+            self._registry = by_id
+            self._registry_rev = next(self._revs)
+        elif not written and not removed:
+            return 0
+        removed_shards = {}
+        for gid in removed:
+            del self._meta[gid]
+            removed_shards[gid] = self._users.pop(gid, (None, 0, []))[2]
+            self._members.pop(gid, None)
+            self._levels.pop(gid, None)
+        self._write(
+            MANIFEST_KEY,
+            {
+                "version": self._registry_rev,
+                "guilds": [dict(g) for g in by_id.values()],
+                "parts": {
+                    str(gid): [meta[2], self._users[gid][1], self._members[gid][1], self._levels[gid].rev]
+                    for gid, meta in self._meta.items()
+                },
+            },
+        )
+        # части удалённых гильдий — после манифеста, который на них уже не ссылается
+        for gid, shard_revs in removed_shards.items():
+            self.backend.delete(_meta_key(gid))
+            self.backend.delete(_users_key(gid))
+            for index in range(len(shard_revs)):
+                self.backend.delete(_shard_key(gid, index))
+            self.backend.delete(_levels_key(gid))
+        self.stats["publishes"] += 1
+        return written
+
+    def _publish_users(self, gid: int, users: guild_cache.UserShards, published: tuple | None) -> int:
+        """Записать изменившиеся шарды участников и ревизии шардов; возвращает число записанных частей."""
+        shards = users.shards
+        if published is None:
+            prev_shards, revs = (None,) * len(shards), [0] * len(shards)
+        else:
+            prev_shards, revs = published[0].shards, list(published[2])
+        written = 0
+        for index, shard in enumerate(shards):
+            if shard is prev_shards[index]:
+                continue
+            self._write(
+                _shard_key(gid, index),
+                [[uid, info.name, info.avatar_kind, info.avatar_key] for uid, info in shard.items()],
+            )
+            revs[index] = next(self._revs)
+            written += 1
+        self._write(_users_key(gid), revs)
+        self._users[gid] = (users, next(self._revs), revs)
+        return written + 1
+
+    def _publish_levels(self, gid: int, entries: list | None, reset: bool) -> int:
+        """Дописать пачку журнала гильдии (и/или начать новую эпоху); возвращает число записанных частей."""
+        log = self._levels.get(gid)
+        if log is not None and not reset and not entries:
+            return 0
+        if log is None or reset:
+            log = self._levels[gid] = _LevelLog(next(self._revs))
+        if entries:
+            log.seq += 1
+            log.batches.append([log.seq, entries])
+            log.rev = next(self._revs)
+        self._write(_levels_key(gid), {"epoch": log.epoch, "batches": list(log.batches)})
+        return 1
+
+
+class CacheReader:
+    """Подгрузка опубликованных снимков в guild_cache процесса API (фоновый поток)."""
+
+    def __init__(self, backend: CacheBackend, interval: float = 1.0):
+        self.backend = backend
+        self.interval = interval
+        self._version: int | None = None
+        # guild_id -> [ревизии каналов/ролей, участников, состава, журнала уровней], уже загруженные
+        self._parts: dict[int, list[int]] = {}
+        # guild_id -> ревизии загруженных шардов участников
+        self._shards: dict[int, list[int | None]] = {}
+        # guild_id -> (эпоха, номер последней применённой пачки журнала уровней)
+        self._levels: dict[int, tuple[int, int]] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def refresh(self) -> bool:
+        """Прочитать манифест и подгрузить изменившиеся части; True — что-то обновилось."""
+        raw = self.backend.get(MANIFEST_KEY)
+        if raw is None:
+            return False
+        manifest = json.loads(raw)
+        changed = False
+        if manifest["version"] != self._version:
+            guild_cache.install_registry(manifest["guilds"], manifest["version"])
+            self._version = manifest["version"]
+            changed = True
+        parts = {int(gid): revs for gid, revs in manifest["parts"].items()}
+        for gid, (meta_rev, users_rev, members_rev, levels_rev) in parts.items():
+            loaded = self._parts.setdefault(gid, [None, None, None, None])
+            if loaded[0] != meta_rev:
+                raw = self.backend.get(_meta_key(gid))
+                if raw is not None:
+                    meta = json.loads(raw)
+                    guild_cache.install_guild(gid, meta["channels"], meta["roles"], version=meta_rev)
+                    loaded[0] = meta_rev
+                    changed = True
+            if loaded[1] != users_rev or loaded[2] != members_rev:
+                if self._load_users(gid, members_rev):
+                    loaded[1], loaded[2] = users_rev, members_rev
+                    changed = True
+            if loaded[3] != levels_rev:
+                raw = self.backend.get(_levels_key(gid))
+                if raw is not None:
+                    self._apply_levels(gid, json.loads(raw))
+                    loaded[3] = levels_rev
+                    changed = True
+        if any(gid not in parts for gid in self._parts):
+            self._parts = {gid: revs for gid, revs in self._parts.items() if gid in parts}
+            self._levels = {gid: state for gid, state in self._levels.items() if gid in parts}
+            self._shards = {gid: revs for gid, revs in self._shards.items() if gid in parts}
+            guild_cache.retain_guilds(parts)
+            changed = True
+        return changed
+
+    def _load_users(self, gid: int, members_rev: int) -> bool:
+        """Подгрузить шарды участников с новой ревизией; False — части уже удалены (гильдию убрали)."""
+        raw = self.backend.get(_users_key(gid))
+        if raw is None:
+            return False
+        revs = json.loads(raw)
+        loaded = self._shards.get(gid) or [None] * len(revs)
+        shards = {}
+        for index, rev in enumerate(revs):
+            if loaded[index] == rev:
+                continue
+            raw = self.backend.get(_shard_key(gid, index))
+            if raw is None:
+                return False
+            shards[index] = {
+                uid: MemberInfo(gid, uid, name, kind, key) for uid, name, kind, key in json.loads(raw)
+            }
+        guild_cache.install_user_shards(gid, shards, members_rev)
+        self._shards[gid] = revs
+        return True
+
+    def _apply_levels(self, gid: int, log: dict[str, Any]) -> None:
+        """Применить к member_view новые пачки журнала; новая эпоха или пропуск пачек — пересборка из БД."""
+        batches = log["batches"]
+        epoch, seq = self._levels.get(gid, (None, 0))
+        fresh = [batch for batch in batches if batch[0] > seq] if log["epoch"] == epoch else None
+        if fresh is None or (fresh and fresh[0][0] != seq + 1):
+            # всё из журнала к этому моменту уже в БД
+            member_view.invalidate(gid)
+        else:
+            for _, entries in fresh:
+                member_view.apply_changes(gid, entries)
+        self._levels[gid] = (log["epoch"], batches[-1][0] if batches else 0)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Общий кэш: не удалось обновить снимки: {e}")
+
+    def start(self) -> None:
+        """Первая загрузка сразу (до первых запросов), дальше — в фоне раз в interval секунд."""
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"Общий кэш: не удалось загрузить снимки: {e}")
+        self._thread = threading.Thread(target=self._run, name="cache-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
@@ -8,6 +8,14 @@ class Config:
     DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
     SECRET_KEY = os.getenv("SECRET_KEY")
     DB_URL = os.getenv("DB_URL")
+    # Пул соединений (на каждый event loop: бот и API): постоянных соединений, сверх них при пиках,
+    # пересоздание соединения через N секунд и сколько ждать свободного соединения
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Создавать недостающие таблицы/индексы при запуске main.py (иначе — scripts/migrate.py вручную)
+    DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "yes")
 
     # Логин/пароль для веб-панели (проверка при POST /api/auth/login)
     ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
@@ -32,4 +40,94 @@ class Config:
     # Хост для API (в Docker задать 0.0.0.0)
     API_HOST = os.getenv("API_HOST", "127.0.0.1")
     API_PORT = int(os.getenv("API_PORT", "4000"))
+    # API в потоке процесса бота (main.py). false — main.py запускает только бота, API запускается отдельно
+    # (uvicorn app.main:app --workers N) и читает данные бота из общего кэша (CACHE_BACKEND)
+    API_IN_PROCESS = os.getenv("API_IN_PROCESS", "true").lower() in ("1", "true", "yes")
 
+    # Общий кэш снимков гильдий между ботом и API: file (CACHE_URL — папка, пусто — cache/shared)
+    # или redis (CACHE_URL — redis://...); пусто — без общего кэша.
+    # Бот публикует изменения раз в CACHE_PUBLISH_INTERVAL сек, API проверяет раз в CACHE_POLL_INTERVAL
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "")
+    CACHE_URL = os.getenv("CACHE_URL", "")
+    CACHE_PUBLISH_INTERVAL = float(os.getenv("CACHE_PUBLISH_INTERVAL", "1"))
+    CACHE_POLL_INTERVAL = float(os.getenv("CACHE_POLL_INTERVAL", "1"))
+    # Настройки гильдий в памяти: с общим кэшем сверять, не менялись ли они в другом процессе, не чаще (сек)
+    GUILD_CONFIG_CHECK_INTERVAL = float(os.getenv("GUILD_CONFIG_CHECK_INTERVAL", "2"))
+
+    # Буфер XP (write-behind): раз в сколько секунд сбрасывать накопленное в БД.
+    # Это же максимальное окно потерь XP при аварийном завершении процесса.
+    XP_FLUSH_INTERVAL = float(os.getenv("XP_FLUSH_INTERVAL", "10"))
+    # Внеочередной сброс, когда в буфере набралось столько участников
+    XP_FLUSH_MAX_PENDING = int(os.getenv("XP_FLUSH_MAX_PENDING", "500"))
+
+    # Сверка уровней: очередь изменённых участников — раз в N минут,
+    # полный проход по всем — раз в N часов (0 = отключить полный проход)
+    LEVEL_SYNC_MINUTES = float(os.getenv("LEVEL_SYNC_MINUTES", "10"))
+    LEVEL_FULL_SYNC_HOURS = float(os.getenv("LEVEL_FULL_SYNC_HOURS", "24"))
+
+    # Рендер карточек (приветствие, /level) вне event loop:
+    # число воркеров (0 = авто), лимит ожидающих рендеров, пул процессов вместо потоков
+    RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+    RENDER_MAX_QUEUE = int(os.getenv("RENDER_MAX_QUEUE", "32"))
+    RENDER_USE_PROCESSES = os.getenv("RENDER_USE_PROCESSES", "").lower() in ("1", "true", "yes")
+
+    # Шрифты карточек (пути к .ttf). Пусто — fonts/ в корне проекта, затем системный;
+    # жирный (ник на карточках) по умолчанию совпадает с обычным
+    FONT_REGULAR = os.getenv("FONT_REGULAR", "")
+    FONT_BOLD = os.getenv("FONT_BOLD", "")
+    # Стиль (цвета) карточек: default | light | ocean; CARD_STYLE_GUILDS — свой стиль для серверов (JSON:
+    # {"guild_id": "light"} или {"guild_id": {"base": "default", "accent": "#ff8800"}})
+    CARD_STYLE = os.getenv("CARD_STYLE", "default")
+    CARD_STYLE_GUILDS = os.getenv("CARD_STYLE_GUILDS", "")
+
+    # Кэш аватаров для карточек: сколько декодированных изображений держать в памяти,
+    # папка для байтов с CDN (пусто — cache/avatars в корне проекта) и срок хранения на диске
+    # в часах (0 — без диска, только память)
+    AVATAR_CACHE_SIZE = int(os.getenv("AVATAR_CACHE_SIZE", "256"))
+    AVATAR_CACHE_DIR = os.getenv("AVATAR_CACHE_DIR", "")
+    AVATAR_CACHE_TTL_HOURS = float(os.getenv("AVATAR_CACHE_TTL_HOURS", "24"))
+
+    # Кэш готовых карточек /level: лимит в памяти (МБ), папка на диске (пусто — только память)
+    # и лимит папки на диске (МБ, 0 — без лимита)
+    CARD_CACHE_MB = float(os.getenv("CARD_CACHE_MB", "16"))
+    CARD_CACHE_DIR = os.getenv("CARD_CACHE_DIR", "")
+    CARD_CACHE_DISK_MB = float(os.getenv("CARD_CACHE_DISK_MB", "256"))
+
+    # Лидерборд в памяти для /top и ранга на карточке /level (иначе — запросы к БД по индексу)
+    LEADERBOARD_IN_MEMORY = os.getenv("LEADERBOARD_IN_MEMORY", "").lower() in ("1", "true", "yes")
+
+    # Сводный список участников для веб-панели (/users): полная пересборка не реже раза в N секунд
+    # (между пересборками обновляется точечно; 0 — только по событиям)
+    MEMBER_VIEW_TTL = float(os.getenv("MEMBER_VIEW_TTL", "300"))
+
+    # Поздравления с новым уровнем: окно склейки в одно сообщение (сек) и предел очереди канала
+    # (сверх него новые поздравления отбрасываются)
+    LEVELUP_WINDOW = float(os.getenv("LEVELUP_WINDOW", "2"))
+    LEVELUP_MAX_QUEUE = int(os.getenv("LEVELUP_MAX_QUEUE", "1000"))
+
+    # Приветствие новых участников: сколько серверов обрабатывать одновременно; больше
+    # WELCOME_BURST_THRESHOLD входов за WELCOME_BURST_WINDOW сек — режим наплыва (входы за
+    # WELCOME_BATCH_WINDOW сек — одним текстовым сообщением, без карточек). Роль при входе — не больше
+    # WELCOME_ROLE_RATE выдач за WELCOME_ROLE_PER сек на сервер
+    WELCOME_WORKERS = int(os.getenv("WELCOME_WORKERS", "4"))
+    WELCOME_BURST_THRESHOLD = int(os.getenv("WELCOME_BURST_THRESHOLD", "10"))
+    WELCOME_BURST_WINDOW = float(os.getenv("WELCOME_BURST_WINDOW", "60"))
+    WELCOME_BATCH_WINDOW = float(os.getenv("WELCOME_BATCH_WINDOW", "5"))
+    WELCOME_ROLE_RATE = int(os.getenv("WELCOME_ROLE_RATE", "10"))
+    WELCOME_ROLE_PER = float(os.getenv("WELCOME_ROLE_PER", "10"))
+
+    # Антиспам XP (по умолчанию выключен): сообщение засчитывается не чаще раза в XP_COOLDOWN сек,
+    # не короче XP_MIN_LENGTH символов и не повтором одного из XP_DUPLICATES последних сообщений
+    # участника за XP_DUPLICATE_WINDOW сек. XP_POLICY_GUILDS — переопределения по гильдиям (JSON),
+    # XP_POLICY_MAX_USERS — предел участников, чьё состояние держим в памяти
+    XP_COOLDOWN = float(os.getenv("XP_COOLDOWN", "0"))
+    XP_MIN_LENGTH = int(os.getenv("XP_MIN_LENGTH", "0"))
+    XP_DUPLICATES = int(os.getenv("XP_DUPLICATES", "0"))
+    XP_DUPLICATE_WINDOW = float(os.getenv("XP_DUPLICATE_WINDOW", "60"))
+    XP_POLICY_GUILDS = os.getenv("XP_POLICY_GUILDS", "")
+    XP_POLICY_MAX_USERS = int(os.getenv("XP_POLICY_MAX_USERS", "100000"))
+
+    # Запуск (on_ready): сколько гильдий обрабатывать одновременно (команды, участники, БД)
+    # и файл с хэшами слэш-команд (пусто — cache/command_sync.json в корне проекта)
+    STARTUP_CONCURRENCY = int(os.getenv("STARTUP_CONCURRENCY", "4"))
+    COMMAND_SYNC_STATE = os.getenv("COMMAND_SYNC_STATE", "")
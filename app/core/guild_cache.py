@@ -1,47 +1,326 @@
 """
-Кэш гильдий/каналов/ролей для веб-API. Обновляется ботом в on_ready и on_guild_join/remove.
+Кэш гильдий/каналов/ролей/участников для веб-API. Бот собирает его целиком в on_ready
+и on_guild_join/remove, а дальше патчит по событиям: каналы и роли — set_guild_channels /
+set_guild_roles, вход/выход участников и смена ника или аватара — пачками apply_user_deltas.
+
+Неизменяемые снимки: писатель собирает новые замороженные структуры (tuple / MappingProxyType)
+и одной операцией подменяет ссылку на снимок. Читатели берут текущую ссылку без блокировки
+и без копирования — получают read-only представления, которые уже никто не изменит.
+У каждой гильдии свой снимок: обновление одной гильдии не пересобирает остальные.
+Участники гильдии разбиты на шарды (UserShards): пачка изменений копирует только затронутые шарды,
+а не весь словарь участников большой гильдии.
+Блокировка есть только между писателями (бот), чтобы не потерять параллельные изменения.
 """
 from __future__ import annotations
 
+import itertools
+import sys
 import threading
-from typing import Any
+from collections.abc import Mapping as MappingABC
+from types import MappingProxyType
+from typing import Any, Iterable, Iterator, Mapping, Sequence
+
+_EMPTY: Mapping[Any, Any] = MappingProxyType({})
+
+_CDN = "https://cdn.discordapp.com"
+
+# Откуда аватар участника (URL собирается по требованию, как в discord.Asset)
+AVATAR_NONE = 0
+AVATAR_USER = 1  # аватар аккаунта: key = хэш
+AVATAR_GUILD = 2  # аватар на сервере: key = хэш
+AVATAR_DEFAULT = 3  # стандартный: key = номер картинки
+AVATAR_URL = 4  # готовый URL (например, из старого формата {name, avatar})
+
+
+class MemberInfo:
+    """
+    Участник в кэше: ник и аватар в компактном виде. Хранится хэш аватара (та же строка, что держит
+    discord.py), а не полный URL; ник интернируется. Не изменяется после создания (часть снимка).
+    Поддерживает info.get("name") / info.get("avatar"), как прежний словарь.
+    """
+
+    __slots__ = ("guild_id", "user_id", "name", "avatar_kind", "avatar_key")
+
+    def __init__(self, guild_id: int, user_id: int, name: str, avatar_kind: int = AVATAR_NONE, avatar_key: str | None = None):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.name = sys.intern(name) if isinstance(name, str) else name
+        self.avatar_kind = avatar_kind if avatar_key else AVATAR_NONE
+        self.avatar_key = avatar_key
+
+    @classmethod
+    def from_dict(cls, guild_id: int, user_id: int, info: Mapping[str, Any]) -> "MemberInfo":
+        return cls(guild_id, user_id, info.get("name"), AVATAR_URL, info.get("avatar"))
+
+    @property
+    def avatar(self) -> str | None:
+        key, kind = self.avatar_key, self.avatar_kind
+        if kind == AVATAR_URL:
+            return key
+        if kind == AVATAR_DEFAULT:
+            return f"{_CDN}/embed/avatars/{key}.png"
+        ext = "gif" if key and key.startswith("a_") else "png"
+        if kind == AVATAR_USER:
+            return f"{_CDN}/avatars/{self.user_id}/{key}.{ext}?size=1024"
+        if kind == AVATAR_GUILD:
+            return f"{_CDN}/guilds/{self.guild_id}/users/{self.user_id}/avatars/{key}.{ext}?size=1024"
+        return None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == "name":
+            return self.name
+        if key == "avatar":
+            return self.avatar
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in ("name", "avatar"):
+            raise KeyError(key)
+        return self.get(key)
+
+
+def _counts(info: MemberInfo | None) -> int:
+    """1, если участник входит в число участников гильдии (есть и не удалённый аккаунт)."""
+    return 0 if info is None or is_deleted_user(info.name) else 1
+
+
+def _count_members(users: Iterable[MemberInfo]) -> int:
+    return sum(map(_counts, users))
+
+
+# Шардов участников на гильдию: пачка изменений копирует ~len/_USER_SHARDS участников на каждый затронутый шард
+_USER_SHARDS = 64
+
+
+def _shard_of(user_id: int) -> int:
+    # В snowflake младшие биты — счётчик (часто 0), старшие — время: смешиваем, чтобы шарды были ровными
+    return (user_id ^ (user_id >> 22)) % _USER_SHARDS
+
+
+class UserShards(MappingABC):
+    """
+    Участники гильдии (user_id -> MemberInfo) read-only, разбитые на _USER_SHARDS словарей по user_id.
+    Не изменяется после создания: with_changes возвращает новый объект, в котором заново собраны
+    только шарды с изменениями, остальные общие со старым.
+    """
+
+    __slots__ = ("_shards", "_len")
+
+    def __init__(self, shards: Sequence[Mapping[int, MemberInfo]] | None = None):
+        self._shards: tuple[Mapping[int, MemberInfo], ...] = (
+            tuple(shards) if shards is not None else (_EMPTY,) * _USER_SHARDS
+        )
+        self._len = sum(map(len, self._shards))
+
+    @classmethod
+    def build(cls, users: Mapping[int, MemberInfo]) -> "UserShards":
+        shards: list[dict[int, MemberInfo]] = [{} for _ in range(_USER_SHARDS)]
+        for user_id, info in users.items():
+            shards[_shard_of(user_id)][user_id] = info
+        return cls([MappingProxyType(shard) for shard in shards])
+
+    def with_changes(self, upserts: Mapping[int, MemberInfo], removed: Iterable[int] = ()) -> "UserShards":
+        changed: dict[int, dict[int, MemberInfo]] = {}
+
+        def shard(user_id: int) -> dict[int, MemberInfo]:
+            index = _shard_of(user_id)
+            users = changed.get(index)
+            if users is None:
+                users = changed[index] = self._shards[index].copy()
+            return users
+
+        for user_id in removed:
+            if user_id in self:
+                del shard(user_id)[user_id]
+        for user_id, info in upserts.items():
+            shard(user_id)[user_id] = info
+        if not changed:
+            return self
+        return self.with_shards({index: MappingProxyType(users) for index, users in changed.items()})
+
+    def with_shards(self, replacements: Mapping[int, Mapping[int, MemberInfo]]) -> "UserShards":
+        """Новый объект с заменёнными шардами (index -> read-only словарь), остальные общие."""
+        shards = list(self._shards)
+        for index, users in replacements.items():
+            shards[index] = users
+        return UserShards(shards)
+
+    @property
+    def shards(self) -> tuple[Mapping[int, MemberInfo], ...]:
+        """Шарды (read-only словари); шард, который не менялся, — тот же объект, что в прежнем снимке."""
+        return self._shards
+
+    def __getitem__(self, user_id: int) -> MemberInfo:
+        return self._shards[_shard_of(user_id)][user_id]
+
+    def get(self, user_id: int, default: Any = None) -> Any:
+        return self._shards[_shard_of(user_id)].get(user_id, default)
+
+    def __contains__(self, user_id: object) -> bool:
+        return isinstance(user_id, int) and user_id in self._shards[_shard_of(user_id)]
+
+    def __iter__(self) -> Iterator[int]:
+        return itertools.chain.from_iterable(self._shards)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def values(self) -> Iterable[MemberInfo]:
+        return list(itertools.chain.from_iterable(shard.values() for shard in self._shards))
+
+    def items(self) -> Iterable[tuple[int, MemberInfo]]:
+        return list(itertools.chain.from_iterable(shard.items() for shard in self._shards))
+
+
+_NO_USERS = UserShards()
+
+
+class _GuildSnapshot:
+    """Каналы, роли и участники одной гильдии (не меняется после создания)."""
+
+    __slots__ = ("channels", "roles", "users", "version", "users_version", "member_count")
+
+    def __init__(
+        self,
+        channels: Sequence[Mapping[str, Any]] = (),
+        roles: Sequence[Mapping[str, Any]] = (),
+        users: UserShards = _NO_USERS,
+        version: int = 0,
+        users_version: int = 0,
+        member_count: int | None = None,
+    ):
+        self.channels = channels
+        self.roles = roles
+        self.users = users  # user_id -> MemberInfo
+        # Участников без удалённых аккаунтов (/users/count); None — посчитать по users
+        self.member_count = _count_members(users.values()) if member_count is None else member_count
+        # Версия каналов/ролей (ETag для API)
+        self.version = version
+        # Версия списка участников: растёт при каждой пересборке (по ней app.core.member_view понимает,
+        # что его сводный список устарел)
+        self.users_version = users_version
+
+
+class _Registry:
+    """Список гильдий бота: по ID, в порядке добавления и множество ID (не меняется после создания)."""
+
+    __slots__ = ("by_id", "ordered", "ids", "version")
+
+    def __init__(self, by_id: dict[int, Mapping[str, Any]] | None = None, version: int = 0):
+        by_id = by_id or {}
+        self.by_id: Mapping[int, Mapping[str, Any]] = MappingProxyType(by_id)
+        self.ordered: tuple[Mapping[str, Any], ...] = tuple(by_id.values())
+        self.ids: frozenset[int] = frozenset(by_id)
+        self.version = version
 
-_lock = threading.Lock()
-_guilds: list[dict[str, Any]] = []
-_channels: dict[int, list[dict[str, Any]]] = {}
-_roles: dict[int, list[dict[str, Any]]] = {}
-_users: dict[int, dict[int, dict[str, Any]]] = {}  # guild_id -> user_id -> {name, avatar}
+
+_EMPTY_GUILD = _GuildSnapshot()
+
+_write_lock = threading.Lock()
+# Общий счётчик версий: версия не повторится, даже если гильдию удалили и добавили заново
+_versions = itertools.count(1)
+_registry = _Registry()
+_snapshots: Mapping[int, _GuildSnapshot] = _EMPTY
+
+
+def _freeze_items(items) -> tuple[Mapping[str, Any], ...]:
+    return tuple(MappingProxyType(dict(item)) for item in items)
+
+
+def _member(guild_id: int, user_id: int, info: MemberInfo | Mapping[str, Any]) -> MemberInfo:
+    return info if isinstance(info, MemberInfo) else MemberInfo.from_dict(guild_id, user_id, info)
+
+
+def _freeze_users(guild_id: int, users: Mapping[int, MemberInfo | Mapping[str, Any]]) -> UserShards:
+    return UserShards.build({uid: _member(guild_id, uid, info) for uid, info in users.items()})
+
+
+def _set_snapshot(guild_id: int, snapshot: _GuildSnapshot | None) -> None:
+    """Подменить снимок одной гильдии (под _write_lock). Остальные гильдии переиспользуются как есть."""
+    global _snapshots
+    snapshots = dict(_snapshots)
+    if snapshot is None:
+        snapshots.pop(guild_id, None)
+    else:
+        snapshots[guild_id] = snapshot
+    _snapshots = MappingProxyType(snapshots)
+
+
+def _set_registry_guild(guild_id: int, guild: Mapping[str, Any] | None) -> None:
+    """Добавить/заменить/убрать гильдию в реестре (под _write_lock); порядок остальных сохраняется."""
+    global _registry
+    by_id = dict(_registry.by_id)
+    if guild is None:
+        if by_id.pop(guild_id, None) is None:
+            return
+    else:
+        by_id[guild_id] = guild
+    _registry = _Registry(by_id, next(_versions))
+
+
+def _guild(guild_id: int) -> _GuildSnapshot:
+    return _snapshots.get(guild_id, _EMPTY_GUILD)
 
 
 def set_guilds(guilds: list[dict[str, Any]]) -> None:
-    with _lock:
-        global _guilds
-        _guilds = list(guilds)
+    global _registry
+    frozen = {g["id"]: g for g in _freeze_items(guilds)}
+    with _write_lock:
+        _registry = _Registry(frozen, next(_versions))
 
 
 def set_guild_channels(guild_id: int, channels: list[dict[str, Any]]) -> None:
-    with _lock:
-        _channels[guild_id] = list(channels)
+    frozen = _freeze_items(channels)
+    with _write_lock:
+        old = _guild(guild_id)
+        _set_snapshot(
+            guild_id, _GuildSnapshot(frozen, old.roles, old.users, next(_versions), old.users_version, old.member_count)
+        )
 
 
 def set_guild_roles(guild_id: int, roles: list[dict[str, Any]]) -> None:
-    with _lock:
-        _roles[guild_id] = list(roles)
+    frozen = _freeze_items(roles)
+    with _write_lock:
+        old = _guild(guild_id)
+        _set_snapshot(
+            guild_id, _GuildSnapshot(old.channels, frozen, old.users, next(_versions), old.users_version, old.member_count)
+        )
+
+
+def get_guilds() -> Sequence[Mapping[str, Any]]:
+    """Гильдии бота в порядке добавления (read-only, без копирования)."""
+    return _registry.ordered
+
+
+def get_guild(guild_id: int) -> Mapping[str, Any] | None:
+    return _registry.by_id.get(guild_id)
+
+
+def get_guild_ids() -> frozenset[int]:
+    """Множество ID гильдий бота — для проверок «есть ли бот на сервере» за O(1)."""
+    return _registry.ids
+
+
+def has_guild(guild_id: int) -> bool:
+    return guild_id in _registry.ids
 
 
-def get_guilds() -> list[dict[str, Any]]:
-    with _lock:
-        return list(_guilds)
+def get_guilds_version() -> int:
+    """Версия списка гильдий: меняется при любом его изменении (ETag для /api/guilds)."""
+    return _registry.version
 
 
-def get_guild_channels(guild_id: int) -> list[dict[str, Any]]:
-    with _lock:
-        return list(_channels.get(guild_id, []))
+def get_guild_version(guild_id: int) -> int:
+    """Версия каналов/ролей гильдии (ETag для /channels и /roles); 0 — гильдии нет в кэше."""
+    return _guild(guild_id).version
 
 
-def get_guild_roles(guild_id: int) -> list[dict[str, Any]]:
-    with _lock:
-        return list(_roles.get(guild_id, []))
+def get_guild_channels(guild_id: int) -> Sequence[Mapping[str, Any]]:
+    return _guild(guild_id).channels
+
+
+def get_guild_roles(guild_id: int) -> Sequence[Mapping[str, Any]]:
+    return _guild(guild_id).roles
 
 
 def is_deleted_user(name: str | None) -> bool:
@@ -51,71 +330,196 @@ def is_deleted_user(name: str | None) -> bool:
     return name.strip().lower().startswith("deleted_user")
 
 
-def get_user_info(guild_id: int, user_id: int) -> dict[str, Any] | None:
+def get_user_info(guild_id: int, user_id: int) -> MemberInfo | None:
     """Имя и аватар участника из кэша бота."""
-    with _lock:
-        return _users.get(guild_id, {}).get(user_id)
+    return _guild(guild_id).users.get(user_id)
 
 
 def set_user_info(guild_id: int, user_id: int, name: str, avatar: str | None = None) -> None:
-    """Добавить/обновить имя и аватар участника в кэше (для тех, кого нет в guild.members)."""
-    with _lock:
-        global _users
-        if guild_id not in _users:
-            _users[guild_id] = {}
-        _users[guild_id][user_id] = {"name": name, "avatar": avatar or _users[guild_id].get(user_id, {}).get("avatar")}
+    """
+    Добавить/обновить имя и аватар участника в кэше (для тех, кого нет в guild.members).
+    Копирует шард участника — для единичных добавлений, не для массовой загрузки.
+    """
+    with _write_lock:
+        old = _guild(guild_id)
+        prev = old.users.get(user_id)
+        if avatar:
+            info = MemberInfo(guild_id, user_id, name, AVATAR_URL, avatar)
+        elif prev is not None:
+            info = MemberInfo(guild_id, user_id, name, prev.avatar_kind, prev.avatar_key)
+        else:
+            info = MemberInfo(guild_id, user_id, name)
+        users = old.users.with_changes({user_id: info})
+        count = old.member_count - _counts(prev) + _counts(info)
+        _set_snapshot(guild_id, _GuildSnapshot(old.channels, old.roles, users, old.version, old.users_version, count))
+
+
+def apply_user_deltas(
+    guild_id: int,
+    upserts: Mapping[int, MemberInfo | Mapping[str, Any]],
+    removed: Iterable[int] = (),
+) -> None:
+    """
+    Пачка изменений участников одной гильдии (вход/выход/смена ника или аватара): копируются только
+    шарды затронутых участников, не весь словарь. Версию списка не меняет — сводные списки обновляются
+    точечно (member_view).
+    """
+    upserts = {user_id: _member(guild_id, user_id, info) for user_id, info in upserts.items()}
+    removed = [user_id for user_id in removed if user_id not in upserts]
+    with _write_lock:
+        old = _guild(guild_id)
+        count = old.member_count
+        for user_id in removed:
+            count -= _counts(old.users.get(user_id))
+        for user_id, info in upserts.items():
+            count += _counts(info) - _counts(old.users.get(user_id))
+        users = old.users.with_changes(upserts, removed)
+        _set_snapshot(guild_id, _GuildSnapshot(old.channels, old.roles, users, old.version, old.users_version, count))
 
 
-def get_guild_users(guild_id: int) -> dict[int, dict[str, Any]]:
-    """Все участники гильдии из кэша: user_id -> {name, avatar}."""
-    with _lock:
-        return dict(_users.get(guild_id, {}))
+def get_users_version(guild_id: int) -> int:
+    return _guild(guild_id).users_version
+
+
+def get_member_count(guild_id: int) -> int | None:
+    """Участников гильдии без удалённых аккаунтов — готовое число, O(1); None — участников в кэше нет."""
+    snapshot = _guild(guild_id)
+    return snapshot.member_count if snapshot.users else None
+
+
+def get_guild_users(guild_id: int) -> UserShards:
+    """Все участники гильдии из кэша: user_id -> MemberInfo (read-only, без копирования)."""
+    return _guild(guild_id).users
 
 
 def update_guild(
     guild_data: dict[str, Any],
     channels: list[dict[str, Any]],
     roles: list[dict[str, Any]],
-    users: dict[int, dict[str, Any]] | None = None,
+    users: Mapping[int, MemberInfo | Mapping[str, Any]] | None = None,
 ) -> None:
     """Добавить/обновить одну гильдию (on_guild_join или при синхронизации)."""
-    with _lock:
-        global _guilds, _channels, _roles, _users
-        gid = guild_data.get("id")
-        if gid is None:
-            return
-        existing = [g for g in _guilds if g.get("id") == gid]
-        if existing:
-            idx = _guilds.index(existing[0])
-            _guilds[idx] = guild_data
+    gid = guild_data.get("id")
+    if gid is None:
+        return
+    frozen_guild = MappingProxyType(dict(guild_data))
+    frozen_channels = _freeze_items(channels)
+    frozen_roles = _freeze_items(roles)
+    frozen_users = _freeze_users(gid, users) if users is not None else None
+    # Считаем до блокировки: под ней — только подмена ссылок
+    frozen_count = _count_members(frozen_users.values()) if frozen_users is not None else None
+    with _write_lock:
+        if _registry.by_id.get(gid) != frozen_guild:
+            _set_registry_guild(gid, frozen_guild)
+        old = _guild(gid)
+        if frozen_users is None:
+            guild_users, users_version, count = old.users, old.users_version, old.member_count
         else:
-            _guilds.append(guild_data)
-        _channels[gid] = list(channels)
-        _roles[gid] = list(roles)
-        if users is not None:
-            _users[gid] = dict(users)
+            guild_users, users_version, count = frozen_users, next(_versions), frozen_count
+        _set_snapshot(
+            gid, _GuildSnapshot(frozen_channels, frozen_roles, guild_users, next(_versions), users_version, count)
+        )
 
 
 def remove_guild(guild_id: int) -> None:
-    with _lock:
-        global _guilds, _channels, _roles, _users
-        _guilds = [g for g in _guilds if g.get("id") != guild_id]
-        _channels.pop(guild_id, None)
-        _roles.pop(guild_id, None)
-        _users.pop(guild_id, None)
+    with _write_lock:
+        _set_registry_guild(guild_id, None)
+        _set_snapshot(guild_id, None)
 
 
 def sync_all(
     guilds: list[dict[str, Any]],
     channels: dict[int, list[dict[str, Any]]],
     roles: dict[int, list[dict[str, Any]]],
-    users: dict[int, dict[int, dict[str, Any]]] | None = None,
+    users: Mapping[int, Mapping[int, MemberInfo | Mapping[str, Any]]] | None = None,
 ) -> None:
     """Полная перезапись кэша (вызов из бота on_ready)."""
-    with _lock:
-        global _guilds, _channels, _roles, _users
-        _guilds = list(guilds)
-        _channels = {k: list(v) for k, v in channels.items()}
-        _roles = {k: list(v) for k, v in roles.items()}
-        if users is not None:
-            _users = {k: dict(v) for k, v in users.items()}
+    global _registry, _snapshots
+    # Замораживаем до блокировки: писатель держит её только на время подмены ссылок
+    frozen_guilds = {g["id"]: g for g in _freeze_items(guilds)}
+    frozen_channels = {gid: _freeze_items(items) for gid, items in channels.items()}
+    frozen_roles = {gid: _freeze_items(items) for gid, items in roles.items()}
+    frozen_users = {gid: _freeze_users(gid, items) for gid, items in users.items()} if users is not None else None
+    counts = {gid: _count_members(items.values()) for gid, items in (frozen_users or {}).items()}
+    with _write_lock:
+        snapshots = {}
+        for gid in set(frozen_channels) | set(frozen_roles) | set(frozen_users or ()):
+            old = _guild(gid)
+            if frozen_users is None:
+                guild_users, users_version, count = old.users, old.users_version, old.member_count
+            else:
+                guild_users, users_version, count = frozen_users.get(gid, _NO_USERS), next(_versions), counts.get(gid, 0)
+            snapshots[gid] = _GuildSnapshot(
+                frozen_channels.get(gid, ()),
+                frozen_roles.get(gid, ()),
+                guild_users,
+                next(_versions),
+                users_version,
+                count,
+            )
+        _registry = _Registry(frozen_guilds, next(_versions))
+        _snapshots = MappingProxyType(snapshots)
+
+
+def current_state() -> tuple[Mapping[int, Mapping[str, Any]], int, Mapping[int, _GuildSnapshot]]:
+    """Гильдии по ID, версия их списка и снимки гильдий — для публикации в общий кэш (app.core.cache_sync)."""
+    registry = _registry
+    return registry.by_id, registry.version, _snapshots
+
+
+def install_registry(guilds: Iterable[Mapping[str, Any]], version: int) -> None:
+    """Подменить список гильдий готовым (процесс API читает его из общего кэша) с заданной версией."""
+    global _registry
+    frozen = {g["id"]: g for g in _freeze_items(guilds)}
+    with _write_lock:
+        _registry = _Registry(frozen, version)
+
+
+def install_guild(
+    guild_id: int,
+    channels: Sequence[Mapping[str, Any]],
+    roles: Sequence[Mapping[str, Any]],
+    version: int,
+) -> None:
+    """Подменить каналы и роли гильдии готовыми (из общего кэша) с заданной версией."""
+    frozen_channels = _freeze_items(channels)
+    frozen_roles = _freeze_items(roles)
+    with _write_lock:
+        old = _guild(guild_id)
+        _set_snapshot(
+            guild_id,
+            _GuildSnapshot(frozen_channels, frozen_roles, old.users, version, old.users_version, old.member_count),
+        )
+
+
+def install_user_shards(
+    guild_id: int,
+    shards: Mapping[int, Mapping[int, MemberInfo]],
+    users_version: int,
+) -> None:
+    """
+    Подменить шарды участников гильдии готовыми (из общего кэша): index -> {user_id: MemberInfo};
+    остальные шарды остаются прежними. users_version — версия состава (см. app.core.member_view).
+    """
+    frozen = {index: MappingProxyType(dict(users)) for index, users in shards.items()}
+    counts = {index: _count_members(users.values()) for index, users in frozen.items()}
+    with _write_lock:
+        old = _guild(guild_id)
+        count = old.member_count
+        for index, users in frozen.items():
+            count += counts[index] - _count_members(old.users.shards[index].values())
+        _set_snapshot(
+            guild_id,
+            _GuildSnapshot(
+                old.channels, old.roles, old.users.with_shards(frozen), old.version, users_version, count
+            ),
+        )
+
+
+def retain_guilds(guild_ids: Iterable[int]) -> None:
+    """Убрать снимки гильдий, которых нет в guild_ids."""
+    global _snapshots
+    keep = set(guild_ids)
+    with _write_lock:
+        if any(gid not in keep for gid in _snapshots):
+            _snapshots = MappingProxyType({gid: snap for gid, snap in _snapshots.items() if gid in keep})
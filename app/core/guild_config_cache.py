@@ -0,0 +1,109 @@
+"""
+Кэш настроек гильдий (GuildConfig) в памяти процесса: бот читает их на каждом входе участника,
+повышении уровня, /level и выборе ролей — без запроса к БД и разбора CSV selectable_roles.
+Значение — read-only словарь в формате Database.get_guild_config (selectable_roles — tuple).
+
+Запись сквозная: update_guild_config в БД (бот /setup, API PUT) сбрасывает запись здесь.
+Если API работает в отдельных процессах (CACHE_BACKEND), сброс публикуется в общий кэш ключом
+"config:{guild_id}": процесс, прочитавший настройки раньше, сверяет этот ключ не чаще раза
+в GUILD_CONFIG_CHECK_INTERVAL секунд на гильдию и перечитывает настройки, если они менялись.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Mapping
+
+from app.core.cache_backend import CacheBackend, make_backend
+from app.core.config import Config
+
+GuildConfigView = Mapping[str, Any]
+
+
+class _Entry:
+    __slots__ = ("config", "remote_rev", "checked_at")
+
+    def __init__(self, config: GuildConfigView | None, remote_rev: bytes | None, checked_at: float):
+        self.config = config
+        self.remote_rev = remote_rev
+        self.checked_at = checked_at
+
+
+_lock = threading.Lock()
+_entries: dict[int, _Entry] = {}
+# Счётчик сбросов по гильдии: загрузка, начатая до сброса, не кладёт в кэш устаревшие настройки
+_generations: dict[int, int] = {}
+_backend: CacheBackend | None = None
+_backend_ready = False
+stats = {"hits": 0, "misses": 0, "invalidations": 0, "remote_invalidations": 0}
+
+
+def _remote() -> CacheBackend | None:
+    global _backend, _backend_ready
+    if not _backend_ready:
+        _backend = make_backend()
+        _backend_ready = True
+    return _backend
+
+
+def _key(guild_id: int) -> str:
+    return f"config:{guild_id}"
+
+
+def _freeze(config: Mapping[str, Any] | None) -> GuildConfigView | None:
+    if config is None:
+        return None
+    return MappingProxyType({**config, "selectable_roles": tuple(config["selectable_roles"])})
+
+
+async def get(guild_id: int, load: Callable[[int], Awaitable[Mapping[str, Any] | None]]) -> GuildConfigView | None:
+    """Настройки гильдии из кэша; нет или устарели — load(guild_id) (чтение из БД) и в кэш."""
+    backend = _remote()
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(guild_id)
+        generation = _generations.get(guild_id, 0)
+    if entry is not None:
+        if backend is None or now - entry.checked_at < Config.GUILD_CONFIG_CHECK_INTERVAL:
+            stats["hits"] += 1
+            return entry.config
+        remote_rev = await asyncio.to_thread(backend.get, _key(guild_id))
+        if remote_rev == entry.remote_rev:
+            entry.checked_at = now
+            stats["hits"] += 1
+            return entry.config
+        stats["remote_invalidations"] += 1
+    else:
+        remote_rev = await asyncio.to_thread(backend.get, _key(guild_id)) if backend is not None else None
+    stats["misses"] += 1
+    config = _freeze(await load(guild_id))
+    with _lock:
+        if _generations.get(guild_id, 0) == generation:
+            _entries[guild_id] = _Entry(config, remote_rev, now)
+    return config
+
+
+def invalidate(guild_id: int) -> None:
+    """Настройки гильдии изменены: сбросить здесь и (с общим кэшем) в остальных процессах."""
+    with _lock:
+        _entries.pop(guild_id, None)
+        _generations[guild_id] = _generations.get(guild_id, 0) + 1
+    stats["invalidations"] += 1
+    backend = _remote()
+    if backend is not None:
+        try:
+            backend.set(_key(guild_id), f"{os.getpid()}:{time.time_ns()}".encode())
+        except Exception as e:
+            print(f"Общий кэш: не удалось опубликовать сброс настроек гильдии {guild_id}: {e}")
+
+
+def snapshot() -> dict[str, Any]:
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "guilds": len(_entries),
+        "hit_ratio": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+    }
@@ -1,3 +1,11 @@
+from math import isqrt
+
+MAX_LEVEL = 999
+# Порог 5-го уровня по сообщениям; с него уровень считается по суммарному XP
+_XP_PHASE_LEVEL = 5
+_XP_PER_LEVEL = 600
+
+
 def get_message_threshold(level: int) -> int:
     if level <= 1:
         return 0
@@ -11,12 +19,27 @@ def get_xp_threshold(level: int) -> int:
     return get_message_threshold(5) + (level - 5) * 600
 
 
+# Пороги по сообщениям для уровней 0–5 (дальше пороги линейные и считаются формулой)
+_MESSAGE_THRESHOLDS = tuple(get_message_threshold(lvl) for lvl in range(_XP_PHASE_LEVEL + 1))
+_XP_PHASE_START = _MESSAGE_THRESHOLDS[_XP_PHASE_LEVEL]  # 50
+
+
 def level_from_total_xp(total_xp: int) -> int:
     """Уровень 5+ по суммарному XP. Один источник истины для высоких уровней."""
-    for lvl in range(5, 1000):
-        if total_xp < get_xp_threshold(lvl):
-            return lvl - 1
-    return 999
+    # Пороги с 5-го уровня линейные (шаг 600) — обычное деление вместо перебора
+    if total_xp < _XP_PHASE_START:
+        return _XP_PHASE_LEVEL - 1
+    return min(MAX_LEVEL, _XP_PHASE_LEVEL + (total_xp - _XP_PHASE_START) // _XP_PER_LEVEL)
+
+
+def _level_from_messages(message_count: int) -> int:
+    """Уровень 1–4 по сообщениям: обратная функция к треугольным порогам 5·k(k+1)/2 (k = уровень − 1)."""
+    if message_count < 0:
+        return 0
+    # 5·k(k+1)/2 <= m  <=>  k(k+1) <= ⌊2m/5⌋  =>  k = ⌊(√(4q+1) − 1) / 2⌋
+    q = 2 * message_count // 5
+    k = (isqrt(4 * q + 1) - 1) // 2
+    return min(k + 1, _XP_PHASE_LEVEL - 1)
 
 
 def calculate_level(message_count: int, xp: int, days_on_server: int) -> int:
@@ -25,12 +48,9 @@ def calculate_level(message_count: int, xp: int, days_on_server: int) -> int:
     Уровни 1–4: по сообщениям, если XP ещё мало. Как только XP хватает на 5+ уровень — считаем только по XP.
     """
     # Если XP уже хватает на 5+ уровень — всегда считаем по XP (чтобы не сбросить на 3 уровень при малом message_count)
-    if xp >= get_xp_threshold(5):
+    if xp >= _XP_PHASE_START:
         return level_from_total_xp(xp)
-    if message_count < get_message_threshold(5):  # 50 сообщений для 5 уровня
-        for lvl in range(1, 6):
-            if message_count < get_message_threshold(lvl):
-                return lvl - 1
-        return 4
+    if message_count < _MESSAGE_THRESHOLDS[_XP_PHASE_LEVEL]:  # 50 сообщений для 5 уровня
+        return _level_from_messages(message_count)
     return level_from_total_xp(xp)
 
@@ -0,0 +1,288 @@
+"""
+Сводный список участников гильдии для веб-панели (GET /api/guilds/{id}/users): участники из кэша бота
++ уровни из БД (нет в БД — нули). Отсортированные индексы по колонкам строятся лениво при первом запросе
+и дальше поддерживаются точечно: бот сообщает о записанных в БД XP/уровнях и входе/выходе участников,
+API — о правках из панели.
+Страница — срез по offset или по курсору (keyset), без сортировки и сериализации всей гильдии.
+
+Перестраивается целиком, когда бот пересобрал список участников гильдии (версия в guild_cache),
+после массовых изменений в БД (update_days) и не реже раза в MEMBER_VIEW_TTL секунд.
+
+API в отдельных процессах получает те же точечные изменения через общий кэш: бот включает журнал
+(enable_journal), публикатор app.core.cache_sync забирает его (take_journal), процессы API применяют
+его к своим спискам (apply_changes).
+"""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable
+
+COLUMNS = ("level", "xp", "message_count", "days_on_server")
+
+# Виды записей журнала: новые значения участника / участник зашёл / участник вышел
+UPDATE, ADD, REMOVE = 0, 1, 2
+
+
+class MemberRow:
+    __slots__ = ("user_id", "message_count", "level", "xp", "days_on_server")
+
+    def __init__(self, user_id: int, message_count: int = 0, level: int = 0, xp: int = 0, days_on_server: int = 0):
+        self.user_id = user_id
+        self.message_count = message_count
+        self.level = level
+        self.xp = xp
+        self.days_on_server = days_on_server
+
+
+class GuildMemberView:
+    def __init__(self, user_ids: Iterable[int], db_rows: Iterable, users_version: int = 0):
+        self.rows: dict[int, MemberRow] = {uid: MemberRow(uid) for uid in user_ids}
+        for u in db_rows:
+            row = self.rows.get(u.user_id)
+            if row is not None:
+                row.message_count, row.level, row.xp, row.days_on_server = (
+                    u.message_count, u.level, u.xp, u.days_on_server
+                )
+        self.users_version = users_version
+        self.built_at = time.monotonic()
+        # колонка -> отсортированный список (значение, user_id); строится при первом запросе по колонке
+        self._indexes: dict[str, list[tuple[int, int]]] = {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _index(self, column: str) -> list[tuple[int, int]]:
+        index = self._indexes.get(column)
+        if index is None:
+            index = sorted((getattr(row, column), uid) for uid, row in self.rows.items())
+            self._indexes[column] = index
+        return index
+
+    def add(self, user_id: int, message_count: int, level: int, xp: int, days_on_server: int) -> None:
+        """Новый участник гильдии (или обновление, если уже есть)."""
+        if user_id in self.rows:
+            self.update(user_id, message_count, level, xp, days_on_server)
+            return
+        row = MemberRow(user_id, message_count, level, xp, days_on_server)
+        self.rows[user_id] = row
+        for column, index in self._indexes.items():
+            insort(index, (getattr(row, column), user_id))
+
+    def remove(self, user_id: int) -> None:
+        row = self.rows.pop(user_id, None)
+        if row is None:
+            return
+        for column, index in self._indexes.items():
+            key = (getattr(row, column), user_id)
+            i = bisect_left(index, key)
+            if i < len(index) and index[i] == key:
+                del index[i]
+
+    def update(self, user_id: int, message_count: int, level: int, xp: int, days_on_server: int) -> None:
+        """Новые значения участника; тех, кого нет в списке (не в кэше бота), не добавляем."""
+        row = self.rows.get(user_id)
+        if row is None:
+            return
+        new = {"message_count": message_count, "level": level, "xp": xp, "days_on_server": days_on_server}
+        for column, index in self._indexes.items():
+            old_value, new_value = getattr(row, column), new[column]
+            if old_value == new_value:
+                continue
+            i = bisect_left(index, (old_value, user_id))
+            if i < len(index) and index[i] == (old_value, user_id):
+                del index[i]
+            insort(index, (new_value, user_id))
+        row.message_count, row.level, row.xp, row.days_on_server = message_count, level, xp, days_on_server
+
+    def page(
+        self,
+        order_by: str,
+        desc: bool,
+        offset: int,
+        limit: int,
+        cursor: str | None = None,
+    ) -> tuple[list[MemberRow], str | None]:
+        """
+        Страница строк и курсор следующей страницы ("значение:user_id" последней строки; None — дальше пусто).
+        С курсором offset отсчитывается от позиции курсора.
+        """
+        index = self._index(order_by if order_by in COLUMNS else "level")
+        if cursor:
+            value, _, uid = cursor.partition(":")
+            key = (int(value), int(uid))
+            # desc идёт с конца списка: позиция = сколько элементов осталось перед курсором
+            start = len(index) - bisect_left(index, key) if desc else bisect_right(index, key)
+        else:
+            start = 0
+        start += offset
+        if desc:
+            hi = len(index) - start
+            keys = index[max(0, hi - limit):max(0, hi)][::-1]
+        else:
+            keys = index[start:start + limit]
+        next_cursor = None
+        if keys and start + len(keys) < len(index):
+            next_cursor = f"{keys[-1][0]}:{keys[-1][1]}"
+        return [self.rows[uid] for _, uid in keys], next_cursor
+
+
+_lock = threading.Lock()
+_views: dict[int, GuildMemberView] = {}
+# Гильдии, которые сейчас собираются: обновления за время чтения из БД применятся после сборки
+# (у каждой сборки свои: параллельные сборки одной гильдии не делят и не теряют изменения);
+# user_id -> (вид, значения...) последнего изменения, как в журнале
+_pending: dict[int, list[dict[int, tuple[int, ...]]]] = {}
+# Журнал для процессов API (None — выключен): guild_id -> user_id -> (вид, значения...) последнего изменения
+_journal: dict[int, dict[int, tuple[int, ...]]] | None = None
+# Гильдии, сброшенные invalidate после прошлого take_journal (None — все)
+_journal_resets: set[int | None] = set()
+
+
+def get_view(guild_id: int, users_version: int, ttl_seconds: float) -> GuildMemberView | None:
+    """Готовый список гильдии или None (нет, устарел по версии кэша или по TTL — надо собрать)."""
+    with _lock:
+        view = _views.get(guild_id)
+        if view is None or view.users_version != users_version:
+            return None
+        if ttl_seconds > 0 and time.monotonic() - view.built_at > ttl_seconds:
+            return None
+        return view
+
+
+def begin_build(guild_id: int) -> dict[int, tuple[int, ...]]:
+    """Вызвать перед чтением уровней из БД; возвращает метку сборки для finish_build."""
+    build: dict[int, tuple[int, ...]] = {}
+    with _lock:
+        _pending.setdefault(guild_id, []).append(build)
+    return build
+
+
+def finish_build(guild_id: int, view: GuildMemberView, build: dict[int, tuple[int, ...]]) -> None:
+    """Применить изменения, пришедшие за время сборки build, и поставить view."""
+    with _lock:
+        _end_build(guild_id, build)
+        for user_id, (kind, *values) in build.items():
+            _apply(view, user_id, kind, values)
+        _views[guild_id] = view
+
+
+def abort_build(guild_id: int, build: dict[int, tuple[int, ...]]) -> None:
+    """Сборка не удалась (ошибка БД): перестать копить для неё изменения."""
+    with _lock:
+        _end_build(guild_id, build)
+
+
+def _end_build(guild_id: int, build: dict[int, tuple[int, ...]]) -> None:
+    # по идентичности: пустые словари разных сборок равны
+    builds = [other for other in _pending.get(guild_id, ()) if other is not build]
+    if builds:
+        _pending[guild_id] = builds
+    else:
+        _pending.pop(guild_id, None)
+
+
+def _apply(view: GuildMemberView, user_id: int, kind: int, values) -> None:
+    if kind == REMOVE:
+        view.remove(user_id)
+    elif kind == ADD:
+        view.add(user_id, *values)
+    else:
+        view.update(user_id, *values)
+
+
+def _merge(changes: dict[int, tuple[int, ...]], user_id: int, kind: int, values: tuple[int, ...]) -> None:
+    """Вход с последующей правкой остаётся входом."""
+    prev = changes.get(user_id)
+    if kind == UPDATE and prev is not None and prev[0] == ADD:
+        kind = ADD
+    changes[user_id] = (kind, *values)
+
+
+def _change(guild_id: int, user_id: int, kind: int, values: tuple[int, ...] = ()) -> None:
+    """Изменение участника (под _lock): в журнал, в идущие сборки гильдии и в готовый список."""
+    if _journal is not None:
+        _merge(_journal.setdefault(guild_id, {}), user_id, kind, values)
+    for build in _pending.get(guild_id, ()):
+        _merge(build, user_id, kind, values)
+    view = _views.get(guild_id)
+    if view is not None:
+        _apply(view, user_id, kind, values)
+
+
+def apply_rows(rows: Iterable) -> None:
+    """Записанные в БД значения участников (объекты с guild_id, user_id, message_count, level, xp, days_on_server)."""
+    with _lock:
+        if _journal is None and not _views and not _pending:
+            return
+        for u in rows:
+            _change(u.guild_id, u.user_id, UPDATE, (u.message_count, u.level, u.xp, u.days_on_server))
+
+
+def add_member(guild_id: int, row) -> None:
+    """Участник зашёл на сервер: row — его строка уровня (объект с полями UserLevel)."""
+    with _lock:
+        _change(guild_id, row.user_id, ADD, (row.message_count, row.level, row.xp, row.days_on_server))
+
+
+def remove_member(guild_id: int, user_id: int) -> None:
+    with _lock:
+        _change(guild_id, user_id, REMOVE)
+
+
+def invalidate(guild_id: int | None = None) -> None:
+    """Сбросить список гильдии (или все) — соберётся заново при следующем запросе."""
+    with _lock:
+        if guild_id is None:
+            _views.clear()
+        else:
+            _views.pop(guild_id, None)
+        if _journal is not None:
+            # всё записанное до сброса уже в БД — процессы API пересоберут список из неё
+            if guild_id is None:
+                _journal.clear()
+            else:
+                _journal.pop(guild_id, None)
+            _journal_resets.add(guild_id)
+
+
+def enable_journal() -> None:
+    """Записывать изменения для процессов API (в процессе бота, если задан общий кэш)."""
+    global _journal
+    with _lock:
+        if _journal is None:
+            _journal = {}
+
+
+def take_journal() -> tuple[dict[int, list[list[int]]], set[int | None]]:
+    """
+    Забрать журнал: ({guild_id: [[user_id, вид, значения...], ...]}, сброшенные гильдии (None — все)).
+    Изменения в журнале — после сброса своей гильдии.
+    """
+    global _journal_resets
+    with _lock:
+        if _journal is None:
+            return {}, set()
+        changes = {gid: [[uid, *entry] for uid, entry in users.items()] for gid, users in _journal.items()}
+        _journal.clear()
+        resets, _journal_resets = _journal_resets, set()
+        return changes, resets
+
+
+def apply_changes(guild_id: int, entries: Iterable[list[int]]) -> None:
+    """Журнал другого процесса (бота): [user_id, вид, значения...] в порядке take_journal."""
+    with _lock:
+        if guild_id not in _views and guild_id not in _pending:
+            return
+        for user_id, kind, *values in entries:
+            _change(guild_id, user_id, kind, tuple(values))
+
+
+def read_page(
+    view: GuildMemberView, order_by: str, desc: bool, offset: int, limit: int, cursor: str | None
+) -> tuple[list[MemberRow], str | None]:
+    """view.page под общей блокировкой; строки копируются (бот обновляет список из своего потока)."""
+    with _lock:
+        rows, next_cursor = view.page(order_by, desc, offset, limit, cursor)
+        return [MemberRow(r.user_id, r.message_count, r.level, r.xp, r.days_on_server) for r in rows], next_cursor
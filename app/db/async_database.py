@@ -0,0 +1,300 @@
+"""
+Асинхронный слой БД (AsyncEngine/AsyncSession) для бота и API: запросы не блокируют
+event loop. SQLite — через aiosqlite, PostgreSQL — через psycopg (async).
+
+Соединения пула привязаны к event loop, в котором созданы: у бота и у API (uvicorn в своём потоке)
+должны быть разные экземпляры AsyncDatabase — их выдаёт app.db.provider (один на loop).
+Схему не создаёт: таблицы должны быть заранее (app.db.database.migrate).
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core import guild_config_cache
+from app.db.database import (
+    BACKFILL_CHUNK,
+    PoolMetrics,
+    _add_user_level_delta,
+    _apply_guild_config,
+    _apply_user_level,
+    _backfill_rows,
+    _config_to_dict,
+    _create_schema,
+    _days_increment_stmts,
+    _dirty_keys_stmts,
+    _engine_options,
+    _level_sync_queue_insert,
+    _lock_guild_levels_stmt,
+    _new_user_level,
+    _raise_levels_stmt,
+    _rank_stmt,
+    _resolve_url,
+    _top_stmt,
+    _upsert_insert,
+    _user_level_deltas_upsert,
+    _user_levels_backfill_insert,
+)
+from app.db.models import AdminUser, DiscordUserPrefs, GuildConfig, LevelSyncQueue, UserLevel
+
+
+def _async_url(url: str) -> str:
+    # sync-драйвер sqlite3 → aiosqlite; postgresql+psycopg сам выбирает async-вариант psycopg v3
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+def _make_async_engine(db_url: str):
+    return create_async_engine(db_url, **_engine_options(db_url))
+
+
+class AsyncDatabase:
+    def __init__(self, db_url: Optional[str] = None):
+        url = _async_url(_resolve_url(db_url))
+        self.engine = _make_async_engine(url)
+        self.Session = async_sessionmaker(bind=self.engine, autoflush=False, expire_on_commit=False)
+        self.pool_metrics = PoolMetrics(self.engine.sync_engine.pool)
+
+    async def create_all(self) -> None:
+        """Создать таблицы этим движком (временные БД в скриптах; для основной — migrate())."""
+        async with self.engine.begin() as conn:
+            await conn.run_sync(_create_schema)
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
+
+    async def get_admin_by_username(self, username: str) -> AdminUser | None:
+        async with self.Session() as session:
+            return await session.scalar(select(AdminUser).filter_by(username=username).limit(1))
+
+    async def get_guild_config_row(self, guild_id: int) -> GuildConfig | None:
+        async with self.Session() as session:
+            return await session.scalar(select(GuildConfig).filter_by(guild_id=guild_id).limit(1))
+
+    async def get_guild_config(self, guild_id: int):
+        """Настройки гильдии (read-only) через кэш app.core.guild_config_cache."""
+        return await guild_config_cache.get(guild_id, self._load_guild_config)
+
+    async def _load_guild_config(self, guild_id: int):
+        return _config_to_dict(await self.get_guild_config_row(guild_id))
+
+    async def update_guild_config(
+        self,
+        guild_id: int,
+        channel_id: Optional[int] = None,
+        role_id: Optional[int] = None,
+        level_channel_id: Optional[int] = None,
+        role_select_channel_id: Optional[int] = None,
+        selectable_roles: Optional[list[int]] = None,
+    ):
+        async with self.Session() as session:
+            config = await session.scalar(select(GuildConfig).filter_by(guild_id=guild_id).limit(1))
+            if not config:
+                config = GuildConfig(guild_id=guild_id)
+                session.add(config)
+            _apply_guild_config(config, channel_id, role_id, level_channel_id, role_select_channel_id, selectable_roles)
+            await session.commit()
+        await asyncio.to_thread(guild_config_cache.invalidate, guild_id)
+
+    async def find_user_level(self, guild_id: int, user_id: int) -> UserLevel | None:
+        """Строка уровня участника без создания (None, если её нет)."""
+        async with self.Session() as session:
+            return await session.scalar(select(UserLevel).filter_by(guild_id=guild_id, user_id=user_id).limit(1))
+
+    async def get_user_level(self, guild_id: int, user_id: int) -> UserLevel:
+        async with self.Session() as session:
+            user_level = await session.scalar(
+                select(UserLevel).filter_by(guild_id=guild_id, user_id=user_id).limit(1)
+            )
+            if not user_level:
+                user_level = _new_user_level(guild_id, user_id)
+                session.add(user_level)
+                await session.commit()
+            return user_level
+
+    async def update_user_level(
+        self,
+        guild_id: int,
+        user_id: int,
+        message_count: Optional[int] = None,
+        level: Optional[int] = None,
+        xp: Optional[int] = None,
+        days_on_server: Optional[int] = None,
+    ) -> None:
+        async with self.Session() as session:
+            user_level = await session.scalar(
+                select(UserLevel).filter_by(guild_id=guild_id, user_id=user_id).limit(1)
+            )
+            if not user_level:
+                user_level = _new_user_level(guild_id, user_id)
+                session.add(user_level)
+            _apply_user_level(user_level, message_count, level, xp, days_on_server)
+            await session.commit()
+
+    async def apply_user_level_deltas(self, rows: list[dict]) -> None:
+        """Пачка приращений из буфера XP (см. Database.apply_user_level_deltas)."""
+        if not rows:
+            return
+        insert = _upsert_insert(self.engine.dialect.name)
+        async with self.Session() as session:
+            if insert is None:
+                for row in rows:
+                    user_level = await session.scalar(
+                        select(UserLevel).filter_by(guild_id=row["guild_id"], user_id=row["user_id"]).limit(1)
+                    )
+                    if not user_level:
+                        session.add(UserLevel(**row))
+                    else:
+                        _add_user_level_delta(user_level, row)
+            else:
+                await session.execute(_user_level_deltas_upsert(insert), rows)
+            await self._mark_levels_dirty(session, [(row["guild_id"], row["user_id"]) for row in rows])
+            await session.commit()
+
+    async def _mark_levels_dirty(self, session: AsyncSession, keys: list[tuple[int, int]]) -> None:
+        if not keys:
+            return
+        insert = _upsert_insert(self.engine.dialect.name)
+        if insert is not None:
+            await session.execute(
+                _level_sync_queue_insert(insert),
+                [{"guild_id": gid, "user_id": uid} for gid, uid in keys],
+            )
+            return
+        for gid, uid in set(keys):
+            if await session.get(LevelSyncQueue, (gid, uid)) is None:
+                session.add(LevelSyncQueue(guild_id=gid, user_id=uid))
+
+    async def mark_levels_dirty(self, keys: list[tuple[int, int]]) -> None:
+        """Поставить участников в очередь сверки уровня (см. Database.mark_levels_dirty)."""
+        async with self.Session() as session:
+            await self._mark_levels_dirty(session, keys)
+            await session.commit()
+
+    async def take_dirty_user_levels(self, limit: int = 1000) -> list[UserLevel]:
+        """Забрать из очереди сверки до limit участников (см. Database.take_dirty_user_levels)."""
+        claim_stmt, rows_stmt = _dirty_keys_stmts(limit)
+        async with self.Session() as session:
+            batch = [tuple(k) for k in await session.execute(claim_stmt)]
+            if not batch:
+                await session.commit()
+                return []
+            rows = list(await session.scalars(rows_stmt(batch)))
+            await session.commit()
+            return rows
+
+    async def raise_user_levels(self, rows: list[tuple[int, int, int]]) -> None:
+        """Поднять уровни пачкой: [(guild_id, user_id, level)], ниже текущего не опускает."""
+        if not rows:
+            return
+        async with self.Session() as session:
+            await session.execute(
+                _raise_levels_stmt(),
+                [{"b_guild_id": gid, "b_user_id": uid, "b_level": lvl} for gid, uid, lvl in rows],
+            )
+            await session.commit()
+
+    async def increment_days_on_server(self, guild_id: int) -> tuple[int, list[tuple[int, int]]]:
+        """+1 день всем участникам гильдии (см. Database.increment_days_on_server)."""
+        promoted_stmt, bump_stmt = _days_increment_stmts(guild_id)
+        async with self.Session() as session:
+            await session.execute(_lock_guild_levels_stmt(self.engine.dialect.name, guild_id))
+            promoted = [(row[0], row[1]) for row in await session.execute(promoted_stmt)]
+            updated = (await session.execute(bump_stmt)).rowcount
+            await session.commit()
+            return updated, promoted
+
+    async def get_users_in_guild(self, guild_id: int) -> list[UserLevel]:
+        async with self.Session() as session:
+            return list(await session.scalars(select(UserLevel).filter_by(guild_id=guild_id)))
+
+    async def top_n(self, guild_id: int, n: int) -> list[UserLevel]:
+        """Первые n участников гильдии по (уровень, XP) — см. Database.top_n."""
+        async with self.Session() as session:
+            return list(await session.scalars(_top_stmt(guild_id, n)))
+
+    async def rank_of(
+        self, guild_id: int, user_id: int, level: Optional[int] = None, xp: Optional[int] = None
+    ) -> Optional[int]:
+        """Место участника по (уровень, XP) — см. Database.rank_of."""
+        async with self.Session() as session:
+            if level is None or xp is None:
+                row = await session.scalar(select(UserLevel).filter_by(guild_id=guild_id, user_id=user_id).limit(1))
+                if row is None:
+                    return None
+                level, xp = row.level, row.xp
+            return await session.scalar(_rank_stmt(guild_id, user_id, level, xp)) + 1
+
+    async def get_users_in_guild_count(self, guild_id: int) -> int:
+        async with self.Session() as session:
+            return await session.scalar(
+                select(func.count()).select_from(UserLevel).filter_by(guild_id=guild_id)
+            )
+
+    async def get_users_in_guild_paginated(
+        self,
+        guild_id: int,
+        offset: int = 0,
+        limit: int = 20,
+        order_by: str = "level",
+        order: str = "desc",
+    ) -> list[UserLevel]:
+        async with self.Session() as session:
+            col = getattr(UserLevel, order_by, UserLevel.level)
+            q = (
+                select(UserLevel)
+                .filter_by(guild_id=guild_id)
+                .order_by(col.desc() if order == "desc" else col.asc())
+                .offset(offset)
+                .limit(limit)
+            )
+            return list(await session.scalars(q))
+
+    async def add_all_users_to_guild(self, guild_id: int, members: Iterable) -> int:
+        """Добавить участников без записи пачками (см. Database.add_all_users_to_guild); число добавленных."""
+        async with self.Session() as session:
+            existing = set(await session.scalars(select(UserLevel.user_id).filter_by(guild_id=guild_id)))
+            rows = _backfill_rows(guild_id, members, existing)
+            insert = _upsert_insert(self.engine.dialect.name)
+            stmt = _user_levels_backfill_insert(insert) if insert is not None else UserLevel.__table__.insert()
+            for i in range(0, len(rows), BACKFILL_CHUNK):
+                await session.execute(stmt, rows[i:i + BACKFILL_CHUNK])
+            await session.commit()
+            return len(rows)
+
+    async def ensure_user_levels(self, guild_id: int, members: Iterable) -> list[UserLevel]:
+        """Строки уровней участников, недостающие создаются (см. Database.ensure_user_levels)."""
+        members = list(members)
+        async with self.Session() as session:
+            found = list(
+                await session.scalars(
+                    select(UserLevel).where(
+                        UserLevel.guild_id == guild_id, UserLevel.user_id.in_([m.id for m in members])
+                    )
+                )
+            )
+            rows = _backfill_rows(guild_id, members, {u.user_id for u in found})
+            if rows:
+                insert = _upsert_insert(self.engine.dialect.name)
+                stmt = _user_levels_backfill_insert(insert) if insert is not None else UserLevel.__table__.insert()
+                await session.execute(stmt, rows)
+                await session.commit()
+            return found + [_new_user_level(guild_id, row["user_id"]) for row in rows]
+
+    async def get_discord_default_guild(self, discord_id: int) -> Optional[int]:
+        async with self.Session() as session:
+            row = await session.scalar(select(DiscordUserPrefs).filter_by(discord_id=discord_id).limit(1))
+            return row.default_guild_id if row else None
+
+    async def set_discord_default_guild(self, discord_id: int, guild_id: Optional[int]) -> None:
+        async with self.Session() as session:
+            row = await session.scalar(select(DiscordUserPrefs).filter_by(discord_id=discord_id).limit(1))
+            if row:
+                row.default_guild_id = guild_id
+            else:
+                session.add(DiscordUserPrefs(discord_id=discord_id, default_guild_id=guild_id))
+            await session.commit()
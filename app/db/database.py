@@ -1,104 +1,370 @@
 from __future__ import annotations
 
-from typing import Iterable, Optional
+import time
+from collections import deque
+from typing import Any, Iterable, Optional
 
-from sqlalchemy import create_engine
+from sqlalchemy import and_, bindparam, case, create_engine, delete, func, or_, select, text, tuple_, update
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import Config
+from app.core.levels import MAX_LEVEL, get_message_threshold, get_xp_threshold
 from app.db.base import Base
-from app.db.models import AdminUser, DiscordUserPrefs, GuildConfig, UserLevel
+from app.db.models import GuildConfig, LevelSyncQueue, UserLevel
+
+
+def _engine_options(db_url: str) -> dict[str, Any]:
+    """Параметры пула из Config (DB_POOL_*); SQLite в памяти — один общий коннект, без пула."""
+    options: dict[str, Any] = {"pool_pre_ping": True}
+    if ":memory:" in db_url or db_url.split("://", 1)[-1] in ("", "/"):
+        return options
+    options.update(
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+    )
+    return options
 
 
 def _make_engine(db_url: str):
     # SQLite требует отдельного connect_args
     if db_url.startswith("sqlite"):
-        return create_engine(
-            db_url,
-            connect_args={"check_same_thread": False},
-            pool_pre_ping=True,
+        return create_engine(db_url, connect_args={"check_same_thread": False}, **_engine_options(db_url))
+    return create_engine(db_url, **_engine_options(db_url))
+
+
+class PoolMetrics:
+    """
+    Пул соединений движка: сколько ждали выдачи соединения (checkout) по последним samples запросам,
+    таймауты пула и текущая занятость. Оборачивает pool.connect — через него Engine берёт соединения.
+    """
+
+    def __init__(self, pool, samples: int = 500):
+        self.pool = pool
+        self.checkouts = 0
+        self.timeouts = 0
+        self._wait_ms: deque[float] = deque(maxlen=samples)
+        connect = pool.connect
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                return connect()
+            except sa_exc.TimeoutError:
+                self.timeouts += 1
+                raise
+            finally:
+                self.checkouts += 1
+                self._wait_ms.append((time.perf_counter() - started) * 1000)
+
+        pool.connect = timed_connect
+
+    def snapshot(self) -> dict[str, Any]:
+        waits = sorted(self._wait_ms)
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(round(p / 100 * (len(waits) - 1))))] if waits else 0.0
+
+        # size/checkedout/overflow есть у QueuePool; у пулов SQLite в памяти их нет
+        usage = {
+            name: getattr(self.pool, name)()
+            for name in ("size", "checkedout", "checkedin", "overflow")
+            if hasattr(self.pool, name)
+        }
+        return {
+            **usage,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms_p50": percentile(50),
+            "wait_ms_p95": percentile(95),
+            "wait_ms_max": waits[-1] if waits else 0.0,
+        }
+
+
+def _resolve_url(db_url: Optional[str]) -> str:
+    url = db_url or Config.DB_URL
+    if not url:
+        raise RuntimeError("DB_URL не задан в .env")
+
+    # чтобы Postgres заводился “из коробки” с psycopg v3
+    if url.startswith("postgresql://"):
+        url = url.replace("postgresql://", "postgresql+psycopg://", 1)
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql+psycopg://", 1)
+    return url
+
+
+def _upsert_insert(dialect: str):
+    """insert() с поддержкой ON CONFLICT для диалекта или None (тогда UPSERT построчно)."""
+    return {"postgresql": postgresql.insert, "sqlite": sqlite.insert}.get(dialect)
+
+
+def _user_level_deltas_upsert(insert):
+    """UPSERT приращений из буфера XP: message_count и xp прибавляются, level — только вверх."""
+    table = UserLevel.__table__
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.guild_id, table.c.user_id],
+        set_={
+            "message_count": table.c.message_count + stmt.excluded.message_count,
+            "xp": table.c.xp + stmt.excluded.xp,
+            "level": case(
+                (stmt.excluded.level > table.c.level, stmt.excluded.level),
+                else_=table.c.level,
+            ),
+        },
+    )
+
+
+def _level_sync_queue_insert(insert):
+    """Постановка (guild_id, user_id) в очередь сверки уровней; повтор — no-op."""
+    table = LevelSyncQueue.__table__
+    return insert(table).on_conflict_do_nothing(index_elements=[table.c.guild_id, table.c.user_id])
+
+
+def _user_levels_backfill_insert(insert):
+    """INSERT новых участников гильдии; строка, которую успели создать параллельно, — no-op."""
+    table = UserLevel.__table__
+    return insert(table).on_conflict_do_nothing(index_elements=[table.c.guild_id, table.c.user_id])
+
+
+# Строк в одном executemany при заполнении гильдии
+BACKFILL_CHUNK = 1000
+
+
+def _backfill_rows(guild_id: int, members: Iterable, existing: set[int]) -> list[dict]:
+    """Строки UserLevel для участников без записи в БД (боты и повторы пропускаются)."""
+    rows = []
+    seen = set(existing)
+    for member in members:
+        if getattr(member, "bot", False) or member.id in seen:
+            continue
+        seen.add(member.id)
+        rows.append(
+            {"guild_id": guild_id, "user_id": member.id, "level": 1, "message_count": 0, "xp": 0, "days_on_server": 0}
         )
-    return create_engine(db_url, pool_pre_ping=True)
+    return rows
 
 
-class Database:
-    def __init__(self, db_url: Optional[str] = None):
-        url = db_url or Config.DB_URL
-        if not url:
-            raise RuntimeError("DB_URL не задан в .env")
+def _dirty_keys_stmts(limit: int):
+    """
+    (DELETE ключей из очереди с RETURNING, фабрика SELECT строк по ключам).
+    Ключи забираются одним DELETE … RETURNING: участник, снова отмеченный уже после него, остаётся в очереди
+    до следующего прохода (при SELECT, а затем DELETE такая отметка терялась). Строки читаются после DELETE,
+    поэтому не старше отметки.
+    """
+    key = tuple_(LevelSyncQueue.guild_id, LevelSyncQueue.user_id)
+    claim = (
+        delete(LevelSyncQueue)
+        .where(key.in_(select(LevelSyncQueue.guild_id, LevelSyncQueue.user_id).limit(limit)))
+        .returning(LevelSyncQueue.guild_id, LevelSyncQueue.user_id)
+    )
 
-        # чтобы Postgres заводился “из коробки” с psycopg v3
-        if url.startswith("postgresql://"):
-            url = url.replace("postgresql://", "postgresql+psycopg://", 1)
-        if url.startswith("postgres://"):
-            url = url.replace("postgres://", "postgresql+psycopg://", 1)
+    def rows(batch):
+        return select(UserLevel).where(tuple_(UserLevel.guild_id, UserLevel.user_id).in_(batch))
 
-        self.engine = _make_engine(url)
-        Base.metadata.create_all(self.engine)
-        self.Session = sessionmaker(bind=self.engine, autoflush=False, autocommit=False)
+    return claim, rows
 
-    def get_admin_by_username(self, username: str) -> AdminUser | None:
-        session = self.Session()
-        try:
-            return session.query(AdminUser).filter_by(username=username).first()
-        finally:
-            session.close()
 
-    def get_guild_config(self, guild_id: int):
-        session = self.Session()
-        try:
-            config = session.query(GuildConfig).filter_by(guild_id=guild_id).first()
-            if not config:
-                return None
-            return {
-                "welcome_channel_id": config.welcome_channel_id,
-                "welcome_role_id": config.welcome_role_id,
-                "level_channel_id": config.level_channel_id,
-                "role_select_channel_id": config.role_select_channel_id,
-                "selectable_roles": (
-                    [int(x) for x in config.selectable_roles.split(",") if x]
-                    if config.selectable_roles
-                    else []
-                ),
-            }
-        finally:
-            session.close()
+def _raise_levels_stmt():
+    """UPDATE level пачкой (executemany); уровень только вверх, даже если строку успели поменять."""
+    table = UserLevel.__table__
+    return (
+        update(table)
+        .where(
+            table.c.guild_id == bindparam("b_guild_id"),
+            table.c.user_id == bindparam("b_user_id"),
+            table.c.level < bindparam("b_level"),
+        )
+        .values(level=bindparam("b_level"))
+    )
 
-    def update_guild_config(
-        self,
-        guild_id: int,
-        channel_id: Optional[int] = None,
-        role_id: Optional[int] = None,
-        level_channel_id: Optional[int] = None,
-        role_select_channel_id: Optional[int] = None,
-        selectable_roles: Optional[list[int]] = None,
-    ):
-        session = self.Session()
-        try:
-            config = session.query(GuildConfig).filter_by(guild_id=guild_id).first()
-            if not config:
-                config = GuildConfig(guild_id=guild_id)
-                session.add(config)
-
-            # Всегда обновляем все переданные поля (фронт шлёт полный объект, null = сброс)
-            config.welcome_channel_id = channel_id
-            config.welcome_role_id = role_id
-            config.level_channel_id = level_channel_id
-            config.role_select_channel_id = role_select_channel_id
-            config.selectable_roles = (
-                ",".join(map(str, selectable_roles)) if selectable_roles else None
-            )
 
-            session.commit()
-        finally:
-            session.close()
+def _level_expr(message_count, xp):
+    """calculate_level в виде SQL-выражения (CASE), чтобы пересчитывать уровень прямо в UPDATE."""
+    xp_phase_start = get_xp_threshold(5)
+    xp_level = 5 + (xp - xp_phase_start) // (get_xp_threshold(6) - xp_phase_start)
+    return case(
+        (xp >= xp_phase_start, case((xp_level > MAX_LEVEL, MAX_LEVEL), else_=xp_level)),
+        (message_count < get_message_threshold(1), 0),
+        (message_count < get_message_threshold(2), 1),
+        (message_count < get_message_threshold(3), 2),
+        (message_count < get_message_threshold(4), 3),
+        else_=4,
+    )
+
+
+def _lock_guild_levels_stmt(dialect: str, guild_id: int):
+    """
+    Первый оператор транзакции, которая читает строки гильдии и затем пишет по прочитанному: пока она
+    не завершится, сброс буфера XP не изменит эти строки. Postgres — SELECT ... FOR UPDATE строк
+    гильдии; SQLite — BEGIN IMMEDIATE (блокировка записи всей БД: иначе pysqlite начинает транзакцию
+    только перед первым UPDATE, и SELECT до него идёт вне неё).
+    """
+    if dialect == "sqlite":
+        return text("BEGIN IMMEDIATE")
+    return select(UserLevel.id).where(UserLevel.guild_id == guild_id).with_for_update()
+
+
+def _days_increment_stmts(guild_id: int):
+    """
+    Суточная задача одним набором запросов на гильдию: +1 день, бонус +15 XP за каждые 2 дня,
+    уровень только вверх. Возвращает (SELECT повышаемых участников, UPDATE всех строк гильдии);
+    выполнять в одной транзакции после _lock_guild_levels_stmt, иначе сброс XP между ними меняет,
+    кто на самом деле повышен.
+    """
+    days = UserLevel.days_on_server
+    # (d+1)//2*15 - d//2*15: бонус начисляется, когда новое число дней становится чётным
+    new_xp = UserLevel.xp + case((days % 2 == 1, 15), else_=0)
+    new_level = _level_expr(UserLevel.message_count, new_xp)
+    promoted = select(UserLevel.user_id, new_level).where(
+        UserLevel.guild_id == guild_id, new_level > UserLevel.level
+    )
+    bump = (
+        update(UserLevel)
+        .where(UserLevel.guild_id == guild_id)
+        .values(
+            days_on_server=days + 1,
+            xp=new_xp,
+            level=case((new_level > UserLevel.level, new_level), else_=UserLevel.level),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return promoted, bump
+
+
+def _config_to_dict(config: GuildConfig | None):
+    if not config:
+        return None
+    return {
+        "welcome_channel_id": config.welcome_channel_id,
+        "welcome_role_id": config.welcome_role_id,
+        "level_channel_id": config.level_channel_id,
+        "role_select_channel_id": config.role_select_channel_id,
+        "selectable_roles": (
+            [int(x) for x in config.selectable_roles.split(",") if x]
+            if config.selectable_roles
+            else []
+        ),
+    }
+
+
+def _apply_guild_config(
+    config: GuildConfig,
+    channel_id: Optional[int],
+    role_id: Optional[int],
+    level_channel_id: Optional[int],
+    role_select_channel_id: Optional[int],
+    selectable_roles: Optional[list[int]],
+) -> None:
+    # Всегда обновляем все переданные поля (фронт шлёт полный объект, null = сброс)
+    config.welcome_channel_id = channel_id
+    config.welcome_role_id = role_id
+    config.level_channel_id = level_channel_id
+    config.role_select_channel_id = role_select_channel_id
+    config.selectable_roles = (
+        ",".join(map(str, selectable_roles)) if selectable_roles else None
+    )
+
+
+def _apply_user_level(
+    user_level: UserLevel,
+    message_count: Optional[int],
+    level: Optional[int],
+    xp: Optional[int],
+    days_on_server: Optional[int],
+) -> None:
+    if message_count is not None:
+        user_level.message_count = message_count
+    if level is not None:
+        user_level.level = level
+    if xp is not None:
+        user_level.xp = xp
+    if days_on_server is not None:
+        user_level.days_on_server = days_on_server
+
+
+def _new_user_level(guild_id: int, user_id: int) -> UserLevel:
+    return UserLevel(guild_id=guild_id, user_id=user_id, level=1, message_count=0, xp=0, days_on_server=0)
+
+
+def _add_user_level_delta(user_level: UserLevel, row: dict) -> None:
+    user_level.message_count += row["message_count"]
+    user_level.xp += row["xp"]
+    user_level.level = max(user_level.level, row["level"])
+
+
+def _create_schema(conn) -> None:
+    Base.metadata.create_all(conn)
+    # create_all не трогает уже существующие таблицы — индексы, добавленные позже, досоздаём отдельно
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def migrate(db_url: Optional[str] = None) -> float:
+    """
+    Создать недостающие таблицы и индексы — явный шаг перед запуском бота и API (main.py,
+    scripts/migrate.py), а не при создании Database/AsyncDatabase. Возвращает время в секундах.
+    """
+    started = time.perf_counter()
+    engine = _make_engine(_resolve_url(db_url))
+    try:
+        with engine.begin() as conn:
+            _create_schema(conn)
+    finally:
+        engine.dispose()
+    return time.perf_counter() - started
+
+
+def _top_stmt(guild_id: int, n: int):
+    return (
+        select(UserLevel)
+        .filter_by(guild_id=guild_id)
+        .order_by(UserLevel.level.desc(), UserLevel.xp.desc())
+        .limit(n)
+    )
+
+
+def _rank_stmt(guild_id: int, user_id: int, level: int, xp: int):
+    """Сколько участников гильдии выше по (уровень, XP); сам участник не считается."""
+    return (
+        select(func.count())
+        .select_from(UserLevel)
+        .where(
+            UserLevel.guild_id == guild_id,
+            UserLevel.user_id != user_id,
+            or_(UserLevel.level > level, and_(UserLevel.level == level, UserLevel.xp > xp)),
+        )
+    )
+
+
+class Database:
+    """
+    Синхронный слой БД — только для сравнения в scripts/bench_db_latency.py; бот и API работают через
+    AsyncDatabase (app.db.async_database). Общие запросы и схема — функции модуля выше.
+    """
+
+    def __init__(self, db_url: Optional[str] = None):
+        url = _resolve_url(db_url)
+        self.engine = _make_engine(url)
+        self.pool_metrics = PoolMetrics(self.engine.pool)
+        self.Session = sessionmaker(bind=self.engine, autoflush=False, autocommit=False, expire_on_commit=False)
+
+    def create_all(self) -> None:
+        """Создать таблицы этим движком (временные БД в скриптах; для основной — migrate())."""
+        with self.engine.begin() as conn:
+            _create_schema(conn)
 
     def get_user_level(self, guild_id: int, user_id: int) -> UserLevel:
         session = self.Session()
         try:
             user_level = session.query(UserLevel).filter_by(guild_id=guild_id, user_id=user_id).first()
             if not user_level:
-                user_level = UserLevel(guild_id=guild_id, user_id=user_id, level=1, message_count=0, xp=0, days_on_server=0)
+                user_level = _new_user_level(guild_id, user_id)
                 session.add(user_level)
                 session.commit()
             # возвращаем объект с уже загруженными полями
@@ -119,85 +385,9 @@ class Database:
         try:
             user_level = session.query(UserLevel).filter_by(guild_id=guild_id, user_id=user_id).first()
             if not user_level:
-                user_level = UserLevel(guild_id=guild_id, user_id=user_id, level=1, message_count=0, xp=0, days_on_server=0)
+                user_level = _new_user_level(guild_id, user_id)
                 session.add(user_level)
-
-            if message_count is not None:
-                user_level.message_count = message_count
-            if level is not None:
-                user_level.level = level
-            if xp is not None:
-                user_level.xp = xp
-            if days_on_server is not None:
-                user_level.days_on_server = days_on_server
-
-            session.commit()
-        finally:
-            session.close()
-
-    def get_users_in_guild(self, guild_id: int) -> list[UserLevel]:
-        session = self.Session()
-        try:
-            return session.query(UserLevel).filter_by(guild_id=guild_id).all()
-        finally:
-            session.close()
-
-    def get_users_in_guild_count(self, guild_id: int) -> int:
-        session = self.Session()
-        try:
-            return session.query(UserLevel).filter_by(guild_id=guild_id).count()
-        finally:
-            session.close()
-
-    def get_users_in_guild_paginated(
-        self,
-        guild_id: int,
-        offset: int = 0,
-        limit: int = 20,
-        order_by: str = "level",
-        order: str = "desc",
-    ) -> list[UserLevel]:
-        session = self.Session()
-        try:
-            q = session.query(UserLevel).filter_by(guild_id=guild_id)
-            col = getattr(UserLevel, order_by, UserLevel.level)
-            q = q.order_by(col.desc() if order == "desc" else col.asc())
-            return q.offset(offset).limit(limit).all()
-        finally:
-            session.close()
-
-    def add_all_users_to_guild(self, guild_id: int, members: Iterable) -> None:
-        session = self.Session()
-        try:
-            for member in members:
-                if getattr(member, "bot", False):
-                    continue
-                existing = session.query(UserLevel).filter_by(guild_id=guild_id, user_id=member.id).first()
-                if not existing:
-                    session.add(
-                        UserLevel(guild_id=guild_id, user_id=member.id, level=1, message_count=0, xp=0, days_on_server=0)
-                    )
-            session.commit()
-        finally:
-            session.close()
-
-    def get_discord_default_guild(self, discord_id: int) -> Optional[int]:
-        session = self.Session()
-        try:
-            row = session.query(DiscordUserPrefs).filter_by(discord_id=discord_id).first()
-            return row.default_guild_id if row else None
-        finally:
-            session.close()
-
-    def set_discord_default_guild(self, discord_id: int, guild_id: Optional[int]) -> None:
-        session = self.Session()
-        try:
-            row = session.query(DiscordUserPrefs).filter_by(discord_id=discord_id).first()
-            if row:
-                row.default_guild_id = guild_id
-            else:
-                session.add(DiscordUserPrefs(discord_id=discord_id, default_guild_id=guild_id))
+            _apply_user_level(user_level, message_count, level, xp, days_on_server)
             session.commit()
         finally:
             session.close()
-
@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, Integer, String, Text, UniqueConstraint
+from sqlalchemy import BigInteger, Column, Index, Integer, String, Text, UniqueConstraint
 
 from app.db.base import Base
 
@@ -29,7 +29,8 @@ class UserLevel(Base):
     __tablename__ = "user_levels"
     __table_args__ = (UniqueConstraint("guild_id", "user_id", name="uq_user_levels_guild_user"),)
 
-    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    # В SQLite автоинкремент работает только у INTEGER PRIMARY KEY (BIGINT не становится rowid)
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
     guild_id = Column(BigInteger, nullable=False, index=True)
     user_id = Column(BigInteger, nullable=False, index=True)
 
@@ -39,6 +40,15 @@ class UserLevel(Base):
     days_on_server = Column(Integer, default=0, nullable=False)
 
 
+# Лидерборд гильдии: /top (ORDER BY ... LIMIT) и ранг (COUNT выше по уровню/XP) идут по индексу
+Index(
+    "ix_user_levels_guild_level_xp",
+    UserLevel.guild_id,
+    UserLevel.level.desc(),
+    UserLevel.xp.desc(),
+)
+
+
 class DiscordUserPrefs(Base):
     """Выбор сервера по умолчанию для пользователя, вошедшего через Discord."""
     __tablename__ = "discord_user_prefs"
@@ -46,3 +56,10 @@ class DiscordUserPrefs(Base):
     discord_id = Column(BigInteger, primary_key=True)
     default_guild_id = Column(BigInteger, nullable=True)
 
+
+class LevelSyncQueue(Base):
+    """Участники, у которых менялись сообщения/XP/дни: сверяет уровень только их (sync_dirty_levels в боте)."""
+    __tablename__ = "level_sync_queue"
+
+    guild_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, primary_key=True)
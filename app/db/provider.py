@@ -0,0 +1,64 @@
+"""
+Общий доступ к БД на процесс: один AsyncDatabase (движок и пул соединений) на event loop.
+Соединения async-пула привязаны к loop, поэтому у бота и у API (uvicorn в своём потоке) по экземпляру,
+а все модули внутри одного loop делят один пул. Размер пула — Config.DB_POOL_*.
+
+Модули берут `db` отсюда: вызовы уходят в экземпляр текущего loop, который создаётся при первом обращении.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Any
+
+from app.db.async_database import AsyncDatabase
+
+_lock = threading.Lock()
+_databases: dict[asyncio.AbstractEventLoop, AsyncDatabase] = {}
+# loop -> имя потока, в котором он работает (для метрик: бот, API)
+_labels: dict[asyncio.AbstractEventLoop, str] = {}
+
+
+def get_db() -> AsyncDatabase:
+    """AsyncDatabase текущего event loop (вызывать из корутины)."""
+    loop = asyncio.get_running_loop()
+    database = _databases.get(loop)
+    if database is None:
+        with _lock:
+            database = _databases.get(loop)
+            if database is None:
+                # Пулы закрытых loop уже не использовать (соединения привязаны к ним) — забываем
+                for closed in [other for other in _databases if other.is_closed()]:
+                    del _databases[closed]
+                    _labels.pop(closed, None)
+                database = AsyncDatabase()
+                _databases[loop] = database
+                _labels[loop] = threading.current_thread().name
+    return database
+
+
+async def close_db() -> None:
+    """Закрыть пул текущего loop (при остановке бота/API); следующий get_db() создаст новый."""
+    with _lock:
+        loop = asyncio.get_running_loop()
+        database = _databases.pop(loop, None)
+        _labels.pop(loop, None)
+    if database is not None:
+        await database.dispose()
+
+
+def pool_metrics() -> list[dict[str, Any]]:
+    """Метрики пулов всех loop процесса (ожидание соединения, занятость)."""
+    with _lock:
+        items = [(_labels.get(loop, "?"), database) for loop, database in _databases.items()]
+    return [{"thread": label, **database.pool_metrics.snapshot()} for label, database in items]
+
+
+class _LoopDatabase:
+    """`db.method(...)` — тот же вызов у AsyncDatabase текущего loop."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(get_db(), name)
+
+
+db = _LoopDatabase()
@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, HTTPException
@@ -5,6 +6,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 
 from app.api.router import api_router
+from app.core.cache_backend import make_backend
+from app.core.cache_sync import CacheReader
 from app.core.config import Config
 
 # Корень проекта (папка witrix-discordbot)
@@ -19,8 +22,26 @@ def _parse_cors_origins(raw: str) -> list[str]:
     return [x.strip() for x in raw.split(",") if x.strip()]
 
 
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # API отдельно от бота: данные гильдий — из общего кэша, который публикует бот
+    reader = None
+    if not Config.API_IN_PROCESS:
+        backend = make_backend()
+        if backend is None:
+            print("Предупреждение: API_IN_PROCESS=false без CACHE_BACKEND — данных гильдий от бота не будет")
+        else:
+            reader = CacheReader(backend, Config.CACHE_POLL_INTERVAL)
+            reader.start()
+    try:
+        yield
+    finally:
+        if reader is not None:
+            reader.stop()
+
+
 def create_app() -> FastAPI:
-    app = FastAPI(title="Discord Bot API", version="0.9.5")
+    app = FastAPI(title="Discord Bot API", version="0.9.5", lifespan=_lifespan)
 
     origins = _parse_cors_origins(Config.CORS_ORIGINS)
     app.add_middleware(
@@ -5,6 +5,7 @@ import uvicorn
 
 from app.bot.bot import bot
 from app.core.config import Config
+from app.db.database import migrate
 
 
 def run_api():
@@ -31,8 +32,14 @@ async def start_bot():
 
 
 if __name__ == "__main__":
-    api_thread = threading.Thread(target=run_api, daemon=True)
-    api_thread.start()
+    if Config.DB_AUTO_MIGRATE:
+        print(f"Схема БД проверена за {migrate():.2f} с")
+
+    if Config.API_IN_PROCESS:
+        api_thread = threading.Thread(target=run_api, daemon=True)
+        api_thread.start()
+    else:
+        print("API запускается отдельно: uvicorn app.main:app --workers N (данные бота — через CACHE_BACKEND)")
 
     try:
         asyncio.run(start_bot())
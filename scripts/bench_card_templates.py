@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк шаблонов карточек: время одной отрисовки карточки приветствия и уровня, как было
+(фон, рамка, подложка полосы и маска рисуются заново на каждую карточку) и с шаблонами
+(app.bot.cards.templates — готовый фон копируется). Заодно проверяет, что в стиле по умолчанию
+картинки совпадают попиксельно.
+
+Отдельно меряется статичная часть (её и убирают шаблоны) и вся отрисовка с кодированием PNG —
+большую часть времени карточки занимают текст и PNG, поэтому выигрыш на всей отрисовке меньше.
+Аватар — готовое изображение нужного размера (как из кэша аватаров).
+
+Использование:
+  python scripts/bench_card_templates.py              # 300 карточек каждого вида
+  python scripts/bench_card_templates.py -n 1000 --style light
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+# корень проекта в PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from PIL import Image, ImageChops, ImageDraw
+
+from app.bot.cards import STYLES, fonts, render_level_card, render_welcome_card, templates
+from app.core.levels import get_message_threshold, get_xp_threshold
+
+
+def _legacy_welcome(avatar: Image.Image, member_name: str, member_count: int) -> bytes:
+    """Прежняя render_welcome_card (стиль по умолчанию)."""
+    avatar = avatar.copy()
+    mask = Image.new("L", (200, 200), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, 200, 200), fill=255)
+    avatar_circle = Image.new("RGBA", (200, 200), (0, 0, 0, 0))
+    avatar_circle.paste(avatar, (0, 0), mask)
+
+    background = Image.new("RGBA", (600, 300), (0, 0, 0, 255))
+    ImageDraw.Draw(background).ellipse((195, 15, 405, 225), outline=(255, 255, 255, 255), width=5)
+    background.paste(avatar_circle, (200, 20), avatar_circle)
+
+    draw = ImageDraw.Draw(background)
+    font = fonts.get(30, "bold")
+    small_font = fonts.get(20)
+    text1 = f"{member_name} уже на нашем сервере"
+    draw.text((300 - draw.textlength(text1, font=font) / 2, 230), text1, fill=(255, 255, 255, 255), font=font)
+    text2 = f"БРАД #{member_count}"
+    draw.text((300 - draw.textlength(text2, font=small_font) / 2, 270), text2, fill=(255, 255, 255, 255), font=small_font)
+
+    buffer = io.BytesIO()
+    background.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _legacy_level(avatar: Image.Image, member_name: str, rank: int, level: int, message_count: int, xp: int) -> bytes:
+    """Прежняя render_level_card (стиль по умолчанию)."""
+    avatar = avatar.copy()
+    mask = Image.new("L", (100, 100), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, 100, 100), fill=255)
+    avatar.putalpha(mask)
+
+    background = Image.new("RGBA", (600, 168), (0, 0, 0, 255))
+    ImageDraw.Draw(background).ellipse((15, 20, 125, 130), outline=(255, 255, 255, 255), width=3)
+    background.paste(avatar, (20, 25), avatar)
+
+    draw = ImageDraw.Draw(background)
+    draw.ellipse((95, 100, 115, 120), fill=(67, 181, 129, 255))
+    font = fonts.get(30, "bold")
+    small_font = fonts.get(20)
+    draw.text((140, 20), member_name, fill=(255, 255, 255, 255), font=font)
+    draw.text((140, 60), f"РАНГ #{rank} УРОВЕНЬ {level}", fill=(186, 85, 211, 255), font=small_font)
+
+    next_level = min(level + 1, 999)
+    current_threshold = get_message_threshold(level) if level < 5 else get_xp_threshold(level)
+    next_threshold = get_message_threshold(next_level) if next_level <= 5 else get_xp_threshold(next_level)
+    if level < 5:
+        progress = message_count / next_threshold if next_threshold > 0 else 1
+        xp_text = f"{message_count}/{next_threshold} сообщений"
+    else:
+        required = next_threshold - current_threshold
+        progress = 1.0 if required <= 0 else min(1.0, float(max(0, xp - current_threshold)) / required)
+        xp_text = f"{xp}/{next_threshold} XP"
+    draw.text((140, 88), xp_text, fill=(255, 255, 255, 255), font=small_font)
+
+    progress = max(0.0, min(1.0, float(progress)))
+    filled_width = int(440 * progress)
+    if filled_width == 0 and (progress > 0 or (level >= 5 and xp > 0)):
+        filled_width = 8
+    filled_width = min(filled_width, 440)
+    draw.rounded_rectangle((140, 118, 580, 140), radius=11, fill=(70, 70, 70, 255), outline=(100, 100, 100, 255), width=1)
+    fill_width = max(0, filled_width - 4)
+    if fill_width > 0:
+        draw.rounded_rectangle(
+            (142, 120, 142 + fill_width, 138), radius=min(10, 9, fill_width // 2), fill=(186, 85, 211, 255)
+        )
+
+    buffer = io.BytesIO()
+    background.save(buffer, format="PNG", quality=95)
+    return buffer.getvalue()
+
+
+def _time(fn, jobs: list[tuple]) -> list[float]:
+    times = []
+    for job in jobs:
+        started = time.perf_counter()
+        fn(*job)
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def _legacy_static(kind: str) -> None:
+    """Статичная часть карточки, как её рисовали на каждую отрисовку."""
+    if kind == "welcome":
+        mask = Image.new("L", (200, 200), 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, 200, 200), fill=255)
+        background = Image.new("RGBA", (600, 300), (0, 0, 0, 255))
+        ImageDraw.Draw(background).ellipse((195, 15, 405, 225), outline=(255, 255, 255, 255), width=5)
+    else:
+        mask = Image.new("L", (100, 100), 0)
+        ImageDraw.Draw(mask).ellipse((0, 0, 100, 100), fill=255)
+        background = Image.new("RGBA", (600, 168), (0, 0, 0, 255))
+        draw = ImageDraw.Draw(background)
+        draw.ellipse((15, 20, 125, 130), outline=(255, 255, 255, 255), width=3)
+        draw.rounded_rectangle((140, 118, 580, 140), radius=11, fill=(70, 70, 70, 255), outline=(100, 100, 100, 255), width=1)
+
+
+def _template_static(kind: str, style) -> None:
+    templates.mask(200 if kind == "welcome" else 100)
+    templates.background(kind, style)
+
+
+def _same(a: bytes, b: bytes) -> bool:
+    return ImageChops.difference(Image.open(io.BytesIO(a)), Image.open(io.BytesIO(b))).getbbox() is None
+
+
+def _report(name: str, before: list[float], after: list[float]) -> None:
+    b, a = statistics.median(before), statistics.median(after)
+    print(f"  {name:<11} было {b:7.3f} мс   стало {a:7.3f} мс   ({(b - a) / b * 100:+.1f}%)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=300, help="карточек каждого вида")
+    parser.add_argument("--style", choices=sorted(STYLES), default="default", help="стиль для прогона «стало»")
+    args = parser.parse_args()
+
+    style = STYLES[args.style]
+    fonts.preload()
+    print(f"Шаблоны построены за {templates.preload([style]):.1f} мс (один раз на стиль)")
+    avatar200 = Image.new("RGBA", (200, 200), (90, 120, 200, 255))
+    avatar100 = Image.new("RGBA", (100, 100), (90, 120, 200, 255))
+
+    welcome_jobs = [(avatar200, f"Участник {i}", 1000 + i) for i in range(args.n)]
+    level_jobs = [(avatar100, f"Участник {i}", i + 1, 1 + i % 300, i * 7, i * 997) for i in range(args.n)]
+
+    if args.style == "default":
+        same = all(
+            _same(_legacy_welcome(*job), render_welcome_card(*job, style)) for job in welcome_jobs[:20]
+        ) and all(
+            _same(
+                _legacy_level(avatar, name, rank, level, count, xp),
+                render_level_card(avatar, name, (67, 181, 129, 255), rank, level, count, xp, style),
+            )
+            for avatar, name, rank, level, count, xp in level_jobs[:20]
+        )
+        print(f"Картинки совпадают с прежними попиксельно: {'да' if same else 'НЕТ'}")
+
+    print("\nСтатичная часть (фон, рамка, подложка полосы, маска), медиана на карточку:")
+    for kind, name in (("welcome", "приветствие"), ("level", "уровень")):
+        _report(
+            name,
+            _time(_legacy_static, [(kind,)] * args.n),
+            _time(_template_static, [(kind, style)] * args.n),
+        )
+
+    print(f"\nВся отрисовка с PNG, {args.n} карточек каждого вида, медиана на карточку:")
+    _report(
+        "приветствие",
+        _time(_legacy_welcome, welcome_jobs),
+        _time(lambda *job: render_welcome_card(*job, style), welcome_jobs),
+    )
+    _report(
+        "уровень",
+        _time(_legacy_level, level_jobs),
+        _time(
+            lambda avatar, name, rank, level, count, xp: render_level_card(
+                avatar, name, (67, 181, 129, 255), rank, level, count, xp, style
+            ),
+            level_jobs,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
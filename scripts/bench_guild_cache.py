@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк чтения app.core.guild_cache: N потоков-читателей (как запросы API /users, /users/count,
+/guilds) и поток-писатель (как бот: set_user_info) работают T секунд. Сравнивается прежняя схема
+(глобальный Lock + копия list/dict на каждый get) с неизменяемыми снимками.
+
+Использование:
+  python scripts/bench_guild_cache.py
+  python scripts/bench_guild_cache.py --members 200000 --readers 8 --seconds 3
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+# корень проекта в PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core import guild_cache
+
+
+class _LockedCache:
+    """Прежняя реализация: всё под одним Lock, геттеры отдают копии."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._guilds: list[dict] = []
+        self._users: dict[int, dict[int, dict]] = {}
+
+    def sync_all(self, guilds, channels, roles, users):
+        with self._lock:
+            self._guilds = list(guilds)
+            self._users = {k: dict(v) for k, v in users.items()}
+
+    def get_guilds(self):
+        with self._lock:
+            return list(self._guilds)
+
+    def get_guild_users(self, guild_id):
+        with self._lock:
+            return dict(self._users.get(guild_id, {}))
+
+    def get_user_info(self, guild_id, user_id):
+        with self._lock:
+            return self._users.get(guild_id, {}).get(user_id)
+
+    def set_user_info(self, guild_id, user_id, name, avatar=None):
+        with self._lock:
+            if guild_id not in self._users:
+                self._users[guild_id] = {}
+            self._users[guild_id][user_id] = {"name": name, "avatar": avatar}
+
+
+def _fill(cache, guilds: int, members: int) -> None:
+    guild_list = [{"id": gid, "name": f"Сервер {gid}"} for gid in range(1, guilds + 1)]
+    users = {
+        gid: {uid: {"name": f"user{uid}", "avatar": None} for uid in range(members)}
+        for gid in range(1, guilds + 1)
+    }
+    cache.sync_all(guild_list, {gid: [] for gid in users}, {gid: [] for gid in users}, users)
+
+
+def _run(cache, readers: int, seconds: float, guilds: int, members: int) -> tuple[float, int]:
+    stop = threading.Event()
+    counts = [0] * readers
+    writes = [0]
+
+    def reader(i: int) -> None:
+        gid = i % guilds + 1
+        n = 0
+        while not stop.is_set():
+            # /users/count — весь список участников, /users/{id} — один участник, /guilds — список гильдий
+            len(cache.get_guild_users(gid))
+            cache.get_user_info(gid, n % members)
+            cache.get_guilds()
+            n += 1
+        counts[i] = n
+
+    def writer() -> None:
+        n = 0
+        while not stop.is_set():
+            cache.set_user_info(1, members + n % 100, f"fetched{n}")
+            n += 1
+            time.sleep(0.01)
+        writes[0] = n
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds, writes[0]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=4)
+    parser.add_argument("--members", type=int, default=20_000, help="участников в гильдии")
+    parser.add_argument("--readers", type=int, default=4, help="потоков-читателей")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{args.guilds} гильдий x {args.members} участников, читателей: {args.readers}, {args.seconds} с")
+    for name, cache in (("Lock + копии (было)", _LockedCache()), ("снимки", guild_cache)):
+        _fill(cache, args.guilds, args.members)
+        rate, writes = _run(cache, args.readers, args.seconds, args.guilds, args.members)
+        print(f"  {name:20} {rate:>12,.0f} чтений/с  (записей: {writes})")
+
+
+if __name__ == "__main__":
+    main()
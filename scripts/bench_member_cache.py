@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Память кэша участников (app.core.guild_cache): байт на участника для N синтетических участников
+в прежнем формате ({"name": ..., "avatar": полный URL} на каждого) и в компактном (MemberInfo).
+
+Строки ников и хэшей аватаров создаются до замера — как у discord.py, который держит их сам;
+в замер попадает только то, что добавляет кэш поверх (словарь гильдии, записи, URL).
+
+Использование:
+  python scripts/bench_member_cache.py
+  python scripts/bench_member_cache.py -n 500000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import random
+import sys
+import tracemalloc
+
+# корень проекта в PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.guild_cache import AVATAR_DEFAULT, AVATAR_GUILD, AVATAR_USER, MemberInfo
+
+GUILD_ID = 1_100_000_000_000_000_000
+
+
+def _source(n: int) -> list[tuple[int, str, int, str]]:
+    """Участники «как в discord.py»: (user_id, ник, тип аватара, ключ аватара)."""
+    rnd = random.Random(42)
+    members = []
+    for i in range(n):
+        user_id = 300_000_000_000_000_000 + i * 7919
+        name = f"user_{rnd.randrange(10**9):09d}"
+        roll = rnd.random()
+        if roll < 0.7:
+            kind, key = AVATAR_USER, ("a_" if roll < 0.05 else "") + f"{rnd.getrandbits(128):032x}"
+        elif roll < 0.75:
+            kind, key = AVATAR_GUILD, f"{rnd.getrandbits(128):032x}"
+        else:
+            kind, key = AVATAR_DEFAULT, str(rnd.randrange(6))
+        members.append((user_id, name, kind, key))
+    return members
+
+
+def _old_layout(members) -> dict:
+    users = {}
+    for user_id, name, kind, key in members:
+        # прежний код: str(member.display_avatar.url) — новая строка URL на каждого
+        url = MemberInfo(GUILD_ID, user_id, name, kind, key).avatar
+        users[user_id] = {"name": name, "avatar": url}
+    return users
+
+
+def _new_layout(members) -> dict:
+    return {user_id: MemberInfo(GUILD_ID, user_id, name, kind, key) for user_id, name, kind, key in members}
+
+
+def _measure(build, members) -> int:
+    gc.collect()
+    tracemalloc.start()
+    structure = build(members)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del structure
+    return current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=100_000, help="число участников")
+    args = parser.parse_args()
+
+    members = _source(args.n)
+    print(f"{args.n:,} участников в одной гильдии")
+    old = _measure(_old_layout, members)
+    new = _measure(_new_layout, members)
+    print(f"  {'dict + URL (было)':20} {old / args.n:8.1f} байт/участник  ({old / 2**20:.1f} МБ)")
+    print(f"  {'MemberInfo':20} {new / args.n:8.1f} байт/участник  ({new / 2**20:.1f} МБ)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк пула рендера карточек: рисует N карточек уровня/приветствия с заглушками аватаров
+через RenderService при разных размерах пула и печатает карточек/с и задержки.
+
+Использование:
+  python scripts/bench_render.py                       # 200 карточек, пулы 1,2,4,8, потоки
+  python scripts/bench_render.py -n 500 --sizes 1,4 --processes
+  python scripts/bench_render.py --card welcome
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+
+# корень проекта в PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from PIL import Image
+
+from app.bot.cards import render_level_card, render_welcome_card
+from app.bot.render_service import RenderService
+
+
+def _stub_avatars(count: int = 16, size: int = 256) -> list[bytes]:
+    """Заглушки аватаров: PNG-заливки разными цветами (как ответ CDN Discord)."""
+    rnd = random.Random(7)
+    avatars = []
+    for _ in range(count):
+        img = Image.new("RGBA", (size, size), (rnd.randint(0, 255), rnd.randint(0, 255), rnd.randint(0, 255), 255))
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        avatars.append(buf.getvalue())
+    return avatars
+
+
+def _jobs(card: str, n: int, avatars: list[bytes]) -> list[tuple]:
+    rnd = random.Random(11)
+    jobs = []
+    for i in range(n):
+        avatar = avatars[i % len(avatars)]
+        if card == "welcome":
+            jobs.append((render_welcome_card, avatar, f"Участник {i}", rnd.randint(1, 100_000)))
+        else:
+            level = rnd.randint(1, 300)
+            jobs.append(
+                (
+                    render_level_card,
+                    avatar,
+                    f"Участник {i}",
+                    (67, 181, 129, 255),
+                    rnd.randint(1, 5000),
+                    level,
+                    rnd.randint(0, 50_000),
+                    rnd.randint(0, 200_000),
+                )
+            )
+    return jobs
+
+
+async def _run(jobs: list[tuple], workers: int, use_processes: bool) -> None:
+    service = RenderService(workers=workers, max_queue=len(jobs), use_processes=use_processes)
+    # прогрев пула (в процессах — импорт модулей в воркерах)
+    await asyncio.gather(*(service.render(*jobs[0]) for _ in range(workers)))
+    service.stats = type(service.stats)()
+    started = time.perf_counter()
+    await asyncio.gather(*(service.render(*job) for job in jobs))
+    elapsed = time.perf_counter() - started
+    stats = service.stats.snapshot()
+    service.shutdown()
+    print(
+        f"  пул {workers:>2}: {len(jobs) / elapsed:8.1f} карточек/с  "
+        f"рендер p50={stats['render_ms_p50']:.1f} мс p95={stats['render_ms_p95']:.1f} мс"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=200, help="число карточек")
+    parser.add_argument("--sizes", default="1,2,4,8", help="размеры пула через запятую")
+    parser.add_argument("--card", choices=("level", "welcome"), default="level")
+    parser.add_argument("--processes", action="store_true", help="пул процессов вместо потоков")
+    args = parser.parse_args()
+
+    jobs = _jobs(args.card, args.n, _stub_avatars())
+    kind = "процессы" if args.processes else "потоки"
+    print(f"{args.n} карточек ({args.card}), {kind}, CPU: {os.cpu_count()}")
+    for size in (int(x) for x in args.sizes.split(",") if x.strip()):
+        await _run(jobs, size, args.processes)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
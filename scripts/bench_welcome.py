@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный прогон приветствий: воспроизводит наплыв входов (рейд, массовое приглашение) на
+заглушках гильдии/канала/участников и сравнивает прежний on_member_join (на каждый вход — два
+запроса к БД, карточка, отправка и add_roles сразу) с WelcomePipeline (app.bot.welcome).
+
+БД — настоящая (по умолчанию временная SQLite), карточки рисуются настоящим render_welcome_card
+через RenderService. Discord — заглушка: отправка и выдача роли занимают --api-ms, выдача ролей
+ограничена лимитом --role-limit (выдач за секунду на сервер); сверх лимита заглушка отвечает 429 и,
+как discord.py, ждёт освобождения лимита. Время сжато: лимит по умолчанию выше настоящего.
+
+Использование:
+  python scripts/bench_welcome.py                          # 150 входов за 5 с на один сервер
+  python scripts/bench_welcome.py --joins 500 --duration 10 --guilds 3 --role-limit 50
+  python scripts/bench_welcome.py --mode pipeline --burst-threshold 20
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+
+# корень проекта в PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from PIL import Image
+
+from app.bot.cards import render_welcome_card
+from app.bot.render_service import RenderService
+from app.bot.welcome import RoleGrantQueue, WelcomePipeline, format_welcome
+from app.db.async_database import AsyncDatabase
+
+CHANNEL_ID = 10
+ROLE_ID = 20
+
+
+def _percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class FakeApi:
+    """Счётчики «запросов к Discord» и лимит выдачи ролей (скользящее окно в 1 с на сервер)."""
+
+    def __init__(self, api_ms: float, role_limit: int):
+        self.delay = api_ms / 1000
+        self.role_limit = role_limit
+        self.role_calls: dict[int, deque[float]] = {}
+        self.counts = {"messages": 0, "files": 0, "roles": 0, "429": 0}
+        # join -> время отправки приветствия
+        self.welcomed: dict[int, float] = {}
+
+    async def add_role(self, guild_id: int) -> None:
+        calls = self.role_calls.setdefault(guild_id, deque())
+        while True:
+            now = time.monotonic()
+            while calls and now - calls[0] >= 1.0:
+                calls.popleft()
+            if len(calls) < self.role_limit:
+                break
+            # discord.py получает 429 и сам ждёт retry_after
+            self.counts["429"] += 1
+            await asyncio.sleep(1.0 - (now - calls[0]))
+        calls.append(time.monotonic())
+        await asyncio.sleep(self.delay)
+        self.counts["roles"] += 1
+
+
+class FakeChannel:
+    def __init__(self, api: FakeApi):
+        self.id = CHANNEL_ID
+        self.api = api
+
+    async def send(self, content: str = "", file=None) -> None:
+        await asyncio.sleep(self.api.delay)
+        self.api.counts["messages"] += 1
+        if file is not None:
+            self.api.counts["files"] += 1
+        now = time.monotonic()
+        for token in content.split():
+            if token.startswith("<@") and token.rstrip(",").endswith(">"):
+                self.api.welcomed.setdefault(int(token.strip("<@>,")), now)
+
+
+class FakeRole:
+    def __init__(self, role_id: int):
+        self.id = role_id
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, api: FakeApi):
+        self.id = guild_id
+        self.name = f"Сервер {guild_id}"
+        self.member_count = 1000
+        self.channel = FakeChannel(api)
+        self.role = FakeRole(ROLE_ID)
+
+    def get_channel(self, channel_id):
+        return self.channel if channel_id == CHANNEL_ID else None
+
+    def get_role(self, role_id):
+        return self.role if role_id == ROLE_ID else None
+
+
+class FakeMember:
+    bot = False
+
+    def __init__(self, member_id: int, guild: FakeGuild, api: FakeApi):
+        self.id = member_id
+        self.guild = guild
+        self.name = f"user{member_id}"
+        self.mention = f"<@{member_id}>"
+        self.roles: list[FakeRole] = []
+        self.api = api
+
+    async def add_roles(self, role, reason=None) -> None:
+        await self.api.add_role(self.guild.id)
+        self.roles.append(role)
+
+
+def _stub_avatar(size: int = 256) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGBA", (size, size), (90, 120, 200, 255)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+async def _legacy_join(db: AsyncDatabase, render, member: FakeMember) -> None:
+    """Прежний on_member_join: всё по порядку и сразу."""
+    await db.get_user_level(member.guild.id, member.id)
+    config = await db.get_guild_config(member.guild.id)
+    channel = member.guild.get_channel(config["welcome_channel_id"])
+    role = member.guild.get_role(config["welcome_role_id"])
+    image = await render(member, member.guild.member_count)
+    await channel.send(content=format_welcome(member.mention, member.guild.name), file=image)
+    await member.add_roles(role)
+
+
+async def _run(mode: str, args, db: AsyncDatabase, first_id: int) -> None:
+    api = FakeApi(args.api_ms, args.role_limit)
+    guilds = [FakeGuild(gid, api) for gid in range(1, args.guilds + 1)]
+    for guild in guilds:
+        await db.update_guild_config(
+            guild_id=guild.id,
+            channel_id=CHANNEL_ID,
+            role_id=ROLE_ID,
+            level_channel_id=None,
+            role_select_channel_id=None,
+            selectable_roles=None,
+        )
+    renderer = RenderService(max_queue=args.joins)
+    avatar = _stub_avatar()
+    renders = 0
+
+    async def render(member, member_count):
+        nonlocal renders
+        renders += 1
+        return io.BytesIO(await renderer.render(render_welcome_card, avatar, member.name, member_count))
+
+    pipeline = None
+    tasks: list[asyncio.Task] = []
+    if mode == "pipeline":
+        pipeline = WelcomePipeline(
+            db,
+            render,
+            RoleGrantQueue(rate=args.role_limit, per=1.0),
+            workers=args.workers,
+            burst_threshold=args.burst_threshold,
+            burst_window=args.burst_window,
+            batch_window=args.batch_window,
+        )
+
+    rnd = random.Random(5)
+    offsets = sorted(rnd.uniform(0, args.duration) for _ in range(args.joins))
+    joined_at: dict[int, float] = {}
+    started = time.monotonic()
+    for i, offset in enumerate(offsets):
+        delay = started + offset - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        member = FakeMember(first_id + i, guilds[i % len(guilds)], api)
+        joined_at[member.id] = time.monotonic()
+        if pipeline is not None:
+            pipeline.submit(member)
+        else:
+            # discord.py запускает каждый обработчик события отдельной задачей
+            tasks.append(asyncio.create_task(_legacy_join(db, render, member)))
+
+    if pipeline is not None:
+        while len(api.welcomed) < args.joins or api.counts["roles"] < args.joins:
+            await asyncio.sleep(0.05)
+    else:
+        await asyncio.gather(*tasks)
+    elapsed = time.monotonic() - started
+    renderer.shutdown()
+
+    latencies = [(api.welcomed[uid] - t) * 1000 for uid, t in joined_at.items() if uid in api.welcomed]
+    counts = api.counts
+    print(f"\n[{mode}] {args.joins} входов за {args.duration:g} с, серверов: {args.guilds}")
+    print(f"  всё обработано за {elapsed:.2f} с; карточек нарисовано: {renders}")
+    print(
+        f"  Discord: сообщений {counts['messages']} (с картинкой {counts['files']}), "
+        f"выдач ролей {counts['roles']}, ответов 429: {counts['429']}"
+    )
+    print(
+        f"  вход -> приветствие, мс: p50={_percentile(latencies, 50):.0f} "
+        f"p95={_percentile(latencies, 95):.0f} max={max(latencies, default=0):.0f}"
+    )
+    if pipeline is not None:
+        await pipeline.close()
+        print(f"  конвейер: {pipeline.snapshot()}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--joins", type=int, default=150, help="число входов")
+    parser.add_argument("--duration", type=float, default=5.0, help="за сколько секунд они приходят")
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--mode", choices=("both", "legacy", "pipeline"), default="both")
+    parser.add_argument("--api-ms", type=float, default=50.0, help="задержка одного запроса к Discord")
+    parser.add_argument("--role-limit", type=int, default=10, help="выдач ролей в секунду на сервер")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--burst-threshold", type=int, default=10)
+    parser.add_argument("--burst-window", type=float, default=60.0)
+    parser.add_argument("--batch-window", type=float, default=1.0)
+    parser.add_argument("--db-url", default=None, help="по умолчанию — временная SQLite")
+    args = parser.parse_args()
+
+    tmp_dir = None
+    db_url = args.db_url
+    if not db_url:
+        tmp_dir = tempfile.TemporaryDirectory()
+        db_url = f"sqlite:///{os.path.join(tmp_dir.name, 'bench.db')}"
+    db = AsyncDatabase(db_url)
+    await db.create_all()
+    try:
+        modes = ("legacy", "pipeline") if args.mode == "both" else (args.mode,)
+        for i, mode in enumerate(modes):
+            # у каждого прогона свои участники: строки уровней создаются заново
+            await _run(mode, args, db, first_id=(i + 1) * 1_000_000)
+    finally:
+        await db.dispose()
+        if tmp_dir is not None:
+            tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
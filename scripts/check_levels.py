@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Ручной скрипт (не входит в тесты): сплошная сверка и замер скорости расчёта уровней.
+Обычная проверка закрытых формул app.core.levels против прежнего перебора порогов — tests/test_levels.py
+(python -m pytest); здесь то же сравнение, но по всем XP подряд до порога 999 уровня + запас
+(несколько минут), и сравнение скорости со старой реализацией.
+
+Использование:
+  python scripts/check_levels.py           # только замер скорости
+  python scripts/check_levels.py --full    # сплошная сверка + замер
+"""
+from __future__ import annotations
+
+import os
+import random
+import sys
+import time
+
+# корень проекта в PYTHONPATH
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app.core.levels import calculate_level, level_from_total_xp
+from tests.test_levels import MAX_XP, reference_calculate_level, reference_level_from_total_xp
+
+
+def check_full() -> int:
+    checked = 0
+    for xp in range(-10, MAX_XP + 1):
+        assert level_from_total_xp(xp) == reference_level_from_total_xp(xp), f"level_from_total_xp({xp})"
+        for message_count in (0, 49, 50, 10_000):
+            expected = reference_calculate_level(message_count, xp, 0)
+            assert calculate_level(message_count, xp, 0) == expected, f"calculate_level({message_count}, {xp})"
+            checked += 1
+    return checked
+
+
+def bench(n: int = 20_000) -> None:
+    rnd = random.Random(1)
+    rows = [(rnd.randint(0, 100_000), rnd.randint(0, 600_000), rnd.randint(0, 3000)) for _ in range(n)]
+    for name, fn in (("перебор (было)", reference_calculate_level), ("формула", calculate_level)):
+        started = time.perf_counter()
+        for row in rows:
+            fn(*row)
+        elapsed = time.perf_counter() - started
+        print(f"  {name:16} {n / elapsed:>12,.0f} вызовов/с")
+
+
+if __name__ == "__main__":
+    if "--full" in sys.argv[1:]:
+        print(f"OK: {check_full():,} комбинаций совпали с прежней реализацией")
+    bench()
@@ -0,0 +1,66 @@
+"""
+Закрытые формулы app.core.levels против прежней реализации с перебором порогов.
+
+Между соседними порогами уровень постоянен, поэтому кроме сплошных диапазонов проверяются
+значения порог−1, порог, порог+1 для каждого уровня до MAX_LEVEL и запас сверху.
+Сплошной перебор всех XP до порога MAX_LEVEL — scripts/check_levels.py --full.
+"""
+import random
+
+import pytest
+
+from app.core.levels import MAX_LEVEL, calculate_level, get_message_threshold, get_xp_threshold, level_from_total_xp
+
+
+def reference_level_from_total_xp(total_xp: int) -> int:
+    for lvl in range(5, 1000):
+        if total_xp < get_xp_threshold(lvl):
+            return lvl - 1
+    return 999
+
+
+def reference_calculate_level(message_count: int, xp: int, days_on_server: int) -> int:
+    if xp >= get_xp_threshold(5):
+        return reference_level_from_total_xp(xp)
+    if message_count < get_message_threshold(5):
+        for lvl in range(1, 6):
+            if message_count < get_message_threshold(lvl):
+                return lvl - 1
+        return 4
+    return reference_level_from_total_xp(xp)
+
+
+MAX_XP = get_xp_threshold(MAX_LEVEL + 1) + 1200
+
+
+def _xp_values() -> list[int]:
+    xps = set(range(-10, 20_001))
+    for lvl in range(1, MAX_LEVEL + 3):
+        threshold = get_xp_threshold(lvl)
+        xps.update((threshold - 1, threshold, threshold + 1))
+    xps.update(range(MAX_XP - 100, MAX_XP + 1))
+    return sorted(xps)
+
+
+def test_level_from_total_xp():
+    for xp in _xp_values():
+        assert level_from_total_xp(xp) == reference_level_from_total_xp(xp), xp
+
+
+@pytest.mark.parametrize("message_count", [0, 49, 50, 10_000])
+def test_level_by_xp(message_count):
+    for xp in _xp_values():
+        assert calculate_level(message_count, xp, 0) == reference_calculate_level(message_count, xp, 0), xp
+
+
+@pytest.mark.parametrize("xp", [-5, 0, 10, 49])
+def test_level_by_messages(xp):
+    for message_count in range(-10, 5001):
+        assert calculate_level(message_count, xp, 0) == reference_calculate_level(message_count, xp, 0), message_count
+
+
+def test_random_rows():
+    rnd = random.Random(0)
+    for _ in range(5_000):
+        row = (rnd.randint(0, 100_000), rnd.randint(0, MAX_XP), rnd.randint(0, 3000))
+        assert calculate_level(*row) == reference_calculate_level(*row), row